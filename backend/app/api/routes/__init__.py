@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 
 from .cleanings import router as cleanings_router
+from .health import router as health_router
+from .metrics import router as metrics_router
 from .token import router as token_router
 from .users import router as users_router
 
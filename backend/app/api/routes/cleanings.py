@@ -1,14 +1,114 @@
+from datetime import datetime
 from typing import cast
 
 import orjson
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, status
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Response,
+    status,
+)
+from fastapi.encoders import jsonable_encoder
 from pydantic import ValidationError
-from sqlmodel import select
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
 
-from ...db.session import async_session, get_session
+from ...db.session import async_session, get_database, get_session
 from ...models import cleaning
+from ...services.idempotency import (
+    claim_idempotency_key,
+    hash_idempotency_key,
+    hash_request,
+    idempotency_key_reused,
+    store_response,
+)
+from ...services.single_flight import single_flight
 
 router = APIRouter()
+# identical concurrent reads share one query.
+# fetches open their own session, see single_flight
+cleaning_reads: single_flight[tuple, cleaning.cleanings | None] = single_flight()
+cleaning_list_reads: single_flight[tuple, list[cleaning.cleanings]] = single_flight()
+
+
+async def fetch_all_cleanings(
+    engine: AsyncEngine,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+) -> list[cleaning.cleanings]:
+    async with async_session(engine, autoflush=False) as session:
+        # 아직 sqlmodel의 async session은 type hint와 관련해서 제대로 지원하지 않습니다.
+        # 제대로 작성된게 맞는지 확인해보고 싶다면,
+        # session.sync_session에서 type hint 관련해서만 확인해보면 됩니다.
+        #
+        # sync_session = session.sync_session
+        # table = sync_session.exec(select(cleaning.cleanings))
+        # rows = table.all()
+        table = await session.exec(
+            cleaning.cleanings.select_live(created_after, created_before)
+        )
+        return cast(list[cleaning.cleanings], table.all())
+
+
+async def fetch_cleaning(engine: AsyncEngine, id: int) -> cleaning.cleanings | None:
+    async with async_session(engine, autoflush=False) as session:
+        return await cleaning.cleanings.get_live(session, id)
+
+
+def get_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: str | None) -> int | None:
+    # only a single strong or weak version tag; `*` matches any version
+    if if_match is None or (tag := if_match.strip()) == "*":
+        return None
+    try:
+        return int(tag.removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match must be the ETag of the cleaning.",
+        )
+
+
+async def update_cleaning_version(
+    session: async_session,
+    current: cleaning.cleanings,
+    version: int,
+    values: dict,
+) -> cleaning.cleanings:
+    """
+    one conditional UPDATE instead of SELECT ... FOR UPDATE:
+    no row lock is held while the request is validated, and a writer that
+    lost the race updates nothing and gets 409.
+    """
+    table = cleaning.cleanings.get_table()
+    result = await session.execute(
+        update(table)
+        .where(
+            table.c.id == current.id,
+            # the partition key, so only the row's own partition is touched
+            table.c.created_at == current.created_at,
+            table.c.version == version,
+            table.c.deleted_at.is_(None),
+        )
+        .values(**values, version=version + 1, updated_at=datetime.now())
+        .returning(*table.c)
+    )
+    if (row := result.first()) is None:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The cleaning was changed by another request, reload and retry.",
+        )
+    await session.commit()
+    return cleaning.cleanings.validate(dict(row._mapping))
 
 
 @router.get(
@@ -17,18 +117,15 @@ router = APIRouter()
     name="cleanings:get-all-cleanings",
 )
 async def get_all_cleanings(
-    session: async_session = Depends(get_session),
+    created_after: datetime | None = Query(None),
+    created_before: datetime | None = Query(None),
+    engine: AsyncEngine = Depends(get_database),
 ) -> list[cleaning.cleanings]:
-    # 아직 sqlmodel의 async session은 type hint와 관련해서 제대로 지원하지 않습니다.
-    # 제대로 작성된게 맞는지 확인해보고 싶다면,
-    # session.sync_session에서 type hint 관련해서만 확인해보면 됩니다.
-    #
-    # sync_session = session.sync_session
-    # table = sync_session.exec(select(cleaning.cleanings))
-    # rows = table.all()
-    table = await session.exec(select(cleaning.cleanings))
-    rows = cast(list[cleaning.cleanings], table.all())
-    return rows
+    # the key is the query fingerprint, filters included
+    return await cleaning_list_reads.do(
+        ("all", created_after, created_before),
+        lambda: fetch_all_cleanings(engine, created_after, created_before),
+    )
 
 
 @router.post(
@@ -39,8 +136,33 @@ async def get_all_cleanings(
 )
 async def create_new_cleaning(
     new_cleaning: cleaning.cleaning_create = Body(..., embed=True),
+    idempotency_key: str | None = Header(None, max_length=255),
     session: async_session = Depends(get_session),
-) -> cleaning.cleanings:
+) -> cleaning.cleanings | Response:
+    # a retry with the same Idempotency-Key gets the first response back
+    # instead of inserting the cleaning again
+    if idempotency_key is not None:
+        key_hash = hash_idempotency_key("cleanings:create-cleaning", idempotency_key)
+        try:
+            stored = await claim_idempotency_key(
+                session, key_hash, hash_request(new_cleaning)
+            )
+        except idempotency_key_reused:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request.",
+            )
+        if stored is not None:
+            # read before the commit expires the row
+            content, status_code = stored.response, stored.status_code
+            await session.commit()
+            return Response(
+                content=content,
+                status_code=status_code,  # type: ignore
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"},
+            )
+
     # data = cleanings.from_orm(new_cleaning) 으로 해도 가능
     # exclude_none=True, exclude_unset=True 옵션을 위해 parse_obj 사용
     # sqlmodel table=True 관련 validation 문제로 인해 validate사용
@@ -52,6 +174,11 @@ async def create_new_cleaning(
     )
     session.add(data)
     await session.flush()
+    if idempotency_key is not None:
+        response = jsonable_encoder(cleaning.cleaning_public.parse_obj(data.dict()))
+        await store_response(
+            session, key_hash, status.HTTP_201_CREATED, orjson.dumps(response)
+        )
     await session.commit()
     await session.refresh(data)
 
@@ -64,14 +191,17 @@ async def create_new_cleaning(
     name="cleanings:get-cleaning-by-id",
 )
 async def get_cleaning_by_id(
+    response: Response,
     id: int = Path(..., ge=1),
-    session: async_session = Depends(get_session),
+    engine: AsyncEngine = Depends(get_database),
 ) -> cleaning.cleanings:
-    if (get_cleaning := await session.get(cleaning.cleanings, id)) is None:
+    get_cleaning = await cleaning_reads.do((id,), lambda: fetch_cleaning(engine, id))
+    if get_cleaning is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No cleaning found with that id.",
         )
+    response.headers["ETag"] = get_etag(get_cleaning.version)
     return get_cleaning
 
 
@@ -81,15 +211,20 @@ async def get_cleaning_by_id(
     name="cleanings:update-cleaning-by-id-as-patch",
 )
 async def update_cleaning_by_id_as_patch(
+    response: Response,
     id: int = Path(..., ge=1),
     update_cleaning: cleaning.cleaning_update = Body(..., embed=True),
+    if_match: str | None = Header(None),
     session: async_session = Depends(get_session),
 ) -> cleaning.cleanings:
-    if (get_cleaning := await session.get(cleaning.cleanings, id)) is None:
+    if (get_cleaning := await cleaning.cleanings.get_live(session, id)) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No cleaning found with that id.",
         )
+    # without If-Match, the version read here still guards the write below;
+    # `"0"` is a version too, a stale one
+    version = get_cleaning.version if (tag := parse_if_match(if_match)) is None else tag
 
     # validate 관련 문제 해결 전까지는 이렇게..
     update_dict = update_cleaning.dict(exclude_unset=True)
@@ -101,15 +236,9 @@ async def update_cleaning_by_id_as_patch(
             detail=orjson.loads(exc.json()),
         )
 
-    for attr, value in update_dict.items():
-        setattr(get_cleaning, attr, value)
-
-    session.add(get_cleaning.update())
-    await session.flush()
-    await session.commit()
-    await session.refresh(get_cleaning)
-
-    return get_cleaning
+    updated = await update_cleaning_version(session, get_cleaning, version, update_dict)
+    response.headers["ETag"] = get_etag(updated.version)
+    return updated
 
 
 @router.delete("/{id}", response_model=int, name="cleanings:delete-cleaning-by-id")
@@ -117,14 +246,19 @@ async def delete_cleaning_by_id(
     id: int = Path(..., ge=1, title="The ID of the cleaning to delete."),
     session: async_session = Depends(get_session),
 ) -> int:
-    if (get_cleaning := await session.get(cleaning.cleanings, id)) is None:
+    # a single UPDATE, no load first; the row is hard deleted later by the purge
+    table = cleaning.cleanings.get_table()
+    deleted = await session.execute(
+        update(table)
+        .where(table.c.id == id, table.c.deleted_at.is_(None))
+        .values(deleted_at=datetime.now())
+        .returning(table.c.id)
+    )
+    if deleted.first() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No cleaning found with that id.",
         )
-
-    await session.delete(get_cleaning)
-    await session.flush()
     await session.commit()
 
     return id
@@ -136,15 +270,18 @@ async def delete_cleaning_by_id(
     name="cleanings:update-cleaning-by-id-as-put",
 )
 async def update_cleaning_by_id_as_put(
+    response: Response,
     id: int = Path(..., ge=1),
     update_cleaning: cleaning.cleaning_update = Body(..., embed=True),
+    if_match: str | None = Header(None),
     session: async_session = Depends(get_session),
 ) -> cleaning.cleanings:
-    if (get_cleaning := await session.get(cleaning.cleanings, id)) is None:
+    if (get_cleaning := await cleaning.cleanings.get_live(session, id)) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No cleaning found with that id.",
         )
+    version = get_cleaning.version if (tag := parse_if_match(if_match)) is None else tag
 
     try:
         new_cleaning = cleaning.cleanings.validate(
@@ -156,12 +293,10 @@ async def update_cleaning_by_id_as_put(
             detail=orjson.loads(exc.json()),
         )
 
-    for attr, value in new_cleaning.dict(exclude={"id"}).items():
-        setattr(get_cleaning, attr, value)
-
-    session.add(get_cleaning.update())
-    await session.flush()
-    await session.commit()
-    await session.refresh(get_cleaning)
-
-    return get_cleaning
+    # created_at is the partition key and stays as it is
+    values = new_cleaning.dict(
+        exclude={"id", "version", "created_at", "updated_at", "deleted_at"}
+    )
+    updated = await update_cleaning_version(session, get_cleaning, version, values)
+    response.headers["ETag"] = get_etag(updated.version)
+    return updated
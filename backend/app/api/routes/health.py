@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import ORJSONResponse
+
+from ...db.engine import get_pool_status
+
+router = APIRouter()
+
+
+@router.get("/live", name="health:live")
+async def get_liveness() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@router.get("/ready", name="health:ready")
+async def get_readiness(request: Request) -> ORJSONResponse:
+    state = request.app.state
+    if (
+        not getattr(state, "_db_ready", False)
+        or (engine := getattr(state, "_db", None)) is None
+    ):
+        return ORJSONResponse(
+            {"status": "unavailable"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    content = {"status": "ok", "pool": get_pool_status(engine)}
+    if (admission := getattr(state, "_admission", None)) is not None:
+        content["admission"] = admission.status()
+    return ORJSONResponse(content)
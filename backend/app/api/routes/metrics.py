@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ...services.metrics import registry
+
+router = APIRouter()
+
+
+@router.get("", response_class=PlainTextResponse, name="metrics:get-metrics")
+async def get_metrics() -> PlainTextResponse:
+    # every worker's files are read, so any worker answers for all of them
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,39 +1,89 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Body, Depends, HTTPException, Response, status
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users.exceptions import UserNotExists
+from fastapi_users.router import ErrorCode
 
-from ...dependencies.auth import fastapi_user
+from ...db.session import async_session, get_session
+from ...dependencies.auth import fastapi_user, get_user_manager
+from ...models.token import token_model
+from ...services.authentication import create_refresh_token_store
+from ...services.authentication.convert import strategy_type, user_manager_type
+from ...services.metrics import auth_failures
 
 router = APIRouter()
+backend = fastapi_user.backends[0]
+
 
 # name: auth:{backend.name}.login
-router.include_router(
-    fastapi_user.users.get_auth_router(
-        fastapi_user.backends[0], requires_verification=False
+@router.post("/login", response_model=token_model, name=f"auth:{backend.name}.login")
+async def create_token(
+    credentials: OAuth2PasswordRequestForm = Depends(),
+    user_manager: user_manager_type = Depends(get_user_manager),
+    strategy: strategy_type = Depends(backend.get_strategy),
+    session: async_session = Depends(get_session),
+) -> token_model:
+    get_user = await user_manager.authenticate(credentials)
+    if get_user is None or not get_user.is_active:
+        auth_failures.inc(reason="bad_credentials")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ErrorCode.LOGIN_BAD_CREDENTIALS,
+        )
+
+    access_token = await strategy.write_token(get_user)
+    refresh_token = await create_refresh_token_store().issue(session, get_user.id)
+    await session.commit()
+
+    return token_model(access_token=access_token, refresh_token=refresh_token)
+
+
+@router.post("/refresh", response_model=token_model, name="auth:refresh-token")
+async def refresh_token(
+    refresh_token: str = Body(..., embed=True),
+    user_manager: user_manager_type = Depends(get_user_manager),
+    strategy: strategy_type = Depends(backend.get_strategy),
+    session: async_session = Depends(get_session),
+) -> token_model:
+    # no password hash here: the stored token hash is the credential
+    store = create_refresh_token_store()
+    unauthorized = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token.",
+        headers={"WWW-Authenticate": "Bearer"},
     )
+
+    if (user_id := await store.consume(session, refresh_token)) is None:
+        await session.commit()
+        auth_failures.inc(reason="invalid_refresh_token")
+        raise unauthorized
+    try:
+        get_user = await user_manager.get(user_id)
+    except UserNotExists:
+        await session.commit()
+        auth_failures.inc(reason="invalid_refresh_token")
+        raise unauthorized
+    if not get_user.is_active:
+        await session.commit()
+        auth_failures.inc(reason="inactive_user")
+        raise unauthorized
+
+    access_token = await strategy.write_token(get_user)
+    new_refresh_token = await store.issue(session, get_user.id)
+    await session.commit()
+
+    return token_model(access_token=access_token, refresh_token=new_refresh_token)
+
+
+@router.post(
+    "/logout",
+    status_code=status.HTTP_204_NO_CONTENT,
+    name=f"auth:{backend.name}.logout",
 )
+async def revoke_token(
+    refresh_token: str = Body(..., embed=True),
+    session: async_session = Depends(get_session),
+) -> Response:
+    await create_refresh_token_store().revoke(session, refresh_token)
+    await session.commit()
 
-# from fastapi import Depends, HTTPException, status
-# from fastapi.security import OAuth2PasswordRequestForm
-# from fastapi_users.router import ErrorCode
-
-# from ...services.authentication import strategy_type, token_model, user_manager_type
-
-# @router.post("", name="users:create-token")
-# async def create_token(
-#     credentials: OAuth2PasswordRequestForm = Depends(),
-#     user_manager: user_manager_type = fastapi_user.user_manager_depends,
-#     strategy: strategy_type = fastapi_user.strategy_depends(),
-# ) -> token_model:
-#     get_user = await user_manager.authenticate(credentials)
-#     if get_user is None or not get_user.is_active:
-#         raise HTTPException(
-#             status_code=status.HTTP_400_BAD_REQUEST,
-#             detail=ErrorCode.LOGIN_BAD_CREDENTIALS,
-#         )
-#     if not get_user.is_verified:
-#         raise HTTPException(
-#             status_code=status.HTTP_400_BAD_REQUEST,
-#             detail=ErrorCode.LOGIN_USER_NOT_VERIFIED,
-#         )
-
-#     token = await strategy.write_token(get_user)
-#     return token_model.from_token(token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
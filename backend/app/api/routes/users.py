@@ -1,29 +1,32 @@
-import re
+from typing import Any, AsyncIterator
 
 import orjson
 from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi_users.exceptions import InvalidPasswordException, UserAlreadyExists
-from pydantic import ValidationError
+from pydantic import EmailStr, ValidationError
 
-from ...dependencies.auth import get_current_user, get_user_manager
+from ...core import config
+from ...db.session import async_session, get_session
+from ...dependencies.auth import (
+    get_current_superuser,
+    get_current_user,
+    get_user_manager,
+)
 from ...models import user
+from ...models.user import re_deny_name
 from ...services.authentication.convert import user_manager_type
+from ...services.provisioning import provision_users
 
 router = APIRouter()
-re_deny_name = re.compile(r"[^a-zA-Z0-9_-]")
 
 
 @router.options("", name="users:get-allowed-methods")
-async def get_allowed_user_methods() -> Response:
-    from functools import reduce
-
-    method_sets = [getattr(route, "methods") for route in router.routes]
-    all_methods = reduce(lambda left, right: left | right, method_sets, set())
-    all_methods_str = ", ".join(all_methods)
-
-    return Response(
-        status_code=status.HTTP_204_NO_CONTENT, headers={"Allow": all_methods_str}
-    )
+async def get_allowed_user_methods(request: Request) -> Response:
+    # answer_options replies before a request gets here, the route stays
+    # for the openapi schema and url_path_for
+    allow = request.app.state._allowed_methods.get(request.url.path)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Allow": allow})
 
 
 @router.post(
@@ -73,3 +76,50 @@ async def get_currently_authenticated_user(
     current_user: user.user = Depends(get_current_user),
 ) -> user.user:
     return current_user
+
+
+@router.post(
+    "/exists",
+    response_model=dict[str, bool],
+    name="users:check-existing-emails",
+    dependencies=[Depends(get_current_superuser)],
+)
+async def check_existing_emails(
+    emails: list[EmailStr] = Body(
+        ..., embed=True, min_items=1, max_items=config.USERS_EXISTS_MAX_EMAILS
+    ),
+    session: async_session = Depends(get_session),
+) -> dict[str, bool]:
+    # one indexed `lower(email) IN (...)` query for the whole batch
+    existing = await user.user.get_existing_emails(session, emails)
+    return {email: email.lower() in existing for email in emails}
+
+
+@router.post(
+    "/provision",
+    response_class=StreamingResponse,
+    name="users:provision-users",
+    dependencies=[Depends(get_current_superuser)],
+)
+async def provision_new_users(
+    users: list[dict[str, Any]] = Body(
+        ..., embed=True, min_items=1, max_items=config.PROVISION_MAX_USERS
+    ),
+    user_manager: user_manager_type = Depends(get_user_manager),
+) -> StreamingResponse:
+    # rows are validated one by one, so a bad row is reported instead of
+    # failing the whole request with 422
+    async def stream_results() -> AsyncIterator[bytes]:
+        processed = created = 0
+        async for results in provision_users(user_manager, users):  # type: ignore
+            for result in results:
+                if result.status == "created":
+                    created += 1
+                else:
+                    yield result.json() + b"\n"
+            processed += len(results)
+            yield orjson.dumps(
+                {"processed": processed, "created": created, "total": len(users)}
+            ) + b"\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
@@ -1,32 +1,94 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import ORJSONResponse
 
 from ..core import config, tasks
-from .routes import router as api_router
 
 
 def get_application() -> FastAPI:
+    # routes pull in sqlmodel, the models and the whole auth stack,
+    # so they are imported only when an application is actually built
+    from sqlalchemy.exc import DBAPIError
+
+    from ..dependencies.rate_limit import limit_rate
+    from ..dependencies.timeout import limit_statement_time, query_canceled_handler
+    from ..middleware import (
+        admission_control,
+        allowed_methods,
+        answer_options,
+        bind_request_log_context,
+        cancel_on_disconnect,
+        record_metrics,
+        trace_requests,
+    )
+    from ..services.admission import create_admission_controller
+    from ..services.rate_limit import create_rate_limiter
+    from ..services.tracing import create_tracer, traced_response
+    from .routes import health_router, metrics_router
+    from .routes import router as api_router
+
     app = FastAPI(
         title=config.PROJECT_NAME,
         version=config.VERSION,
-        default_response_class=ORJSONResponse,
+        default_response_class=traced_response,
+        # limits are looked up by route name,
+        # see config.RATE_LIMITS and config.STATEMENT_TIMEOUTS
+        dependencies=[Depends(limit_rate), Depends(limit_statement_time)],
     )
+    app.state._rate_limiter = create_rate_limiter()
+    app.state._admission = create_admission_controller()
+    app.state._tracer = create_tracer()
 
+    app.include_router(api_router, prefix=config.API_PREFIX)
+    app.include_router(health_router, prefix="/health", tags=["health"])
+    app.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
+    # once every route is included; OPTIONS and preflights are answered from it
+    app.state._allowed_methods = allowed_methods(app.routes)
+
+    # inside CORS, so shed requests still carry the CORS headers
+    app.add_middleware(
+        admission_control,
+        controller=app.state._admission,
+        exempt_paths=config.ADMISSION_EXEMPT_PATHS,
+        latency_targets={
+            name: target / 1000
+            for name, target in config.ADMISSION_LATENCY_TARGETS.items()
+        },
+        routes=app.routes,
+    )
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=True,
+        allow_origins=list(config.CORS_ALLOW_ORIGINS),
+        allow_credentials=config.CORS_ALLOW_CREDENTIALS,
         allow_methods=["*"],
         allow_headers=["*"],
+        max_age=config.CORS_MAX_AGE_SECONDS,
+    )
+    # preflights of known paths never reach the generic CORS middleware
+    app.add_middleware(
+        answer_options,
+        table=app.state._allowed_methods,
+        allow_origins=config.CORS_ALLOW_ORIGINS,
+        allow_credentials=config.CORS_ALLOW_CREDENTIALS,
+        max_age=config.CORS_MAX_AGE_SECONDS,
     )
+    app.add_middleware(cancel_on_disconnect)
+    # the latency includes shedding and every middleware inside it
+    app.add_middleware(record_metrics)
+    # the root span of a request, so every other span is below it
+    app.add_middleware(trace_requests, tracer=app.state._tracer)
+    app.add_middleware(bind_request_log_context)
+    app.add_exception_handler(DBAPIError, query_canceled_handler)
 
     app.add_event_handler("startup", tasks.create_start_app_handler(app))
     app.add_event_handler("shutdown", tasks.create_stop_app_handler(app))
 
-    app.include_router(api_router, prefix=config.API_PREFIX)
-
     return app
 
 
-app = get_application()
+def __getattr__(name: str) -> FastAPI:
+    # `uvicorn app.api.server:app` still works, but importing this module
+    # no longer builds an application as a side effect
+    if name == "app":
+        globals()["app"] = application = get_application()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
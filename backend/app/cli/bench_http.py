@@ -0,0 +1,173 @@
+"""
+compare connection reuse strategies on the small, hot endpoints of a running
+server: GET /api/cleanings/{id} and GET /api/users/me.
+
+    python -m app.cli.bench_http --email user@example.com --password secret
+        [--url http://127.0.0.1:8000] [--cleaning-id 1] [--requests 2000]
+        [--concurrency 50] [--connections 10] [--protocols http1-close,http1,h2]
+
+`http1-close` opens a connection per request, `http1` reuses up to
+--connections keep-alive connections and `h2` multiplexes every request over
+a single connection: h2c with prior knowledge on http urls, ALPN on https.
+h2 needs the server started with `app.cli.serve --server hypercorn`.
+rate limits and admission control apply, so point it at a server configured
+for benchmarks.
+"""
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass, field
+from time import perf_counter
+
+import httpx
+
+protocols = ("http1-close", "http1", "h2")
+
+
+@dataclass
+class bench_result:
+    protocol: str
+    path: str
+    seconds: float = 0.0
+    errors: int = 0
+    latencies: list[float] = field(default_factory=list)
+    http_versions: set[str] = field(default_factory=set)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def row(self) -> str:
+        versions = ",".join(sorted(self.http_versions))
+        rate = len(self.latencies) / self.seconds
+        p50, p99 = self.percentile(0.5) * 1000, self.percentile(0.99) * 1000
+        return (
+            f"{self.protocol:<12} {self.path:<24} {versions:<10} {rate:>9,.0f}"
+            f" {p50:>8.2f} {p99:>8.2f} {self.errors:>6}"
+        )
+
+
+header = (
+    f"{'protocol':<12} {'path':<24} {'version':<10} {'req/s':>9}"
+    f" {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}"
+)
+
+
+def create_client(
+    protocol: str, url: str, connections: int, token: str
+) -> httpx.AsyncClient:
+    headers = {"Authorization": f"Bearer {token}"}
+    match protocol:
+        case "http1-close":
+            limits = httpx.Limits(
+                max_connections=connections, max_keepalive_connections=0
+            )
+            return httpx.AsyncClient(base_url=url, headers=headers, limits=limits)
+        case "http1":
+            limits = httpx.Limits(
+                max_connections=connections, max_keepalive_connections=connections
+            )
+            return httpx.AsyncClient(base_url=url, headers=headers, limits=limits)
+        case "h2":
+            return httpx.AsyncClient(
+                base_url=url,
+                headers=headers,
+                http1=False,
+                http2=True,
+                limits=httpx.Limits(max_connections=1),
+            )
+        case _:
+            raise ValueError(f"unknown protocol: {protocol}")
+
+
+async def login(url: str, email: str, password: str) -> str:
+    async with httpx.AsyncClient(base_url=url) as client:
+        res = await client.post(
+            "/api/token/login", data={"username": email, "password": password}
+        )
+        res.raise_for_status()
+        return res.json()["access_token"]
+
+
+async def bench_path(
+    client: httpx.AsyncClient,
+    result: bench_result,
+    requests: int,
+    concurrency: int,
+) -> None:
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = perf_counter()
+            try:
+                res = await client.get(result.path)
+            except httpx.HTTPError:
+                result.errors += 1
+                continue
+            result.latencies.append(perf_counter() - started)
+            result.http_versions.add(res.http_version)
+            if res.status_code >= 400:
+                result.errors += 1
+
+    started = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.seconds = perf_counter() - started
+
+
+async def bench(args: argparse.Namespace) -> list[bench_result]:
+    token = await login(args.url, args.email, args.password)
+    paths = (f"/api/cleanings/{args.cleaning_id}", "/api/users/me")
+    results = []
+    for protocol in args.protocols:
+        for path in paths:
+            # a fresh client per run, warmed up so the timed requests
+            # measure reuse instead of connection setup (except http1-close)
+            async with create_client(
+                protocol, args.url, args.connections, token
+            ) as client:
+                warm_up = bench_result(protocol, path)
+                await bench_path(client, warm_up, args.concurrency, args.concurrency)
+                result = bench_result(protocol, path)
+                await bench_path(client, result, args.requests, args.concurrency)
+            results.append(result)
+            print(result.row(), file=sys.stderr)
+    return results
+
+
+def parse_protocols(value: str) -> list[str]:
+    chosen = [protocol.strip() for protocol in value.split(",")]
+    if unknown := set(chosen) - set(protocols):
+        raise argparse.ArgumentTypeError(f"unknown protocols: {sorted(unknown)}")
+    return chosen
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="benchmark HTTP/1.1 keep-alive against HTTP/2 multiplexing"
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--cleaning-id", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=10,
+        help="connection pool size of the http1 protocols",
+    )
+    parser.add_argument("--protocols", type=parse_protocols, default=list(protocols))
+    args = parser.parse_args()
+
+    print(header, file=sys.stderr)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+convert a breached password corpus into the file read by PASSWORD_BREACHED_FILE.
+
+    python -m app.cli.breached_passwords pwned-passwords-sha1-ordered-by-hash.txt \\
+        breached.bin [--digest-size 8]
+
+the source is `SHA1:COUNT` lines sorted by hash; the output is the sorted
+prefixes back to back, memory mapped and binary searched by the workers.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from ..core import config
+from ..services.password_policy import write_breached_digests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="build a breached password file")
+    parser.add_argument("source", type=Path, help="sorted SHA1:COUNT lines")
+    parser.add_argument("output", type=Path)
+    parser.add_argument(
+        "--digest-size", type=int, default=config.PASSWORD_BREACHED_DIGEST_SIZE
+    )
+    args = parser.parse_args()
+
+    with args.source.open() as source, args.output.open("wb") as output:
+        written = write_breached_digests(source, output, args.digest_size)
+    print(f"wrote {written} digests to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+load a deterministic synthetic dataset for benchmarks.
+
+    python -m app.cli.generate --users 100000 --cleanings 2000000 [--seed 0]
+        [--cleaning-types dust_up=5,spot_clean=3,full_clean=2]
+        [--days 365] [--deleted-ratio 0.05] [--batch-size 50000]
+
+rows are COPY'd batch by batch, each batch committed on its own,
+and the tables are analyzed at the end.
+"""
+import argparse
+import asyncio
+import sys
+from time import perf_counter
+
+from sqlalchemy import text
+
+from ..db.engine import get_engine, get_test_engine
+from ..models import cleaning, user
+from ..services.dataset import cleaning_type_enum, dataset_spec, load_dataset
+
+
+def parse_weights(value: str) -> dict[cleaning_type_enum, float]:
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        weights[cleaning_type_enum(name.strip())] = float(weight)
+    return weights
+
+
+async def generate(spec: dataset_spec, batch_size: int) -> None:
+    engine = get_test_engine(get_engine())
+    started = perf_counter()
+    try:
+        async with engine.connect() as connection:
+            counts = await load_dataset(connection, spec, batch_size)
+            connection = await connection.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            for table in (user.user.get_table(), cleaning.cleanings.get_table()):
+                await connection.execute(text(f"analyze {table.name}"))
+    finally:
+        await engine.dispose()
+
+    elapsed = perf_counter() - started
+    rows = sum(counts.values())
+    print(
+        f"loaded {counts} in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    defaults = dataset_spec()
+    parser = argparse.ArgumentParser(description="load a synthetic dataset")
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--cleanings", type=int, default=defaults.cleanings)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--cleaning-types",
+        type=parse_weights,
+        default=defaults.cleaning_types,
+        help="relative weights, e.g. dust_up=5,spot_clean=3,full_clean=2",
+    )
+    parser.add_argument("--days", type=int, default=defaults.days)
+    parser.add_argument("--deleted-ratio", type=float, default=defaults.deleted_ratio)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    spec = dataset_spec(
+        users=args.users,
+        cleanings=args.cleanings,
+        seed=args.seed,
+        cleaning_types=args.cleaning_types,
+        days=args.days,
+        deleted_ratio=args.deleted_ratio,
+    )
+    asyncio.run(generate(spec, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+inspect and maintain the monthly partitions of a partitioned table.
+
+    python -m app.cli.partitions list [--table cleanings]
+    python -m app.cli.partitions ensure [--months-ahead 3]
+    python -m app.cli.partitions detach cleanings_y2025m01
+
+a detached partition is a plain table: dump it, move it to another
+tablespace or drop it without touching the live table.
+"""
+import argparse
+import asyncio
+
+from ..core import config
+from ..db.engine import get_engine, get_test_engine
+from ..db.partitions import detach_partition, ensure_partitions, get_partitions
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = get_test_engine(get_engine())
+    try:
+        match args.command:
+            case "list":
+                async with engine.connect() as connection:
+                    partitions = await get_partitions(connection, args.table)
+                for name, upper in sorted(partitions.items(), key=lambda item: item[0]):
+                    print(
+                        f"{name}\tbefore {upper.isoformat() if upper else 'maxvalue'}"
+                    )
+            case "ensure":
+                for name in await ensure_partitions(
+                    engine, args.table, args.months_ahead
+                ):
+                    print(f"created {name}")
+            case "detach":
+                await detach_partition(engine, args.table, args.partition)
+                print(f"detached {args.partition}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="manage monthly partitions")
+    parser.add_argument(
+        "--table",
+        default=config.PARTITIONED_TABLES[0],
+        choices=config.PARTITIONED_TABLES,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    ensure = commands.add_parser("ensure")
+    ensure.add_argument(
+        "--months-ahead", type=int, default=config.PARTITION_MONTHS_AHEAD
+    )
+    detach = commands.add_parser("detach")
+    detach.add_argument("partition")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+provision users from a csv or jsonl file.
+
+    python -m app.cli.provision users.csv [--batch-size 500]
+
+per row results are written to stdout as json lines, progress to stderr.
+"""
+import argparse
+import asyncio
+import csv
+import sys
+from pathlib import Path
+from typing import Any, Iterator
+
+import orjson
+
+from ..core import config
+from ..db.engine import get_engine, get_test_engine
+from ..db.session import async_session
+from ..models import user
+from ..services.authentication import UserManager, user_db_class
+from ..services.provisioning import provision_users, shutdown_hash_pool
+
+
+def read_rows(path: Path) -> Iterator[dict[str, Any]]:
+    with path.open(newline="") as file:
+        if path.suffix == ".csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield orjson.loads(line)
+
+
+async def provision_file(path: Path, batch_size: int) -> int:
+    engine = get_test_engine(get_engine())
+    processed = created = 0
+    try:
+        async with async_session(engine, autoflush=False) as session:
+            manager = UserManager(user_db_class(session, user.user))
+            async for results in provision_users(manager, read_rows(path), batch_size):
+                for result in results:
+                    sys.stdout.buffer.write(result.json() + b"\n")
+                    created += result.status == "created"
+                processed += len(results)
+                sys.stdout.flush()
+                print(f"processed {processed}, created {created}", file=sys.stderr)
+    finally:
+        shutdown_hash_pool()
+        await engine.dispose()
+    return 0 if processed == created else 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="provision users in bulk")
+    parser.add_argument("file", type=Path, help="csv with a header row, or jsonl")
+    parser.add_argument("--batch-size", type=int, default=config.PROVISION_BATCH_SIZE)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(provision_file(args.file, args.batch_size)))
+
+
+if __name__ == "__main__":
+    main()
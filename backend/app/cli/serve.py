@@ -0,0 +1,110 @@
+"""
+run the api with several worker processes.
+
+    python -m app.cli.serve [--host 0.0.0.0] [--port 8000] [--workers 2] [--reload]
+        [--server uvicorn|hypercorn] [--keep-alive 5] [--h2-max-streams 100]
+        [--certfile cert.pem --keyfile key.pem]
+
+the workers share one metrics directory, so /metrics on any of them covers
+all of them. without METRICS_DIR a fresh temporary directory is used.
+
+uvicorn serves HTTP/1.1 only. hypercorn also serves HTTP/2: negotiated
+through ALPN with a certificate, and as cleartext h2c for clients with prior
+knowledge or an `Upgrade: h2c` request without one. see app.cli.bench_http
+to compare the two on the hot endpoints.
+"""
+import argparse
+import logging
+import os
+import tempfile
+
+from ..core import config
+from ..services.metrics import clear_metrics_dir
+
+application_path = "app.api.server:app"
+# hypercorn evaluates the part after the colon in the module's namespace,
+# which skips the module __getattr__ that builds `app`
+hypercorn_application_path = "app.api.server:get_application()"
+
+
+def prepare_metrics_dir() -> str:
+    directory = config.METRICS_DIR or tempfile.mkdtemp(prefix="metrics-")
+    clear_metrics_dir(directory)
+    # the workers read their config from the environment they inherit
+    os.environ["METRICS_DIR"] = directory
+    return directory
+
+
+def run_uvicorn(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        application_path,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=args.reload,
+        timeout_keep_alive=round(args.keep_alive),
+        ssl_certfile=args.certfile,
+        ssl_keyfile=args.keyfile,
+    )
+
+
+def run_hypercorn(args: argparse.Namespace) -> None:
+    from hypercorn.config import Config
+    from hypercorn.run import run
+
+    server_config = Config()
+    server_config.application_path = hypercorn_application_path
+    server_config.bind = [f"{args.host}:{args.port}"]
+    # like uvicorn, reloading runs a single worker
+    server_config.workers = 1 if args.reload else args.workers
+    server_config.use_reloader = args.reload
+    server_config.worker_class = "uvloop"
+    server_config.keep_alive_timeout = args.keep_alive
+    server_config.h2_max_concurrent_streams = args.h2_max_streams
+    server_config.certfile = args.certfile
+    server_config.keyfile = args.keyfile
+    # a logger instead of a stream, so the access log goes through the
+    # queue of app.core.logging like uvicorn's does
+    access_log = logging.getLogger("hypercorn.access")
+    access_log.setLevel(logging.INFO)
+    server_config.accesslog = access_log
+    run(server_config)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="run the api server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--reload", action="store_true")
+    parser.add_argument(
+        "--server", choices=("uvicorn", "hypercorn"), default=config.SERVER
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=float,
+        default=config.SERVER_KEEP_ALIVE_SECONDS,
+        help="seconds an idle connection is kept open",
+    )
+    parser.add_argument(
+        "--h2-max-streams",
+        type=int,
+        default=config.SERVER_H2_MAX_CONCURRENT_STREAMS,
+        help="concurrent requests per HTTP/2 connection, hypercorn only",
+    )
+    parser.add_argument("--certfile", default=None)
+    parser.add_argument("--keyfile", default=None)
+    args = parser.parse_args()
+
+    prepare_metrics_dir()
+    match args.server:
+        case "uvicorn":
+            run_uvicorn(args)
+        case "hypercorn":
+            run_hypercorn(args)
+
+
+if __name__ == "__main__":
+    main()
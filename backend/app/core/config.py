@@ -1,3 +1,5 @@
+import os
+
 from sqlalchemy.engine.url import URL
 from starlette.config import Config
 from starlette.datastructures import Secret
@@ -13,12 +15,34 @@ SECRET_KEY = config("SECRET_KEY", cast=Secret)
 ACCESS_TOKEN_EXPIRE_SECONDS = config(
     "ACCESS_TOKEN_EXPIRE_SECONDS", cast=int, default=60 * 60
 )
+REFRESH_TOKEN_EXPIRE_SECONDS = config(
+    "REFRESH_TOKEN_EXPIRE_SECONDS", cast=int, default=60 * 60 * 24 * 14
+)
+REFRESH_TOKEN_REVOKED_CACHE_SIZE = config(
+    "REFRESH_TOKEN_REVOKED_CACHE_SIZE", cast=int, default=4096
+)
 JWT_ALGORITHM = config("JWT_ALGORITHM", cast=str, default="HS256")
 JWT_AUDIENCE = config("JWT_AUDIENCE", cast=str, default="phresh:auth")
 JWT_TOKEN_PREFIX = config("JWT_TOKEN_PREFIX", cast=str, default="Bearer")
+# RS256/ES256/EdDSA: SECRET_KEY is ignored for tokens once a private key is given.
+# without a public key file the public key is derived from the private one.
+JWT_PRIVATE_KEY_FILE = config("JWT_PRIVATE_KEY_FILE", cast=str, default=None)
+JWT_PUBLIC_KEY_FILE = config("JWT_PUBLIC_KEY_FILE", cast=str, default=None)
+JWT_CLAIM_CACHE_SIZE = config("JWT_CLAIM_CACHE_SIZE", cast=int, default=1024)
 AUTH_BACKEND_NAME = config(
     "AUTH_BACKEND_NAME", cast=str, default=f"{JWT_TOKEN_PREFIX}-jwt"
 )
+USERS_EXISTS_MAX_EMAILS = config("USERS_EXISTS_MAX_EMAILS", cast=int, default=1000)
+PASSWORD_DENY_LIST_FILE = config("PASSWORD_DENY_LIST_FILE", cast=str, default=None)
+PASSWORD_BREACHED_FILE = config("PASSWORD_BREACHED_FILE", cast=str, default=None)
+PASSWORD_BREACHED_DIGEST_SIZE = config(
+    "PASSWORD_BREACHED_DIGEST_SIZE", cast=int, default=8
+)
+PROVISION_MAX_USERS = config("PROVISION_MAX_USERS", cast=int, default=10_000)
+PROVISION_BATCH_SIZE = config("PROVISION_BATCH_SIZE", cast=int, default=500)
+PROVISION_HASH_WORKERS = config(
+    "PROVISION_HASH_WORKERS", cast=int, default=os.cpu_count() or 1
+)
 
 POSTGRES_USER = config("POSTGRES_USER", cast=str)
 POSTGRES_PASSWORD = config("POSTGRES_PASSWORD", cast=Secret)
@@ -38,3 +62,115 @@ DATABASE_URL = config(
         database=POSTGRES_DB,
     ).render_as_string(hide_password=False),
 )
+
+DB_POOL_SIZE = config("DB_POOL_SIZE", cast=int, default=10)
+DB_WARMUP_CONNECTIONS = config("DB_WARMUP_CONNECTIONS", cast=int, default=DB_POOL_SIZE)
+DB_CONNECT_RETRIES = config("DB_CONNECT_RETRIES", cast=int, default=5)
+DB_CONNECT_BACKOFF_SECONDS = config(
+    "DB_CONNECT_BACKOFF_SECONDS", cast=float, default=0.5
+)
+DB_CONNECT_BACKOFF_MAX_SECONDS = config(
+    "DB_CONNECT_BACKOFF_MAX_SECONDS", cast=float, default=10.0
+)
+
+# statement timeouts of queries run while serving a request, in milliseconds.
+# looked up by route name, 0 keeps the server default
+DB_STATEMENT_TIMEOUT_MS = config("DB_STATEMENT_TIMEOUT_MS", cast=int, default=5000)
+STATEMENT_TIMEOUTS: dict[str, int] = {
+    "cleanings:get-all-cleanings": 2000,
+    "users:check-existing-emails": 2000,
+    "users:provision-users": 60_000,
+}
+
+# lock_timeout of migrations, see app.db.online for helpers that avoid long locks
+MIGRATION_LOCK_TIMEOUT = config("MIGRATION_LOCK_TIMEOUT", default="5s")
+
+# adaptive concurrency limit per worker, see app.services.admission
+ADMISSION_INITIAL_LIMIT = config("ADMISSION_INITIAL_LIMIT", cast=int, default=20)
+ADMISSION_MIN_LIMIT = config("ADMISSION_MIN_LIMIT", cast=int, default=4)
+ADMISSION_MAX_LIMIT = config("ADMISSION_MAX_LIMIT", cast=int, default=200)
+ADMISSION_LATENCY_TARGET_MS = config(
+    "ADMISSION_LATENCY_TARGET_MS", cast=int, default=250
+)
+ADMISSION_QUEUE_TIMEOUT_MS = config("ADMISSION_QUEUE_TIMEOUT_MS", cast=int, default=100)
+ADMISSION_MAX_QUEUE = config("ADMISSION_MAX_QUEUE", cast=int, default=100)
+ADMISSION_EXEMPT_PATHS = ("/health", "/metrics")
+# latency targets of routes slow by design, looked up by route name in
+# milliseconds; 0 leaves the route out of the limit, it never takes a slot,
+# like a streamed response whose latency grows with the request
+ADMISSION_LATENCY_TARGETS: dict[str, int] = {
+    f"auth:{AUTH_BACKEND_NAME}.login": 1000,
+    "users:register-new-user": 1000,
+    "users:provision-users": 0,
+}
+
+IDEMPOTENCY_KEY_TTL_SECONDS = config(
+    "IDEMPOTENCY_KEY_TTL_SECONDS", cast=int, default=60 * 60 * 24
+)
+IDEMPOTENCY_SWEEP_INTERVAL_SECONDS = config(
+    "IDEMPOTENCY_SWEEP_INTERVAL_SECONDS", cast=float, default=600.0
+)
+
+# soft deleted rows are hard deleted in throttled batches after the retention
+PURGE_RETENTION_SECONDS = config(
+    "PURGE_RETENTION_SECONDS", cast=int, default=60 * 60 * 24 * 7
+)
+PURGE_INTERVAL_SECONDS = config("PURGE_INTERVAL_SECONDS", cast=float, default=3600.0)
+PURGE_BATCH_SIZE = config("PURGE_BATCH_SIZE", cast=int, default=1000)
+PURGE_THROTTLE_SECONDS = config("PURGE_THROTTLE_SECONDS", cast=float, default=0.5)
+
+# monthly partitions are kept created this many months ahead
+PARTITION_MONTHS_AHEAD = config("PARTITION_MONTHS_AHEAD", cast=int, default=3)
+PARTITION_MAINTENANCE_INTERVAL_SECONDS = config(
+    "PARTITION_MAINTENANCE_INTERVAL_SECONDS", cast=float, default=60 * 60 * 6
+)
+PARTITIONED_TABLES = ("cleanings",)
+
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", cast=str, default="memory")
+RATE_LIMIT_MAX_KEYS = config("RATE_LIMIT_MAX_KEYS", cast=int, default=100_000)
+RATE_LIMIT_SQLITE_PATH = config(
+    "RATE_LIMIT_SQLITE_PATH", cast=str, default="/tmp/jeffastor_rate_limit.sqlite3"
+)
+# route name: (requests per second, burst, concurrent requests per client)
+RATE_LIMITS: dict[str, tuple[float, int, int]] = {
+    "cleanings:create-cleaning": (5, 20, 4),
+    f"auth:{AUTH_BACKEND_NAME}.login": (1, 10, 2),
+    "auth:refresh-token": (1, 10, 2),
+}
+
+# every worker writes its metrics to a file in this directory and a scrape of
+# /metrics on any worker adds them up; None keeps them in the worker's memory
+METRICS_DIR = config("METRICS_DIR", cast=str, default=None)
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# tracing, see app.services.tracing. a request continues the trace of its
+# `traceparent` header, new traces are sampled at TRACE_SAMPLE_RATIO.
+# sampled traces are written as json lines by TRACE_EXPORTER:
+# "none", "stdout" or "file" (TRACE_FILE)
+TRACE_EXPORTER = config("TRACE_EXPORTER", cast=str, default="none")
+TRACE_FILE = config("TRACE_FILE", cast=str, default="/tmp/jeffastor_traces.jsonl")
+TRACE_SAMPLE_RATIO = config("TRACE_SAMPLE_RATIO", cast=float, default=0.01)
+
+# records of these loggers are queued and written as json lines to stdout by a
+# background thread, see app.core.logging. debug records are sampled
+LOG_LEVEL = config("LOG_LEVEL", cast=str, default="INFO")
+LOG_DEBUG_SAMPLE_RATIO = config("LOG_DEBUG_SAMPLE_RATIO", cast=float, default=0.1)
+LOG_QUEUED_LOGGERS = (
+    "app",
+    "uvicorn.error",
+    "uvicorn.access",
+    "hypercorn.error",
+    "hypercorn.access",
+)
+
+# app.cli.serve: "uvicorn" serves HTTP/1.1, "hypercorn" HTTP/1.1 and HTTP/2
+SERVER = config("SERVER", cast=str, default="uvicorn")
+SERVER_KEEP_ALIVE_SECONDS = config("SERVER_KEEP_ALIVE_SECONDS", cast=float, default=5.0)
+SERVER_H2_MAX_CONCURRENT_STREAMS = config(
+    "SERVER_H2_MAX_CONCURRENT_STREAMS", cast=int, default=100
+)
+
+# CORS, preflights of known paths are answered by app.middleware.answer_options
+CORS_ALLOW_ORIGINS = ("*",)
+CORS_ALLOW_CREDENTIALS = True
+CORS_MAX_AGE_SECONDS = config("CORS_MAX_AGE_SECONDS", cast=int, default=600)
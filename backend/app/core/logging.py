@@ -0,0 +1,133 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+import orjson
+from starlette.types import Scope
+
+from . import config
+
+
+@dataclass
+class log_context:
+    """
+    values added to every record logged while serving a request. the scope is
+    kept instead of the route name, since the route is only matched after the
+    context is bound
+    """
+
+    request_id: str
+    scope: Scope | None = None
+    user_id: str | None = None
+
+    def values(self) -> dict[str, Any]:
+        values: dict[str, Any] = {"request_id": self.request_id}
+        if self.scope is not None and (route := self.scope.get("route")) is not None:
+            values["route"] = route.name
+        if self.user_id is not None:
+            values["user_id"] = self.user_id
+        return values
+
+
+request_log_context: ContextVar[log_context | None] = ContextVar(
+    "request_log_context", default=None
+)
+
+
+def bind_log_context(**values: Any) -> None:
+    if (context := request_log_context.get()) is not None:
+        for name, value in values.items():
+            setattr(context, name, value)
+
+
+# attributes every record has; anything else on a record came from `extra`
+_record_attributes = frozenset(logging.makeLogRecord({}).__dict__) | {
+    "message",
+    "asctime",
+    "context",
+    "color_message",  # uvicorn's colored copy of the message
+}
+
+
+class json_formatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", {}))
+        for name, value in record.__dict__.items():
+            if name not in _record_attributes:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class context_filter(logging.Filter):
+    # runs on the thread that logs, where the request's context is current
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (context := request_log_context.get()) is not None:
+            record.context = context.values()
+        return True
+
+
+class debug_sampler(logging.Filter):
+    """keeps `ratio` of the debug records, dropped ones are never queued"""
+
+    def __init__(self, ratio: float) -> None:
+        super().__init__()
+        self.ratio = ratio
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.ratio
+
+
+class deferred_queue_handler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler formats the message before queueing it; here the
+        # listener thread does, so arguments must not be mutated once logged
+        return record
+
+
+def create_log_handlers() -> tuple[QueueHandler, QueueListener]:
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(json_formatter())
+
+    handler = deferred_queue_handler(log_queue)  # type: ignore
+    handler.addFilter(context_filter())
+    handler.addFilter(debug_sampler(config.LOG_DEBUG_SAMPLE_RATIO))
+    return handler, QueueListener(log_queue, output)  # type: ignore
+
+
+@lru_cache(maxsize=None)
+def setup_logging() -> QueueListener:
+    """
+    once per process, at startup so it replaces the handlers the server
+    installed: the loggers in config.LOG_QUEUED_LOGGERS only put records on a
+    queue, and a listener thread formats them as json lines to stdout.
+    the listener is stopped at exit, which writes out what is still queued.
+    """
+    handler, listener = create_log_handlers()
+    for name in config.LOG_QUEUED_LOGGERS:
+        logger = logging.getLogger(name)
+        logger.handlers = [handler]
+        logger.propagate = False
+    logging.getLogger("app").setLevel(config.LOG_LEVEL)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
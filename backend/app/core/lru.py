@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from typing import Generic, Hashable, Iterator, TypeVar, overload
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+_D = TypeVar("_D")
+
+
+class lru_dict(Generic[_K, _V]):
+    """
+    bounded mapping that drops the least recently used key once `maxsize` is hit.
+    not thread safe; meant to live on a single event loop.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize should be at least 1")
+        self.maxsize = maxsize
+        self._data: OrderedDict[_K, _V] = OrderedDict()
+
+    @overload
+    def get(self, key: _K) -> _V | None:
+        ...
+
+    @overload
+    def get(self, key: _K, default: _D) -> _V | _D:
+        ...
+
+    def get(self, key: _K, default: _D | None = None) -> _V | _D | None:
+        try:
+            value = self._data[key]
+        except KeyError:
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def pop(self, key: _K, default: _D | None = None) -> _V | _D | None:
+        return self._data.pop(key, default)
+
+    def __setitem__(self, key: _K, value: _V) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[_K]:
+        return iter(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -1,19 +1,69 @@
+import asyncio
 from typing import Any, Callable, Coroutine
 
 from fastapi import FastAPI
 
-from ..db.tasks import close_db_connection, connect_to_db
+from . import config
 
 
 def create_start_app_handler(app: FastAPI) -> Callable[[], Coroutine[Any, Any, None]]:
     async def start_app() -> None:
+        from ..db.partitions import run_partition_maintenance
+        from ..db.tasks import connect_to_db
+        from ..models.cleaning import cleanings
+        from ..services.authentication import create_password_policy, create_strategy
+        from ..services.idempotency import run_idempotency_sweeper
+        from ..services.purge import run_purger
+        from .logging import setup_logging
+
+        # first, so the startup itself is logged through the queue
+        setup_logging()
+
+        # loads the jwt keys and the password deny-list once,
+        # and fails startup on a bad key file
+        create_strategy()
+        create_password_policy()
         await connect_to_db(app)
 
+        app.state._idempotency_sweeper = asyncio.create_task(
+            run_idempotency_sweeper(
+                app.state._db,
+                config.IDEMPOTENCY_SWEEP_INTERVAL_SECONDS,
+                config.IDEMPOTENCY_KEY_TTL_SECONDS,
+            )
+        )
+        app.state._partition_maintenance = asyncio.create_task(
+            run_partition_maintenance(
+                app.state._db,
+                list(config.PARTITIONED_TABLES),
+                config.PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+                config.PARTITION_MONTHS_AHEAD,
+            )
+        )
+        app.state._purger = asyncio.create_task(
+            run_purger(
+                app.state._db,
+                [cleanings.get_table()],
+                config.PURGE_INTERVAL_SECONDS,
+                config.PURGE_RETENTION_SECONDS,
+                config.PURGE_BATCH_SIZE,
+                config.PURGE_THROTTLE_SECONDS,
+            )
+        )
+
     return start_app
 
 
 def create_stop_app_handler(app: FastAPI) -> Callable[[], Coroutine[Any, Any, None]]:
     async def stop_app() -> None:
+        from ..db.tasks import close_db_connection
+        from ..services.provisioning import shutdown_hash_pool
+
+        for name in ("_idempotency_sweeper", "_partition_maintenance", "_purger"):
+            if (task := getattr(app.state, name, None)) is not None:
+                task.cancel()
+                setattr(app.state, name, None)
+        shutdown_hash_pool()
         await close_db_connection(app)
 
     return stop_app
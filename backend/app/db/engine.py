@@ -1,3 +1,4 @@
+from functools import lru_cache
 from os import getenv
 from typing import Any, Literal, overload
 
@@ -18,6 +19,9 @@ def get_test_url(url: URL) -> URL:
     if url.database is None:
         raise ValueError("database name is None")
 
+    # one database per pytest-xdist worker, so workers run in parallel
+    if worker := getenv("PYTEST_XDIST_WORKER"):
+        return url.set(database=f"{url.database}_test_{worker}")
     return url.set(database=f"{url.database}_test")
 
 
@@ -27,8 +31,9 @@ def get_engine_kwargs(is_test: bool = False, **kwargs: Any) -> dict[str, Any]:
     if is_test:
         params["poolclass"] = NullPool
     else:
-        params["pool_size"] = 10
-        params["poolclass"] = QueuePool
+        # no poolclass: create_async_engine picks the asyncio adapted queue
+        # pool, create_engine the threading one the sync engine needs
+        params["pool_size"] = config.DB_POOL_SIZE
 
     return params | kwargs
 
@@ -55,13 +60,29 @@ def get_test_engine(engine: AsyncEngine, is_sync: bool = ...) -> AsyncEngine | E
 
 def get_test_engine(engine: AsyncEngine, is_sync: bool = False) -> AsyncEngine | Engine:
     if _is_test := is_test():
-        engine = create_engine_from_url(get_test_url(engine.url), is_test=_is_test)
+        # pooled like the app engine: the test session runs on one event loop,
+        # so its connections are reused across tests
+        engine = create_engine_from_url(get_test_url(engine.url))
 
     if is_sync:
         return convert_async_to_sync(engine, is_test=_is_test)
     return engine
 
 
+def get_pool_status(engine: AsyncEngine) -> dict[str, int]:
+    # only reads the pool counters, never checks a connection out
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+
 def convert_async_to_sync(engine: AsyncEngine, **kwargs: Any) -> Engine:
     return create_sync_engine_from_url(
         engine.url.set(drivername=engine.url.drivername.split("+")[0]), **kwargs
@@ -76,4 +97,8 @@ def create_engine_from_url(url: str | URL, **kwargs: Any) -> AsyncEngine:
     return create_async_engine(url, **get_engine_kwargs(**kwargs))
 
 
-engine = create_engine_from_url(config.DATABASE_URL)
+@lru_cache(maxsize=None)
+def get_engine() -> AsyncEngine:
+    # created on first use (lifespan startup, migrations) instead of at import,
+    # which also defers loading the asyncpg dialect
+    return create_engine_from_url(config.DATABASE_URL)
@@ -8,7 +8,9 @@ from sqlalchemy import engine_from_config, pool
 from sqlalchemy.exc import InvalidRequestError
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parents[3]))
-from app.db.engine import convert_async_to_sync, engine, get_test_engine, is_test
+from app.core import config as app_config
+from app.db.engine import convert_async_to_sync, get_engine, get_test_engine, is_test
+from app.db.online import is_dry_run
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -26,6 +28,8 @@ logger = logging.getLogger("alembic.env")
 # target_metadata = mymodel.Base.metadata
 target_metadata = None
 
+engine = get_engine()
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -56,6 +60,7 @@ def run_migrations_offline():
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
@@ -63,7 +68,35 @@ def run_migrations_offline():
 
 
 def do_run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # a migration waiting on a lock queues every query of the table behind it,
+    # so give up instead; `-x lock_timeout=0` waits forever
+    lock_timeout = context.get_x_argument(as_dictionary=True).get(
+        "lock_timeout", app_config.MIGRATION_LOCK_TIMEOUT
+    )
+    connection.exec_driver_sql(f"set lock_timeout = '{lock_timeout}'")
+    connection.commit()
+
+    if is_dry_run():
+        # every revision in one transaction that is rolled back, alembic_version
+        # included; the helpers of app.db.online only log in a dry run, and an
+        # autocommit block fails instead of committing
+        transaction = connection.begin()
+        context.configure(connection=connection, target_metadata=target_metadata)
+        try:
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            transaction.rollback()
+            logger.info("dry run: rolled back")
+        return
+
+    # one transaction per revision, so a failed backfill or concurrent index
+    # does not roll back the revisions applied before it
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=True,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -81,7 +114,8 @@ def run_migrations_online():
 
     default_sync_engine = convert_async_to_sync(engine)
 
-    if is_test():
+    # a dry run leaves the test database as it is too
+    if is_test() and not is_dry_run():
         from sqlalchemy import text
 
         with default_sync_engine.connect() as conn:
@@ -0,0 +1,28 @@
+"""case insensitive unique user email
+
+Revision ID: 2b7d0e5c9a41
+Revises: 596b9c74bea8
+Create Date: 2026-10-19 11:02:17.118342
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2b7d0e5c9a41"
+down_revision = "596b9c74bea8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # fails if two users already share an email up to case; merge them first
+    op.execute("drop index if exists ix_users_email")
+    op.create_index(
+        "ix_users_email_lower", "users", [sa.text("lower(email)")], unique=True
+    )
+
+
+def downgrade():
+    op.drop_index("ix_users_email_lower", table_name="users")
+    op.create_index("ix_users_email", "users", ["email"])
@@ -0,0 +1,37 @@
+"""create refresh tokens table
+
+Revision ID: 596b9c74bea8
+Revises: f721febf752b
+Create Date: 2026-10-19 10:12:41.503218
+
+"""
+import sys
+from pathlib import Path
+
+import sqlalchemy as sa
+from alembic import op
+
+sys.path.append(Path(__file__).resolve().parents[4].as_posix())
+from app.models.token import refresh_token
+
+# revision identifiers, used by Alembic.
+revision = "596b9c74bea8"
+down_revision = "f721febf752b"
+branch_labels = None
+depends_on = None
+
+refresh_tokens_table = refresh_token.get_table()
+
+
+def upgrade():
+    col_names = {"token_hash", "user_id", "expires_at"}
+
+    op.create_table(
+        refresh_tokens_table.name,
+        *[col for col in refresh_tokens_table.columns if col.name in col_names],
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+    )
+
+
+def downgrade():
+    op.drop_table(refresh_tokens_table.name)
@@ -0,0 +1,43 @@
+"""soft delete cleanings
+
+Revision ID: 5e0b6c3f9d14
+Revises: d3a97e15b2c8
+Create Date: 2026-10-19 15:41:27.093518
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e0b6c3f9d14"
+down_revision = "d3a97e15b2c8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # nullable without a default: no rewrite, every existing row stays live
+    op.add_column("cleanings", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+
+    # concurrently, so writes to cleanings are not blocked while they build
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_cleanings_live_created_at",
+            "cleanings",
+            ["created_at"],
+            postgresql_where=sa.text("deleted_at IS NULL"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_cleanings_deleted_at",
+            "cleanings",
+            ["deleted_at"],
+            postgresql_where=sa.text("deleted_at IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_cleanings_deleted_at", table_name="cleanings")
+    op.drop_index("ix_cleanings_live_created_at", table_name="cleanings")
+    op.drop_column("cleanings", "deleted_at")
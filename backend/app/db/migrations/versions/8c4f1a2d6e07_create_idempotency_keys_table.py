@@ -0,0 +1,35 @@
+"""create idempotency keys table
+
+Revision ID: 8c4f1a2d6e07
+Revises: 2b7d0e5c9a41
+Create Date: 2026-10-19 14:20:51.402715
+
+"""
+import sys
+from pathlib import Path
+
+from alembic import op
+
+sys.path.append(Path(__file__).resolve().parents[4].as_posix())
+from app.models.idempotency import idempotency_key
+
+# revision identifiers, used by Alembic.
+revision = "8c4f1a2d6e07"
+down_revision = "2b7d0e5c9a41"
+branch_labels = None
+depends_on = None
+
+idempotency_keys_table = idempotency_key.get_table()
+
+
+def upgrade():
+    col_names = {"key_hash", "request_hash", "status_code", "response", "created_at"}
+
+    op.create_table(
+        idempotency_keys_table.name,
+        *[col for col in idempotency_keys_table.columns if col.name in col_names],
+    )
+
+
+def downgrade():
+    op.drop_table(idempotency_keys_table.name)
@@ -0,0 +1,103 @@
+"""partition cleanings by month
+
+Revision ID: a61e2f8b4c30
+Revises: 5e0b6c3f9d14
+Create Date: 2026-10-19 16:27:44.518203
+
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from alembic import op
+
+sys.path.append(Path(__file__).resolve().parents[4].as_posix())
+from app.db.partitions import create_partition_sql, month_start
+
+# revision identifiers, used by Alembic.
+revision = "a61e2f8b4c30"
+down_revision = "5e0b6c3f9d14"
+branch_labels = None
+depends_on = None
+
+months_ahead = 3
+legacy_indexes = {
+    "ix_cleanings_name": "ix_cleanings_legacy_name",
+    "ix_cleanings_live_created_at": "ix_cleanings_legacy_live_created_at",
+    "ix_cleanings_deleted_at": "ix_cleanings_legacy_deleted_at",
+}
+
+
+def upgrade():
+    """
+    the existing table is attached as the partition of everything before next
+    month instead of copying its rows; every step that would scan it is proven
+    by a validated check constraint first, so the strong locks are brief.
+    """
+    boundary = month_start(datetime.now(), 1).isoformat()
+
+    op.execute("update cleanings set created_at = now() where created_at is null")
+    op.execute(
+        "alter table cleanings add constraint cleanings_legacy_range "
+        f"check (created_at is not null and created_at < '{boundary}') not valid"
+    )
+    op.execute("alter table cleanings validate constraint cleanings_legacy_range")
+    op.execute("alter table cleanings alter column created_at set not null")
+    with op.get_context().autocommit_block():
+        op.execute(
+            "create unique index concurrently if not exists cleanings_legacy_pkey "
+            "on cleanings (id, created_at)"
+        )
+
+    # the partition key has to be part of the primary key
+    op.execute(
+        "alter table cleanings drop constraint cleanings_pkey, "
+        "add constraint cleanings_legacy_pkey primary key "
+        "using index cleanings_legacy_pkey"
+    )
+    op.execute("alter table cleanings rename to cleanings_legacy")
+    for name, legacy_name in legacy_indexes.items():
+        op.execute(f"alter index {name} rename to {legacy_name}")
+
+    op.execute(
+        "create table cleanings (like cleanings_legacy including defaults) "
+        "partition by range (created_at)"
+    )
+    op.execute("alter table cleanings add primary key (id, created_at)")
+    op.execute("alter sequence cleanings_id_seq owned by cleanings.id")
+    op.execute(
+        "alter table cleanings attach partition cleanings_legacy "
+        f"for values from (minvalue) to ('{boundary}')"
+    )
+    op.execute("alter table cleanings_legacy drop constraint cleanings_legacy_range")
+
+    # the legacy partition's matching indexes are attached, not rebuilt
+    op.execute("create index ix_cleanings_name on cleanings (name)")
+    op.execute(
+        "create index ix_cleanings_live_created_at on cleanings (created_at) "
+        "where deleted_at is null"
+    )
+    op.execute(
+        "create index ix_cleanings_deleted_at on cleanings (deleted_at) "
+        "where deleted_at is not null"
+    )
+
+    start = month_start(datetime.now(), 1)
+    for months in range(months_ahead):
+        op.execute(create_partition_sql("cleanings", month_start(start, months)))
+
+
+def downgrade():
+    op.execute("alter table cleanings detach partition cleanings_legacy")
+    op.execute("insert into cleanings_legacy select * from cleanings")
+    op.execute("alter sequence cleanings_id_seq owned by cleanings_legacy.id")
+    op.execute("drop table cleanings")
+
+    op.execute("alter table cleanings_legacy rename to cleanings")
+    for name, legacy_name in legacy_indexes.items():
+        op.execute(f"alter index {legacy_name} rename to {name}")
+    op.execute(
+        "alter table cleanings drop constraint cleanings_legacy_pkey, "
+        "add primary key (id)"
+    )
+    op.execute("alter table cleanings alter column created_at drop not null")
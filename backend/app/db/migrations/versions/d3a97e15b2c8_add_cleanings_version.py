@@ -0,0 +1,27 @@
+"""add cleanings version
+
+Revision ID: d3a97e15b2c8
+Revises: 8c4f1a2d6e07
+Create Date: 2026-10-19 15:03:12.860144
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d3a97e15b2c8"
+down_revision = "8c4f1a2d6e07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a constant default is stored in the catalog, existing rows are not rewritten
+    op.add_column(
+        "cleanings",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column("cleanings", "version")
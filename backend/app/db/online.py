@@ -0,0 +1,255 @@
+"""
+helpers for revisions that change large tables without blocking them.
+
+    from app.db.online import backfill, create_index_concurrently
+
+    def upgrade():
+        create_index_concurrently("ix_cleanings_price", "cleanings", ["price"])
+        backfill(
+            "cleanings_updated_at",
+            "cleanings",
+            set_sql="updated_at = created_at",
+            where="updated_at is null",
+        )
+
+run with `alembic -x dry_run=true upgrade head` to only log what would run
+and how many rows a backfill would touch. the other operations of the
+revisions do run, in a single transaction that is rolled back at the end,
+so nothing is applied and alembic_version is left as it was.
+"""
+import logging
+import time
+
+import sqlalchemy as sa
+from alembic import context, op
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger("alembic.online")
+
+progress_table = "alembic_backfill_progress"
+max_identifier_length = 63
+
+
+def is_dry_run() -> bool:
+    value = context.get_x_argument(as_dictionary=True).get("dry_run", "")
+    return value.lower() in {"1", "true", "yes"}
+
+
+def get_partitions(connection: Connection, table: str) -> list[str]:
+    result = connection.execute(
+        sa.text(
+            "select child.relname "
+            "from pg_inherits join pg_class child on child.oid = pg_inherits.inhrelid "
+            "where pg_inherits.inhparent = cast(:table as regclass) "
+            "order by child.relname"
+        ),
+        {"table": table},
+    )
+    return list(result.scalars())
+
+
+def is_invalid_index(connection: Connection, name: str) -> bool:
+    result = connection.execute(
+        sa.text(
+            "select not indisvalid from pg_index "
+            "where indexrelid = to_regclass(:name)"
+        ),
+        {"name": name},
+    )
+    return bool(result.scalar())
+
+
+def drop_invalid_index(connection: Connection, name: str) -> None:
+    # a concurrent build that failed or was canceled leaves an invalid index
+    # behind, which `if not exists` would then keep
+    if is_invalid_index(connection, name):
+        logger.info("dropping invalid index %s", name)
+        op.execute(f"drop index concurrently if exists {name}")
+
+
+def get_index_sql(
+    name: str,
+    table: str,
+    columns: list[str],
+    unique: bool = False,
+    where: str | None = None,
+    concurrently: bool = True,
+    only: bool = False,
+) -> str:
+    return (
+        f"create {'unique ' if unique else ''}index "
+        f"{'concurrently ' if concurrently else ''}if not exists {name} "
+        f"on {'only ' if only else ''}{table} ({', '.join(columns)})"
+        + (f" where {where}" if where else "")
+    )
+
+
+def create_index_concurrently(
+    name: str,
+    table: str,
+    columns: list[str],
+    unique: bool = False,
+    where: str | None = None,
+) -> None:
+    """
+    build an index without blocking writes, outside the migration transaction.
+    a partitioned parent can't be indexed concurrently, so the parent index is
+    created empty `on only` the parent, every partition is indexed concurrently
+    and attached, and the parent index turns valid with the last one.
+    safe to rerun after a failure: a concurrent build that failed, or was
+    canceled by lock_timeout, leaves an invalid index that is dropped and built
+    again. the invalid parent index of an unfinished run is kept, the partitions
+    indexed since are attached to it.
+    """
+    if is_dry_run():
+        logger.info("dry run: would create index %s on %s", name, table)
+        return
+
+    with op.get_context().autocommit_block():
+        if context.is_offline_mode():
+            op.execute(get_index_sql(name, table, columns, unique, where))
+            return
+
+        connection = op.get_bind()
+        if not (partitions := get_partitions(connection, table)):
+            drop_invalid_index(connection, name)
+            op.execute(get_index_sql(name, table, columns, unique, where))
+            return
+
+        op.execute(
+            get_index_sql(
+                name, table, columns, unique, where, concurrently=False, only=True
+            )
+        )
+        for partition in partitions:
+            partition_index = f"{partition}_{name}"[:max_identifier_length]
+            drop_invalid_index(connection, partition_index)
+            op.execute(
+                get_index_sql(partition_index, partition, columns, unique, where)
+            )
+            op.execute(f"alter index {name} attach partition {partition_index}")
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    if is_dry_run():
+        logger.info("dry run: would drop index %s", name)
+        return
+
+    with op.get_context().autocommit_block():
+        # a partitioned index can only be dropped as a whole
+        if not context.is_offline_mode() and get_partitions(op.get_bind(), table):
+            op.execute(f"drop index if exists {name}")
+        else:
+            op.execute(f"drop index concurrently if exists {name}")
+
+
+def estimate_rows(connection: Connection, table: str, where: str) -> int:
+    # the planner's estimate, nothing is scanned
+    plan = connection.execute(
+        sa.text(f"explain (format json) select 1 from {table} where {where}")
+    ).scalar_one()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def backfill(
+    name: str,
+    table: str,
+    set_sql: str,
+    where: str,
+    batch_size: int = 1000,
+    sleep_seconds: float = 0.1,
+    key: str = "id",
+) -> None:
+    """
+    `update {table} set {set_sql} where {where}`, one range of `batch_size`
+    keys per transaction with a pause in between, so locks stay short and
+    autovacuum and replicas keep up. the last key done is saved under `name`
+    after every batch and an interrupted run resumes from there;
+    a batch may run twice after a crash, so the update must be idempotent.
+    `key` must be an integer column, unique like the primary key: the last key
+    done is saved as a bigint.
+    """
+    if context.is_offline_mode():
+        op.execute(f"update {table} set {set_sql} where {where}")
+        return
+
+    connection = op.get_bind()
+    estimate = estimate_rows(connection, table, where)
+    batches = -(-estimate // batch_size)
+    logger.info(
+        "backfill %s: about %d rows in %d batches, %.1fs of pauses",
+        name,
+        estimate,
+        batches,
+        batches * sleep_seconds,
+    )
+    if is_dry_run():
+        return
+
+    with op.get_context().autocommit_block():
+        connection.execute(
+            sa.text(
+                f"create table if not exists {progress_table} ("
+                "name text primary key, last_key bigint, rows bigint not null, "
+                "done boolean not null, updated_at timestamp not null)"
+            )
+        )
+        progress = connection.execute(
+            sa.text(
+                f"select last_key, rows, done from {progress_table} where name = :name"
+            ),
+            {"name": name},
+        ).first()
+        if progress is not None and progress.done:
+            logger.info("backfill %s: already done", name)
+            return
+        last_key, rows = (progress.last_key, progress.rows) if progress else (None, 0)
+
+        while True:
+            upper = connection.execute(
+                sa.text(
+                    f"select max({key}) from (select {key} from {table} "
+                    f"where :last_key is null or {key} > :last_key "
+                    f"order by {key} limit :batch_size) batch"
+                ),
+                {"last_key": last_key, "batch_size": batch_size},
+            ).scalar_one()
+            if upper is not None:
+                updated = connection.execute(
+                    sa.text(
+                        f"update {table} set {set_sql} "
+                        f"where (:last_key is null or {key} > :last_key) "
+                        f"and {key} <= :upper and ({where})"
+                    ),
+                    {"last_key": last_key, "upper": upper},
+                )
+                last_key, rows = upper, rows + updated.rowcount
+            connection.execute(
+                sa.text(
+                    f"insert into {progress_table} values "
+                    "(:name, :last_key, :rows, :done, now()) on conflict (name) do "
+                    "update set last_key = excluded.last_key, rows = excluded.rows, "
+                    "done = excluded.done, updated_at = excluded.updated_at"
+                ),
+                {
+                    "name": name,
+                    "last_key": last_key,
+                    "rows": rows,
+                    "done": upper is None,
+                },
+            )
+            if upper is None:
+                logger.info("backfill %s: done, %d rows updated", name, rows)
+                return
+            time.sleep(sleep_seconds)
+
+
+def reset_backfill(name: str) -> None:
+    # for downgrades, so the next upgrade runs the backfill again
+    if context.is_offline_mode() or is_dry_run():
+        return
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"do $$ begin if to_regclass('{progress_table}') is not null then "
+            f"delete from {progress_table} where name = '{name}'; end if; end $$"
+        )
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio.engine import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+re_upper_bound = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(moment: datetime, months: int = 0) -> datetime:
+    """the first instant of the month `months` after the month of `moment`"""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table_name: str, start: datetime) -> str:
+    return f"{table_name}_y{start.year:04d}m{start.month:02d}"
+
+
+def create_partition_sql(table_name: str, start: datetime) -> str:
+    return (
+        f"create table if not exists {partition_name(table_name, start)} "
+        f"partition of {table_name} for values "
+        f"from ('{start.isoformat()}') to ('{month_start(start, 1).isoformat()}')"
+    )
+
+
+async def get_partitions(
+    connection: AsyncConnection, table_name: str
+) -> dict[str, datetime | None]:
+    """partition name to its exclusive upper bound, None for MAXVALUE"""
+    result = await connection.execute(
+        text(
+            "select child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "from pg_inherits join pg_class child on child.oid = pg_inherits.inhrelid "
+            "where pg_inherits.inhparent = cast(:table_name as regclass)"
+        ),
+        {"table_name": table_name},
+    )
+    partitions: dict[str, datetime | None] = {}
+    for name, bound in result:
+        upper = re_upper_bound.search(bound)
+        partitions[name] = datetime.fromisoformat(upper[1]) if upper else None
+    return partitions
+
+
+async def ensure_partitions(
+    engine: AsyncEngine, table_name: str, months_ahead: int
+) -> list[str]:
+    """
+    create the monthly partitions from the end of the last existing one
+    through `months_ahead` months after the current month.
+    rows are only ever routed to existing partitions, so this runs at startup
+    and then periodically, well before a month begins.
+    """
+    async with engine.begin() as connection:
+        bounds = (await get_partitions(connection, table_name)).values()
+        # not partitioned, or a partition already takes every later row
+        if not bounds or None in bounds:
+            return []
+        current = month_start(datetime.now())
+        start = max([current, *bounds])  # type: ignore
+        created = []
+        while start <= month_start(current, months_ahead):
+            await connection.execute(text(create_partition_sql(table_name, start)))
+            created.append(partition_name(table_name, start))
+            start = month_start(start, 1)
+    return created
+
+
+async def detach_partition(engine: AsyncEngine, table_name: str, name: str) -> None:
+    """
+    detach a partition without blocking reads or writes of the table.
+    the detached table keeps its rows and indexes, ready to be dumped,
+    moved to cheaper storage or dropped.
+    """
+    # concurrently can't run inside a transaction block
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        if name not in await get_partitions(connection, table_name):
+            raise ValueError(f"{name} is not a partition of {table_name}")
+        await connection.execute(
+            text(f"alter table {table_name} detach partition {name} concurrently")
+        )
+
+
+async def run_partition_maintenance(
+    engine: AsyncEngine,
+    table_names: list[str],
+    interval_seconds: float,
+    months_ahead: int,
+) -> None:
+    while True:
+        for table_name in table_names:
+            try:
+                if created := await ensure_partitions(engine, table_name, months_ahead):
+                    logger.info(
+                        "created partitions",
+                        extra={"table": table_name, "partitions": created},
+                    )
+            except Exception:
+                logger.warning(
+                    "partition maintenance failed",
+                    extra={"table": table_name},
+                    exc_info=True,
+                )
+        await asyncio.sleep(interval_seconds)
@@ -20,6 +20,8 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql.base import Executable
 from sqlmodel.sql.expression import Select, SelectOfScalar
 
+from . import timeout  # noqa: F401  registers the statement timeout listener
+
 _TSelectParam = TypeVar("_TSelectParam")
 
 
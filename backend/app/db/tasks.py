@@ -1,34 +1,124 @@
+import asyncio
 import logging
-from typing import cast
+from typing import Awaitable, Callable, cast
+from uuid import UUID
 
 from fastapi import FastAPI
-from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlalchemy.ext.asyncio.engine import AsyncConnection, AsyncEngine
+from sqlalchemy.pool import QueuePool
 
-from .engine import engine, get_test_engine
+from ..core import config
+from ..services.metrics import instrument_pool
+from ..services.tracing import instrument_engine
+from .engine import get_engine, get_test_engine
+from .session import async_session
 
 logger = logging.getLogger(__name__)
 
 
-async def connect_to_db(app: FastAPI) -> None:
-    _engine = get_test_engine(engine)
+async def _warm_up_cleanings(session: async_session) -> None:
+    from ..models import cleaning
+
+    await cleaning.cleanings.get_live(session, 0)
+
+
+async def _warm_up_users(session: async_session) -> None:
+    from ..models import user
+    from ..services.authentication.convert import user_db_class
+
+    db = user_db_class(session, user.user)
+    await db.get(UUID(int=0))
+    await db.get_by_email("")
+
+
+# hot queries: running them once per connection makes asyncpg introspect the
+# column types and keeps the prepared statements in its per connection cache
+warm_up_queries: list[Callable[[async_session], Awaitable[None]]] = [
+    _warm_up_cleanings,
+    _warm_up_users,
+]
+
+
+def get_warm_up_size(engine: AsyncEngine) -> int:
+    if isinstance(pool := engine.pool, QueuePool):
+        return max(1, min(config.DB_WARMUP_CONNECTIONS, pool.size()))
+    return 1
+
 
+async def warm_up_connection(connection: AsyncConnection) -> None:
+    async with async_session(bind=connection, autoflush=False) as session:
+        for query in warm_up_queries:
+            await query(session)
+
+
+async def warm_up_pool(engine: AsyncEngine, size: int) -> None:
+    # every connection is checked out before any is returned,
+    # so the pool really opens `size` connections
+    connections = [engine.connect() for _ in range(size)]
     try:
-        async with _engine.connect():
-            logger.info(
-                f"connected db: {_engine.url.render_as_string(hide_password=True)}"
+        # the first connect runs the dialect initialization alone,
+        # the others only start once it is done
+        await connections[0].start()
+        started = await asyncio.gather(
+            *(connection.start() for connection in connections[1:]),
+            return_exceptions=True,
+        )
+        for result in started:
+            if isinstance(result, BaseException):
+                raise result
+
+        await asyncio.gather(
+            *(warm_up_connection(connection) for connection in connections)
+        )
+    finally:
+        await asyncio.gather(
+            *(connection.close() for connection in connections),
+            return_exceptions=True,
+        )
+
+
+async def connect_to_db(app: FastAPI) -> None:
+    app.state._db_ready = False
+    _engine = get_test_engine(get_engine())
+    size = get_warm_up_size(_engine)
+    url = _engine.url.render_as_string(hide_password=True)
+
+    for attempt in range(1, config.DB_CONNECT_RETRIES + 1):
+        try:
+            await warm_up_pool(_engine, size)
+            break
+        except Exception:
+            await _engine.dispose()
+            if attempt == config.DB_CONNECT_RETRIES:
+                logger.error(
+                    "db connection failed, giving up",
+                    extra={"url": url, "attempt": attempt},
+                    exc_info=True,
+                )
+                raise
+
+            delay = min(
+                config.DB_CONNECT_BACKOFF_SECONDS * 2 ** (attempt - 1),
+                config.DB_CONNECT_BACKOFF_MAX_SECONDS,
             )
-        app.state._db = _engine
-    except Exception as e:
-        logger.warning("--- DB CONNECTION ERROR ---")
-        logger.warning(e)
-        logger.warning("--- DB CONNECTION ERROR ---")
+            logger.warning(
+                "db connection failed, retrying",
+                extra={"url": url, "attempt": attempt, "delay_seconds": delay},
+                exc_info=True,
+            )
+            await asyncio.sleep(delay)
+
+    logger.info("connected db", extra={"url": url, "warmed_up": size})
+    instrument_pool(_engine)
+    instrument_engine(_engine)
+    app.state._db = _engine
+    app.state._db_ready = True
 
 
 async def close_db_connection(app: FastAPI) -> None:
+    app.state._db_ready = False
     engine = cast(AsyncEngine, app.state._db)
     try:
         await engine.dispose()
-    except Exception as e:
-        logger.warning("--- DB DISCONNECT ERROR ---")
-        logger.warning(e)
-        logger.warning("--- DB DISCONNECT ERROR ---")
+    except Exception:
+        logger.warning("db disconnect failed", exc_info=True)
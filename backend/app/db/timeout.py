@@ -0,0 +1,23 @@
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlmodel.orm.session import Session
+
+# milliseconds; set per request from the route name, None keeps the server default
+statement_timeout: ContextVar[int | None] = ContextVar(
+    "statement_timeout", default=None
+)
+
+QUERY_CANCELED = "57014"
+
+
+@event.listens_for(Session, "after_begin")
+def _set_local_statement_timeout(
+    session: Session, transaction: Any, connection: Connection
+) -> None:
+    # `set local` ends with the transaction, so the pooled connection
+    # goes back with the server default. only costs a statement when set.
+    if (timeout := statement_timeout.get()) is not None:
+        connection.exec_driver_sql(f"set local statement_timeout = {int(timeout)}")
@@ -1,9 +1,40 @@
+from functools import wraps
+from typing import Any, Callable
+
+from ..core.logging import bind_log_context
 from ..services.authentication import fastapi_user_class
+from ..services.tracing import trace_span
 
 fastapi_user = fastapi_user_class.init()
 
-get_current_user = fastapi_user.users.current_user(
-    optional=False, active=True, verified=False, superuser=False
+
+def current_user_dependency(name: str, dependency: Callable) -> Callable:
+    """
+    traces `dependency` and adds the user it returns to the log context.
+    wraps keeps the signature, so fastapi still resolves its sub dependencies
+    """
+
+    @wraps(dependency)
+    async def current_user(*args: Any, **kwargs: Any) -> Any:
+        with trace_span(name):
+            found = await dependency(*args, **kwargs)
+        bind_log_context(user_id=str(found.id))
+        return found
+
+    return current_user
+
+
+get_current_user = current_user_dependency(
+    "get_current_user",
+    fastapi_user.users.current_user(
+        optional=False, active=True, verified=False, superuser=False
+    ),
+)
+get_current_superuser = current_user_dependency(
+    "get_current_superuser",
+    fastapi_user.users.current_user(
+        optional=False, active=True, verified=False, superuser=True
+    ),
 )
 get_user_manager = fastapi_user.get_user_manager
 get_backend = fastapi_user.get_backend
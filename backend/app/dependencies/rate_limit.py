@@ -0,0 +1,46 @@
+from math import ceil
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request, status
+
+from ..services.authentication import create_strategy
+from ..services.rate_limit import rate_limit_exceeded, rate_limiter
+from ..services.tracing import trace_span
+
+
+def get_client_key(request: Request) -> str:
+    # a valid bearer token keys the bucket by user, anything else by address.
+    # decode_claims is served from the claim cache for repeat tokens.
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        claims = create_strategy().decode_claims(token)  # type: ignore
+        if claims is not None and (user_id := claims.get("user_id")) is not None:
+            return f"user:{user_id}"
+
+    host = request.client.host if request.client is not None else "unknown"
+    return f"ip:{host}"
+
+
+async def limit_rate(request: Request) -> AsyncIterator[None]:
+    limiter: rate_limiter | None = getattr(request.app.state, "_rate_limiter", None)
+    route = request.scope.get("route")
+    name = getattr(route, "name", None)
+    if limiter is None or name is None or (rule := limiter.rules.get(name)) is None:
+        yield
+        return
+
+    key = f"{name}:{get_client_key(request)}"
+    try:
+        with trace_span("rate limit", route=name):
+            await limiter.acquire(key, rule)
+    except rate_limit_exceeded as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests.",
+            headers={"Retry-After": str(max(1, ceil(exc.retry_after)))},
+        )
+
+    try:
+        yield
+    finally:
+        limiter.release(key)
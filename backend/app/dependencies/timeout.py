@@ -0,0 +1,27 @@
+from typing import AsyncIterator
+
+from fastapi import Request, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.exc import DBAPIError
+
+from ..core import config
+from ..db.timeout import QUERY_CANCELED, statement_timeout
+
+
+async def limit_statement_time(request: Request) -> AsyncIterator[None]:
+    name = getattr(request.scope.get("route"), "name", None)
+    timeout = config.STATEMENT_TIMEOUTS.get(name, config.DB_STATEMENT_TIMEOUT_MS)
+    token = statement_timeout.set(timeout or None)
+    try:
+        yield
+    finally:
+        statement_timeout.reset(token)
+
+
+async def query_canceled_handler(request: Request, exc: DBAPIError) -> ORJSONResponse:
+    if getattr(exc.orig, "sqlstate", None) != QUERY_CANCELED:
+        raise exc
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "The request took too long."},
+    )
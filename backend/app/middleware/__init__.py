@@ -0,0 +1,6 @@
+from .admission import *
+from .disconnect import *
+from .log_context import *
+from .metrics import *
+from .options import *
+from .tracing import *
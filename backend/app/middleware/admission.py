@@ -0,0 +1,78 @@
+from time import monotonic
+from typing import Iterable
+
+from fastapi.responses import ORJSONResponse
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..services.admission import (
+    READ_PRIORITY,
+    WRITE_PRIORITY,
+    admission_controller,
+    admission_rejected,
+)
+from ..services.tracing import trace_span
+
+read_methods = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class admission_control:
+    """
+    sheds load with 503 once the adaptive concurrency limit is reached,
+    instead of letting requests queue in the server and time out on the pool.
+    the latency fed back to the limit includes any wait for a pool connection.
+    routes slow by design have their own target in `latency_targets`, by route
+    name in seconds. a target of 0 leaves the route out of the limit: it's
+    matched against `routes` before routing and never takes a slot.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: admission_controller,
+        exempt_paths: tuple[str, ...] = (),
+        latency_targets: dict[str, float] | None = None,
+        routes: Iterable[BaseRoute] = (),
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.exempt_paths = exempt_paths
+        self.latency_targets = latency_targets or {}
+        self.exempt_routes = tuple(
+            route
+            for route in routes
+            if self.latency_targets.get(getattr(route, "name", None)) == 0
+        )
+
+    def is_exempt(self, scope: Scope) -> bool:
+        if scope["path"].startswith(self.exempt_paths):
+            return True
+        return any(
+            route.matches(scope)[0] is Match.FULL for route in self.exempt_routes
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.is_exempt(scope):
+            await self.app(scope, receive, send)
+            return
+
+        priority = READ_PRIORITY if scope["method"] in read_methods else WRITE_PRIORITY
+        try:
+            with trace_span("admission", priority=priority):
+                await self.controller.acquire(priority)
+        except admission_rejected:
+            response = ORJSONResponse(
+                status_code=503,
+                content={"detail": "The server is overloaded, try again later."},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            latency = monotonic() - started
+            name = getattr(scope.get("route"), "name", None)
+            self.controller.release(latency, self.latency_targets.get(name))
@@ -0,0 +1,66 @@
+import asyncio
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class cancel_on_disconnect:
+    """
+    cancels a request whose client went away before the response was complete.
+    the cancellation reaches the awaited query, asyncpg cancels it on the server
+    and the pooled connection is freed now instead of when the query ends.
+
+    the client's messages are read here and handed to the app through a queue,
+    so a disconnect is seen without the app polling `request.is_disconnected`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        response_complete = False
+
+        async def receive_message() -> Message:
+            message = await messages.get()
+            if message["type"] == "http.disconnect":
+                # every later receive sees the disconnect too
+                messages.put_nowait(message)
+            return message
+
+        async def send_message(message: Message) -> None:
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                response_complete = True
+            await send(message)
+
+        handler = asyncio.ensure_future(self.app(scope, receive_message, send_message))
+        receiving = asyncio.ensure_future(receive())
+        try:
+            while not handler.done():
+                await asyncio.wait(
+                    {handler, receiving}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not receiving.done():
+                    break
+                messages.put_nowait(message := receiving.result())
+                if message["type"] == "http.disconnect":
+                    # after a complete response this is only the server's
+                    # end of cycle notice, the app may still be cleaning up
+                    if not response_complete:
+                        handler.cancel()
+                    break
+                receiving = asyncio.ensure_future(receive())
+
+            await asyncio.wait({handler})
+        finally:
+            receiving.cancel()
+            handler.cancel()
+
+        if not handler.cancelled():
+            handler.result()
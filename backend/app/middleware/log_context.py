@@ -0,0 +1,46 @@
+import re
+from uuid import uuid4
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..core.logging import log_context, request_log_context
+
+# a client supplied id is kept only when it's safe to log as is
+re_request_id = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+class bind_request_log_context:
+    """
+    every record logged while serving a request carries its request id, route
+    name and user id. the id is the client's `X-Request-ID` or a new one,
+    and is sent back in the response headers.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not re_request_id.match(request_id):
+            request_id = uuid4().hex
+
+        async def send_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        token = request_log_context.set(log_context(request_id, scope))
+        try:
+            await self.app(scope, receive, send_request_id)
+        finally:
+            request_log_context.reset(token)
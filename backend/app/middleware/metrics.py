@@ -0,0 +1,37 @@
+from time import perf_counter
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..services.metrics import http_request_duration, http_requests
+
+
+class record_metrics:
+    """
+    counts requests and their latency by route name. the route is only known
+    once the router matched it, so it's read from the scope afterwards;
+    paths that match no route share the `unmatched` name.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            name = getattr(scope.get("route"), "name", None) or "unmatched"
+            http_request_duration.observe(perf_counter() - started, route=name)
+            http_requests.inc(route=name, method=scope["method"], status=status_code)
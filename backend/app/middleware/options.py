@@ -0,0 +1,146 @@
+from collections import defaultdict
+from re import Pattern
+from typing import Iterable
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+from starlette.routing import BaseRoute, Route
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class allowed_methods:
+    """
+    the `Allow` header of every path of an application, built once from its
+    routes. static paths are a dict lookup, paths with parameters are matched
+    in route order.
+    """
+
+    def __init__(self, routes: Iterable[BaseRoute]) -> None:
+        methods: dict[str, set[str]] = defaultdict(set)
+        regexes: dict[str, Pattern] = {}
+        for route in routes:
+            # APIRoute is a Route; mounts and websocket routes have no methods
+            if isinstance(route, Route) and route.methods:
+                methods[route.path].update(route.methods)
+                regexes.setdefault(route.path, route.path_regex)
+
+        self.static: dict[str, str] = {}
+        self.dynamic: list[tuple[Pattern, str]] = []
+        for path, path_methods in methods.items():
+            allow = ", ".join(sorted(path_methods | {"OPTIONS"}))
+            if "{" in path:
+                self.dynamic.append((regexes[path], allow))
+            else:
+                self.static[path] = allow
+
+    def get(self, path: str) -> str | None:
+        if (allow := self.static.get(path)) is not None:
+            return allow
+        for regex, allow in self.dynamic:
+            if regex.match(path):
+                return allow
+        return None
+
+
+class answer_options:
+    """
+    answers OPTIONS requests and CORS preflights of known paths from
+    `allowed_methods`, before admission control, the app dependencies and the
+    router. a preflight only allows the methods of its path; requested headers
+    are mirrored, like CORSMiddleware with `allow_headers=["*"]`. other requests,
+    and OPTIONS of unknown paths, go on to CORSMiddleware.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        table: allowed_methods,
+        allow_origins: tuple[str, ...] = ("*",),
+        allow_credentials: bool = False,
+        max_age: int = 600,
+    ) -> None:
+        self.app = app
+        self.table = table
+        self.allow_all_origins = "*" in allow_origins
+        self.allow_origins = frozenset(allow_origins)
+        # with credentials a wildcard origin isn't accepted by browsers,
+        # so the request's origin is echoed back
+        self.echo_origin = not self.allow_all_origins or allow_credentials
+
+        # headers of every answer to a cross origin request
+        self.origin_headers: list[tuple[bytes, bytes]] = []
+        if allow_credentials:
+            self.origin_headers.append((b"access-control-allow-credentials", b"true"))
+        if self.echo_origin:
+            self.origin_headers.append((b"vary", b"Origin"))
+        else:
+            self.origin_headers.append((b"access-control-allow-origin", b"*"))
+
+        # per Allow value, since paths share few distinct method sets
+        max_age = (b"access-control-max-age", str(max_age).encode())
+        self.preflight_headers: dict[str, list[tuple[bytes, bytes]]] = {}
+        self.allowed: dict[str, frozenset[str]] = {}
+        for allow in {*table.static.values(), *(allow for _, allow in table.dynamic)}:
+            self.preflight_headers[allow] = [
+                (b"access-control-allow-methods", allow.encode()),
+                max_age,
+                *self.origin_headers,
+            ]
+            self.allowed[allow] = frozenset(allow.split(", "))
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        return self.allow_all_origins or origin in self.allow_origins
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "OPTIONS"
+            or (allow := self.table.get(scope["path"])) is None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        origin = headers.get("origin")
+        if origin is None:
+            await self.send_empty(send, [(b"allow", allow.encode())])
+            return
+
+        allowed_origin = self.is_allowed_origin(origin)
+        echoed = [(b"access-control-allow-origin", origin.encode("latin-1"))]
+        if "access-control-request-method" not in headers:
+            # a plain OPTIONS from a page, answered like CORSMiddleware would
+            response_headers = [(b"allow", allow.encode())]
+            if allowed_origin:
+                response_headers.extend(self.origin_headers)
+                if self.echo_origin:
+                    response_headers.extend(echoed)
+            await self.send_empty(send, response_headers)
+            return
+
+        failures = []
+        if not allowed_origin:
+            failures.append("origin")
+        if headers["access-control-request-method"] not in self.allowed[allow]:
+            failures.append("method")
+
+        response_headers = list(self.preflight_headers[allow])
+        if self.echo_origin and allowed_origin:
+            response_headers.extend(echoed)
+        if (requested := headers.get("access-control-request-headers")) is not None:
+            response_headers.append(
+                (b"access-control-allow-headers", requested.encode("latin-1"))
+            )
+
+        if failures:
+            response = PlainTextResponse(
+                "Disallowed CORS " + ", ".join(failures), status_code=400
+            )
+            response.raw_headers.extend(response_headers)
+            await response(scope, receive, send)
+            return
+        await self.send_empty(send, response_headers)
+
+    async def send_empty(self, send: Send, headers: list[tuple[bytes, bytes]]) -> None:
+        await send({"type": "http.response.start", "status": 204, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,45 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..services.tracing import tracer, use_span
+
+
+class trace_requests:
+    """
+    the local root span of every sampled request, continuing the trace of
+    its `traceparent` header. the route name is read from the scope once the
+    router matched it, like record_metrics does.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: tracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        root = self.tracer.start_trace(
+            f"HTTP {scope['method']}", traceparent, path=scope["path"]
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.attributes["status"] = message["status"]
+            await send(message)
+
+        with use_span(root):
+            try:
+                await self.app(scope, receive, send_status)
+            finally:
+                name = getattr(scope.get("route"), "name", None) or "unmatched"
+                root.attributes["route"] = name
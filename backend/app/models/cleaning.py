@@ -1,9 +1,20 @@
+from datetime import datetime
 from enum import Enum
 
 from pydantic import condecimal
-from sqlmodel import Field
+from sqlalchemy import Index, PrimaryKeyConstraint
+from sqlmodel import Field, select
+from sqlmodel.sql.expression import SelectOfScalar
 
-from .core import base_model, datetime_model, int_id_model
+from ..db.session import async_session
+from .core import (
+    base_model,
+    datetime_model,
+    int_id_model,
+    local_naive,
+    soft_delete_model,
+    version_model,
+)
 
 price_decimal_type = condecimal(max_digits=10, decimal_places=2)
 
@@ -30,7 +41,27 @@ class cleaning_update(cleaning_base):
     cleaning_type: cleaning_type_enum | None = None
 
 
-class cleanings(int_id_model, datetime_model, cleaning_base, table=True):
+class cleanings(
+    int_id_model,
+    datetime_model,
+    version_model,
+    soft_delete_model,
+    cleaning_base,
+    table=True,
+):
+    # monthly range partitions, see app.db.partitions;
+    # the partition key has to be part of the primary key.
+    # spelled out so the identity is (id, created_at) like the table's,
+    # not in the order the model fields happen to be collected
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id: int | None = Field(
+        None, primary_key=True, sa_column_kwargs={"autoincrement": True}
+    )
+    created_at: datetime = Field(default_factory=datetime.now, primary_key=True)
     name: str = Field(index=True)
     cleaning_type: cleaning_type_enum = Field(
         cleaning_type_enum.spot_clean,
@@ -38,6 +69,41 @@ class cleanings(int_id_model, datetime_model, cleaning_base, table=True):
     )
     price: price_decimal_type
 
+    @classmethod
+    def select_live(
+        cls,
+        created_after: datetime | None = None,
+        created_before: datetime | None = None,
+    ) -> SelectOfScalar["cleanings"]:
+        # a created_at range lets postgres skip the partitions outside of it
+        statement = select(cls).where(cls.deleted_at.is_(None))  # type: ignore
+        if created_after is not None:
+            statement = statement.where(cls.created_at >= local_naive(created_after))
+        if created_before is not None:
+            statement = statement.where(cls.created_at < local_naive(created_before))
+        return statement
+
+    @classmethod
+    async def get_live(cls, session: async_session, id: int) -> "cleanings | None":
+        # not session.get: the identity is (id, created_at),
+        # and a soft deleted row is still in the table
+        table = await session.exec(cls.select_live().where(cls.id == id))
+        return table.first()
+
+
+# reads only ever see live rows, so their indexes skip the deleted ones;
+# the purge finds deleted rows through the opposite partial index
+Index(
+    "ix_cleanings_live_created_at",
+    cleanings.created_at,
+    postgresql_where=cleanings.deleted_at.is_(None),  # type: ignore
+)
+Index(
+    "ix_cleanings_deleted_at",
+    cleanings.deleted_at,
+    postgresql_where=cleanings.deleted_at.isnot(None),  # type: ignore
+)
+
 
-class cleaning_public(int_id_model, cleaning_base):
+class cleaning_public(int_id_model, version_model, cleaning_base):
     ...
@@ -48,6 +48,16 @@ class uuid_id_model(id_model):
     id: UUID4 | None = Field(default_factory=uuid4, primary_key=True)
 
 
+def local_naive(value: datetime) -> datetime:
+    """
+    the timestamp columns are timezone naive and written with datetime.now(),
+    so an aware value is compared on that local clock; a naive one already is
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
 class datetime_model(fix_return_type_model):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
@@ -60,3 +70,17 @@ class datetime_model(fix_return_type_model):
     @property
     def datetime_attrs(cls) -> set[str]:
         return set(datetime_model.__fields__.keys())
+
+
+class version_model(fix_return_type_model):
+    """
+    optimistic locking: every update is `WHERE id = :id AND version = :version`
+    and bumps the version, so a lost update shows up as zero rows updated.
+    """
+
+    version: int = Field(1, nullable=False, sa_column_kwargs={"server_default": "1"})
+
+
+class soft_delete_model(fix_return_type_model):
+    # set instead of deleting the row; rows are purged in batches later
+    deleted_at: datetime | None = None
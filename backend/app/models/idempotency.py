@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlmodel import Field
+
+from .core import base_model
+
+
+class idempotency_key(base_model, table=True):
+    __tablename__: str = "idempotency_keys"
+
+    # sha256 of route name and the client's key, fixed width whatever the client sends
+    key_hash: bytes = Field(primary_key=True)
+    # sha256 of the canonical request body, a reused key must match it
+    request_hash: bytes
+    status_code: int | None = None
+    response: bytes | None = None
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
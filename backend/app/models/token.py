@@ -0,0 +1,21 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlmodel import Field
+
+from .core import base_model
+
+
+class refresh_token(base_model, table=True):
+    __tablename__: str = "refresh_tokens"
+
+    # sha256 of the token handed to the client; the token itself is never stored
+    token_hash: bytes = Field(primary_key=True)
+    user_id: UUID = Field(foreign_key="users.id", index=True)
+    expires_at: datetime
+
+
+class token_model(base_model):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
@@ -1,8 +1,10 @@
-from typing import TypeVar
+import re
+from typing import Iterable, TypeVar
 
 from fastapi_users import schemas
 from pydantic import EmailStr
 from pydantic import Field as _Field
+from sqlalchemy import Index, func
 from sqlmodel import Field, select
 
 from ..db.session import async_session
@@ -10,6 +12,7 @@ from .core import base_model, datetime_model, uuid_id_model
 
 min_name_length = 4
 max_name_length = 20
+re_deny_name = re.compile(r"[^a-zA-Z0-9_-]")
 
 
 _T = TypeVar("_T", bound="user")
@@ -22,7 +25,8 @@ class user(id_model, datetime_model, base_model, table=True):
 
     name: str = Field(min_length=min_name_length, max_length=max_name_length)
     hashed_password: str = Field(max_length=2**10)
-    email: EmailStr = Field(index=True)
+    # unique case-insensitively, see ix_users_email_lower below
+    email: EmailStr
     is_active: bool = True
     is_superuser: bool = False
     is_verified: bool = False
@@ -31,14 +35,31 @@ class user(id_model, datetime_model, base_model, table=True):
     async def get_from_email(
         cls: type[_T], session: async_session, email: str
     ) -> _T | None:
-        is_user_cur = await session.exec(select(cls).where(cls.email == email))
+        is_user_cur = await session.exec(
+            select(cls).where(func.lower(cls.email) == email.lower())
+        )
         return is_user_cur.first()
 
+    @classmethod
+    async def get_existing_emails(
+        cls, session: async_session, emails: Iterable[str]
+    ) -> set[str]:
+        """lower cased emails, out of `emails`, that already have a user"""
+        if not (lowered := {email.lower() for email in emails}):
+            return set()
+        email_cur = await session.exec(
+            select(func.lower(cls.email)).where(func.lower(cls.email).in_(lowered))
+        )
+        return set(email_cur.all())
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.validate(self)
 
 
+Index("ix_users_email_lower", func.lower(user.email), unique=True)
+
+
 class user_read(schemas.BaseUser[user_id_type], datetime_model):
     name: str = _Field(min_length=min_name_length, max_length=max_name_length)
 
@@ -0,0 +1,130 @@
+import asyncio
+import heapq
+from dataclasses import dataclass, field
+from itertools import count
+from time import monotonic
+
+from ...core import config
+
+READ_PRIORITY = 0
+WRITE_PRIORITY = 1
+
+
+class admission_rejected(Exception):
+    pass
+
+
+@dataclass
+class aimd_limit:
+    """
+    additive increase, multiplicative decrease of the concurrency limit.
+    a request slower than the target shrinks the limit, at most once per target
+    window so one burst of slow requests counts once; a fast one grows it by
+    1/limit, about one slot per limit's worth of fast requests.
+    a request may bring its own target, e.g. a route that hashes passwords.
+    """
+
+    limit: float
+    min_limit: int
+    max_limit: int
+    latency_target: float  # seconds
+    backoff: float = 0.9
+    _last_decrease: float = field(default=0.0, repr=False)
+
+    def update(
+        self, latency: float, now: float, latency_target: float | None = None
+    ) -> None:
+        if latency_target is None:
+            latency_target = self.latency_target
+        if latency > latency_target:
+            if now - self._last_decrease >= self.latency_target:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+
+class admission_controller:
+    """
+    per worker concurrency limit in front of the app.
+    requests over the limit wait in a priority queue, reads ahead of writes,
+    and are rejected once they waited `queue_timeout` or the queue is full,
+    before they would wait on the connection pool behind the limit.
+    """
+
+    def __init__(self, limit: aimd_limit, queue_timeout: float, max_queue: int) -> None:
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._order = count()
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.limit.limit)
+
+    async def acquire(self, priority: int) -> None:
+        if self._has_slot() and not self.queued:
+            self.in_flight += 1
+            return
+        if self.queued >= self.max_queue:
+            raise admission_rejected()
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        self.queued += 1
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            self._leave(waiter)
+            raise
+        if not waiter.done():
+            self._leave(waiter)
+            raise admission_rejected()
+
+    def _leave(self, waiter: asyncio.Future[None]) -> None:
+        if waiter.done():
+            # the slot was handed over already
+            self.release(0.0)
+        else:
+            # dropped from the heap lazily by _wake
+            waiter.cancel()
+            self.queued -= 1
+
+    def release(self, latency: float, latency_target: float | None = None) -> None:
+        # a latency of 0 leaves the limit as it is
+        self.in_flight -= 1
+        if latency:
+            self.limit.update(latency, monotonic(), latency_target)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_slot():
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            waiter.set_result(None)
+            self.queued -= 1
+            self.in_flight += 1
+
+    def status(self) -> dict[str, int]:
+        return {
+            "limit": int(self.limit.limit),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+        }
+
+
+def create_admission_controller() -> admission_controller:
+    limit = aimd_limit(
+        limit=float(config.ADMISSION_INITIAL_LIMIT),
+        min_limit=config.ADMISSION_MIN_LIMIT,
+        max_limit=config.ADMISSION_MAX_LIMIT,
+        latency_target=config.ADMISSION_LATENCY_TARGET_MS / 1000,
+    )
+    return admission_controller(
+        limit,
+        queue_timeout=config.ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+        max_queue=config.ADMISSION_MAX_QUEUE,
+    )
@@ -1,15 +1,24 @@
+import logging
 import re
 from dataclasses import dataclass, field
+from functools import lru_cache
 from re import Pattern
 from typing import AsyncGenerator, Sequence
 
 from fastapi import Depends, Request
 from fastapi_users import InvalidPasswordException, UUIDIDMixin
 from fastapi_users.authentication import BearerTransport, Transport
+from fastapi_users.exceptions import UserAlreadyExists, UserNotExists
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
 
 from ...core import config
 from ...db.session import async_session, get_session
 from ...models import user
+from ..password_policy import breached_digest_set, digest_set, password_policy
+from ..single_flight import single_flight
+from ..tracing import trace_span
 from .convert import (
     auth_backend_class,
     auth_backend_type,
@@ -20,6 +29,10 @@ from .convert import (
     user_id_type,
     user_manager_class,
 )
+from .refresh import create_refresh_token_store, refresh_token_store
+from .strategy import cached_jwt_strategy_class, load_jwt_keys
+
+logger = logging.getLogger(__name__)
 
 
 async def get_user_db(
@@ -32,26 +45,58 @@ def create_transport() -> Transport:
     return BearerTransport(tokenUrl=config.TOKEN_PREFIX)
 
 
+@lru_cache(maxsize=None)
 def create_strategy() -> strategy_class[user.user, user_id_type]:
-    return jwt_strategy_class(  # type: ignore
-        secret=str(config.SECRET_KEY),
+    encode_key, decode_key = load_jwt_keys()
+    return cached_jwt_strategy_class(  # type: ignore
+        secret=encode_key,
+        public_key=decode_key,
         lifetime_seconds=config.ACCESS_TOKEN_EXPIRE_SECONDS,
         token_audience=[config.JWT_AUDIENCE],
         algorithm=config.JWT_ALGORITHM,
+        claim_cache_size=config.JWT_CLAIM_CACHE_SIZE,
     )
 
 
+async def get_jwt_strategy() -> strategy_class[user.user, user_id_type]:
+    # async, so fastapi resolves it on the loop instead of a threadpool hop
+    return create_strategy()
+
+
 def create_backend() -> list[auth_backend_type]:
     transport = create_transport()
     return [
         auth_backend_class(
             name=config.AUTH_BACKEND_NAME,
             transport=transport,
-            get_strategy=create_strategy,
+            get_strategy=get_jwt_strategy,
         )
     ]
 
 
+class traced_password_helper(PasswordHelper):
+    def hash(self, password: str) -> str:
+        with trace_span("password hash"):
+            return super().hash(password)
+
+    def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str]:
+        with trace_span("password verify"):
+            return super().verify_and_update(plain_password, hashed_password)
+
+
+@lru_cache(maxsize=None)
+def create_password_helper() -> traced_password_helper:
+    # one crypt context for every request instead of one per UserManager
+    return traced_password_helper()
+
+
+# every authenticated request loads its user by id,
+# so a burst from one user (or one token) costs a single query
+user_reads: single_flight[user_id_type, user.user | None] = single_flight()
+
+
 class UserManager(UUIDIDMixin, user_manager_class[user.user, user_id_type]):
     reset_password_token_secret = str(config.SECRET_KEY)
     verification_token_secret = str(config.SECRET_KEY)
@@ -68,45 +113,101 @@ class UserManager(UUIDIDMixin, user_manager_class[user.user, user_id_type]):
     async def validate_password(
         self, password: str, user: user.user_create | user.user
     ) -> None:
-        if len(password) < self.min_password_length:
-            raise InvalidPasswordException(
-                reason=f"Password should be at least {self.min_password_length} characters"
-            )
-        elif len(password) > self.max_password_length:
-            raise InvalidPasswordException(
-                reason=f"Password should be at most {self.max_password_length} characters"
-            )
-
-        for pattern in self.re_password_deny_list:
-            if pattern.search(password):
-                raise InvalidPasswordException(
-                    reason=f"Password should not include {pattern.pattern}"
-                )
-
-        for pattern in self.re_password_need_list:
-            if not pattern.search(password):
-                raise InvalidPasswordException(
-                    reason=f"Password must include {pattern.pattern}"
-                )
+        # reports every violation at once, reason is a list of messages
+        if reasons := create_password_policy().violations(password):
+            raise InvalidPasswordException(reason=reasons)
+
+    async def create(
+        self,
+        user_create: user.user_create,
+        safe: bool = False,
+        request: Request | None = None,
+    ) -> user.user:
+        """
+        one `INSERT ... ON CONFLICT DO NOTHING RETURNING` instead of the
+        `get_by_email` lookup plus insert of the base class;
+        the unique index on lower(email) decides whether the email is taken.
+        """
+        await self.validate_password(user_create.password, user_create)
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = self.password_helper.hash(password)
+        new_user = user.user(**user_dict)
+
+        session: async_session = self.user_db.session  # type: ignore
+        inserted = await session.execute(
+            insert(user.user)
+            .values(**new_user.dict())
+            .on_conflict_do_nothing(index_elements=[func.lower(user.user.email)])
+            .returning(user.user.id)
+        )
+        if inserted.first() is None:
+            await session.rollback()
+            raise UserAlreadyExists()
+        await session.commit()
+
+        await self.on_after_register(new_user, request)
+        return new_user
+
+    async def get(self, id: user_id_type) -> user.user:
+        # the shared user is detached from any request session; callers only read it
+        if (get_user := await user_reads.do(id, lambda: self._fetch_user(id))) is None:
+            raise UserNotExists()
+        return get_user
+
+    async def _fetch_user(self, id: user_id_type) -> user.user | None:
+        bind = self.user_db.session.bind  # type: ignore
+        async with async_session(bind, autoflush=False) as session:
+            return await user_db_class(session, user.user).get(id)
 
     async def on_after_register(self, user: user.user, request: Request | None = None):
-        print(f"User {user.id} has registered.")
+        logger.info("user registered", extra={"user_id": str(user.id)})
 
     async def on_after_forgot_password(
         self, user: user.user, token: str, request: Request | None = None
     ):
-        print(f"User {user.id} has forgot their password. Reset token: {token}")
+        # the token is a credential, it's never logged
+        logger.info("password reset requested", extra={"user_id": str(user.id)})
 
     async def on_after_request_verify(
         self, user: user.user, token: str, request: Request | None = None
     ):
-        print(f"Verification requested for user {user.id}. Verification token: {token}")
+        logger.info("verification requested", extra={"user_id": str(user.id)})
+
+
+@lru_cache(maxsize=None)
+def create_password_policy() -> password_policy:
+    deny_list = (
+        digest_set.from_file(config.PASSWORD_DENY_LIST_FILE)
+        if config.PASSWORD_DENY_LIST_FILE is not None
+        else None
+    )
+    breached = (
+        breached_digest_set.from_mmap(
+            config.PASSWORD_BREACHED_FILE, config.PASSWORD_BREACHED_DIGEST_SIZE
+        )
+        if config.PASSWORD_BREACHED_FILE is not None
+        else None
+    )
+    return password_policy(
+        min_length=UserManager.min_password_length,
+        max_length=UserManager.max_password_length,
+        need=UserManager.re_password_need_list,
+        deny=UserManager.re_password_deny_list,
+        deny_list=deny_list,
+        breached=breached,
+    )
 
 
 async def get_user_manager(
     user_db=Depends(get_user_db),
 ) -> AsyncGenerator[UserManager, None]:
-    yield UserManager(user_db)
+    yield UserManager(user_db, create_password_helper())
 
 
 def create_fastapi_users(
@@ -0,0 +1,96 @@
+import secrets
+from datetime import datetime, timedelta
+from functools import lru_cache
+from hashlib import sha256
+from uuid import UUID
+
+from sqlalchemy import delete, event, insert
+from sqlmodel.orm.session import Session
+
+from ...core import config
+from ...core.lru import lru_dict
+from ...db.session import async_session
+from ...models.token import refresh_token
+from ..metrics import cache_requests
+
+
+def hash_refresh_token(token: str) -> bytes:
+    # refresh tokens are random 256 bit values, so a plain digest is enough
+    return sha256(token.encode()).digest()
+
+
+# tokens consumed in a session, remembered by their store once it commits
+_pending_revoked = "pending_revoked_refresh_tokens"
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_revoked(session: Session) -> None:
+    for store, token_hash in session.info.pop(_pending_revoked, ()):
+        store.revoked[token_hash] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_revoked(session: Session) -> None:
+    # the delete was rolled back, the token is still valid
+    session.info.pop(_pending_revoked, None)
+
+
+class refresh_token_store:
+    """
+    opaque refresh tokens stored as hashes in `refresh_tokens`.
+    each token is single use: refreshing deletes the row and issues a new one.
+    tokens used or revoked by this worker are remembered in memory once the
+    delete is committed, so a replayed token is rejected without a database
+    round trip.
+    """
+
+    def __init__(self, lifetime_seconds: int, revoked_cache_size: int) -> None:
+        self.lifetime = timedelta(seconds=lifetime_seconds)
+        self.revoked: lru_dict[bytes, bool] = lru_dict(revoked_cache_size)
+
+    async def issue(self, session: async_session, user_id: UUID) -> str:
+        token = secrets.token_urlsafe(32)
+        now = datetime.now()
+        await session.execute(
+            delete(refresh_token).where(
+                refresh_token.user_id == user_id, refresh_token.expires_at <= now
+            )
+        )
+        await session.execute(
+            insert(refresh_token).values(
+                token_hash=hash_refresh_token(token),
+                user_id=user_id,
+                expires_at=now + self.lifetime,
+            )
+        )
+        return token
+
+    async def consume(self, session: async_session, token: str) -> UUID | None:
+        token_hash = hash_refresh_token(token)
+        if token_hash in self.revoked:
+            cache_requests.inc(cache="revoked_refresh_tokens", result="hit")
+            return None
+        cache_requests.inc(cache="revoked_refresh_tokens", result="miss")
+
+        result = await session.execute(
+            delete(refresh_token)
+            .where(refresh_token.token_hash == token_hash)
+            .returning(refresh_token.user_id, refresh_token.expires_at)
+        )
+        session.sync_session.info.setdefault(_pending_revoked, []).append(
+            (self, token_hash)
+        )
+        if (row := result.first()) is None or row.expires_at <= datetime.now():
+            return None
+        return row.user_id
+
+    async def revoke(self, session: async_session, token: str) -> None:
+        await self.consume(session, token)
+
+
+@lru_cache(maxsize=None)
+def create_refresh_token_store() -> refresh_token_store:
+    return refresh_token_store(
+        lifetime_seconds=config.REFRESH_TOKEN_EXPIRE_SECONDS,
+        revoked_cache_size=config.REFRESH_TOKEN_REVOKED_CACHE_SIZE,
+    )
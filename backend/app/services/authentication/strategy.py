@@ -0,0 +1,85 @@
+from pathlib import Path
+from time import time
+from typing import Any, Generic, TypeVar
+
+import jwt
+from fastapi_users import exceptions
+from fastapi_users.jwt import decode_jwt
+from fastapi_users.manager import BaseUserManager
+from jwt.algorithms import get_default_algorithms
+
+from ...core import config
+from ...core.lru import lru_dict
+from ...models.core import base_model
+from ..metrics import auth_failures, cache_requests
+from .convert import jwt_strategy_class
+
+_T = TypeVar("_T", bound=base_model)
+_D = TypeVar("_D")
+
+
+def load_jwt_keys() -> tuple[Any, Any]:
+    """
+    (encode key, decode key) as objects pyjwt uses directly,
+    so PEM parsing and key preparation happen once instead of per token.
+    """
+    algorithms = get_default_algorithms()
+    if (algorithm := algorithms.get(config.JWT_ALGORITHM)) is None:
+        raise ValueError(f"unsupported jwt algorithm: {config.JWT_ALGORITHM}")
+
+    if config.JWT_PRIVATE_KEY_FILE is None:
+        key = algorithm.prepare_key(str(config.SECRET_KEY))
+        return key, key
+
+    private_key = algorithm.prepare_key(Path(config.JWT_PRIVATE_KEY_FILE).read_bytes())
+    if config.JWT_PUBLIC_KEY_FILE is None:
+        return private_key, private_key.public_key()
+    public_key = algorithm.prepare_key(Path(config.JWT_PUBLIC_KEY_FILE).read_bytes())
+    return private_key, public_key
+
+
+class cached_jwt_strategy_class(jwt_strategy_class[_T, _D], Generic[_T, _D]):
+    """
+    keeps verified claims by token string.
+    only tokens that passed signature and audience checks are cached,
+    and a cached token is dropped once its `exp` is reached.
+    """
+
+    def __init__(self, *args: Any, claim_cache_size: int, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.claims: lru_dict[str, dict[str, Any]] = lru_dict(claim_cache_size)
+
+    def decode_claims(self, token: str) -> dict[str, Any] | None:
+        if (claims := self.claims.get(token)) is not None:
+            if (exp := claims.get("exp")) is None or exp > time():
+                cache_requests.inc(cache="jwt_claims", result="hit")
+                return claims
+            self.claims.pop(token)
+        cache_requests.inc(cache="jwt_claims", result="miss")
+
+        try:
+            claims = decode_jwt(
+                token, self.decode_key, self.token_audience, [self.algorithm]
+            )
+        except jwt.PyJWTError:
+            auth_failures.inc(reason="invalid_token")
+            return None
+
+        self.claims[token] = claims
+        return claims
+
+    async def read_token(
+        self, token: str | None, user_manager: BaseUserManager[_T, _D]
+    ) -> _T | None:
+        if token is None:
+            return None
+        if (claims := self.decode_claims(token)) is None:
+            return None
+        if (user_id := claims.get("user_id")) is None:
+            return None
+
+        try:
+            parsed_id = user_manager.parse_id(user_id)
+            return await user_manager.get(parsed_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
@@ -0,0 +1 @@
+from .dataset import *
@@ -0,0 +1,191 @@
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Iterator, Mapping
+from uuid import UUID
+
+from fastapi_users.password import PasswordHelper
+from sqlalchemy.ext.asyncio.engine import AsyncConnection
+
+from ...models import cleaning, user
+
+cleaning_type_enum = cleaning.cleaning_type_enum
+
+user_columns = (
+    "id",
+    "email",
+    "name",
+    "hashed_password",
+    "is_active",
+    "is_superuser",
+    "is_verified",
+    "created_at",
+    "updated_at",
+)
+# id is left to the sequence
+cleaning_columns = (
+    "name",
+    "description",
+    "cleaning_type",
+    "price",
+    "created_at",
+    "updated_at",
+    "version",
+    "deleted_at",
+)
+
+
+@dataclass(frozen=True)
+class dataset_spec:
+    users: int = 1_000
+    cleanings: int = 10_000
+    seed: int = 0
+    # relative weights of each cleaning type
+    cleaning_types: Mapping[cleaning_type_enum, float] = field(
+        default_factory=lambda: {
+            cleaning_type_enum.dust_up: 0.5,
+            cleaning_type_enum.spot_clean: 0.35,
+            cleaning_type_enum.full_clean: 0.15,
+        }
+    )
+    # (low, high) price of each cleaning type, skewed towards the low end
+    prices: Mapping[cleaning_type_enum, tuple[float, float]] = field(
+        default_factory=lambda: {
+            cleaning_type_enum.dust_up: (10.0, 40.0),
+            cleaning_type_enum.spot_clean: (30.0, 120.0),
+            cleaning_type_enum.full_clean: (100.0, 400.0),
+        }
+    )
+    # created_at is spread over the `days` before `until`
+    days: int = 365
+    until: datetime = field(
+        default_factory=lambda: datetime.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+    )
+    deleted_ratio: float = 0.0
+    # distinct passwords, each hashed once and shared round robin
+    passwords: int = 4
+
+
+def get_created_at(rng: random.Random, spec: dataset_spec) -> datetime:
+    return spec.until - timedelta(seconds=rng.uniform(0, spec.days * 86_400))
+
+
+def get_password(index: int) -> str:
+    return f"datasetpassword@{index}"
+
+
+def generate_users(
+    spec: dataset_spec, hashed_passwords: list[str]
+) -> Iterator[tuple[Any, ...]]:
+    """rows of `user_columns`; user `i` has the password `get_password(i % n)`"""
+    rng = random.Random(f"{spec.seed}:users")
+    for index in range(spec.users):
+        password = index % len(hashed_passwords)
+        new_user = user.user_create(
+            email=f"user{spec.seed}_{index}@phresh.io",
+            name=f"user_{index}",
+            password=get_password(password),
+        )
+        created_at = get_created_at(rng, spec)
+        yield (
+            UUID(int=rng.getrandbits(128), version=4),
+            new_user.email,
+            new_user.name,
+            hashed_passwords[password],
+            new_user.is_active,
+            new_user.is_superuser,
+            new_user.is_verified,
+            created_at,
+            created_at,
+        )
+
+
+def generate_cleanings(spec: dataset_spec) -> Iterator[tuple[Any, ...]]:
+    """rows of `cleaning_columns`, the same rows for the same spec"""
+    rng = random.Random(f"{spec.seed}:cleanings")
+    types = list(spec.cleaning_types)
+    weights = list(spec.cleaning_types.values())
+    cent = Decimal("0.01")
+    for index in range(spec.cleanings):
+        cleaning_type = rng.choices(types, weights)[0]
+        low, high = spec.prices[cleaning_type]
+        price = rng.triangular(low, high, low + (high - low) / 4)
+        new_cleaning = cleaning.cleaning_create(
+            name=f"cleaning {index}",
+            description=f"{cleaning_type.value.replace('_', ' ')} number {index}",
+            cleaning_type=cleaning_type,
+            price=Decimal(price).quantize(cent),
+        )
+        created_at = get_created_at(rng, spec)
+        deleted_at = None
+        if rng.random() < spec.deleted_ratio:
+            deleted_at = created_at + (spec.until - created_at) * rng.random()
+        yield (
+            new_cleaning.name,
+            new_cleaning.description,
+            new_cleaning.cleaning_type.value,
+            new_cleaning.price,
+            created_at,
+            created_at,
+            1,
+            deleted_at,
+        )
+
+
+async def copy_rows(
+    connection: AsyncConnection,
+    table: str,
+    columns: tuple[str, ...],
+    rows: Iterator[tuple[Any, ...]],
+    batch_size: int,
+) -> int:
+    """
+    COPY `rows` into `table` in batches of `batch_size` rows, straight through
+    the asyncpg connection. inside a transaction the rows are part of it,
+    otherwise every batch commits on its own.
+    """
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    copied = 0
+    while batch := list(islice(rows, batch_size)):
+        await driver_connection.copy_records_to_table(
+            table, records=batch, columns=list(columns)
+        )
+        copied += len(batch)
+    return copied
+
+
+async def load_dataset(
+    connection: AsyncConnection, spec: dataset_spec, batch_size: int = 50_000
+) -> dict[str, int]:
+    """
+    generate and COPY the users and cleanings of `spec`.
+    the rows are deterministic for a seed, except for the bcrypt salts;
+    emails include the seed, so datasets of different seeds can be loaded
+    into the same database.
+    """
+    helper = PasswordHelper()
+    hashed_passwords = [
+        helper.hash(get_password(index))
+        for index in range(max(1, spec.passwords) if spec.users else 0)
+    ]
+    return {
+        "users": await copy_rows(
+            connection,
+            user.user.get_table().name,
+            user_columns,
+            generate_users(spec, hashed_passwords),
+            batch_size,
+        ),
+        "cleanings": await copy_rows(
+            connection,
+            cleaning.cleanings.get_table().name,
+            cleaning_columns,
+            generate_cleanings(spec),
+            batch_size,
+        ),
+    }
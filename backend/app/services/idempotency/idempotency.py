@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from hashlib import sha256
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from ...db.session import async_session
+from ...models.idempotency import idempotency_key
+
+logger = logging.getLogger(__name__)
+
+
+class idempotency_key_reused(Exception):
+    """the key was already used with a different request body"""
+
+
+def hash_idempotency_key(route_name: str, key: str) -> bytes:
+    return sha256(f"{route_name}:{key}".encode()).digest()
+
+
+def hash_request(body: Any) -> bytes:
+    return sha256(
+        orjson.dumps(jsonable_encoder(body), option=orjson.OPT_SORT_KEYS)
+    ).digest()
+
+
+async def claim_idempotency_key(
+    session: async_session, key_hash: bytes, request_hash: bytes
+) -> idempotency_key | None:
+    """
+    None when this transaction claimed the key, otherwise the stored response.
+    a concurrent request holding the same key makes the insert wait until it
+    commits (or rolls back), so a stored row always has its response.
+    """
+    while True:
+        claimed = await session.execute(
+            insert(idempotency_key)
+            .values(
+                key_hash=key_hash, request_hash=request_hash, created_at=datetime.now()
+            )
+            .on_conflict_do_nothing(index_elements=[idempotency_key.key_hash])
+            .returning(idempotency_key.key_hash)
+        )
+        if claimed.first() is not None:
+            return None
+
+        stored = await session.execute(
+            select(idempotency_key).where(idempotency_key.key_hash == key_hash)
+        )
+        # None: swept between the two statements, claim it again
+        if (stored_key := stored.scalar_one_or_none()) is not None:
+            if stored_key.request_hash != request_hash:
+                raise idempotency_key_reused()
+            return stored_key
+
+
+async def store_response(
+    session: async_session, key_hash: bytes, status_code: int, response: bytes
+) -> None:
+    # committed together with the work, a retry never sees a half done request
+    await session.execute(
+        update(idempotency_key)
+        .where(idempotency_key.key_hash == key_hash)
+        .values(status_code=status_code, response=response)
+    )
+
+
+async def sweep_idempotency_keys(
+    engine: AsyncEngine, ttl_seconds: int, batch_size: int = 1000
+) -> int:
+    # short batches on the created_at index, so the sweep never holds many locks
+    expired_before = datetime.now() - timedelta(seconds=ttl_seconds)
+    deleted = 0
+    while True:
+        async with async_session(engine, autoflush=False) as session:
+            expired = (
+                select(idempotency_key.key_hash)
+                .where(idempotency_key.created_at < expired_before)
+                .limit(batch_size)
+            )
+            result = await session.execute(
+                delete(idempotency_key).where(idempotency_key.key_hash.in_(expired))
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+async def run_idempotency_sweeper(
+    engine: AsyncEngine, interval_seconds: float, ttl_seconds: int
+) -> None:
+    while True:
+        try:
+            if deleted := await sweep_idempotency_keys(engine, ttl_seconds):
+                logger.info("swept expired idempotency keys", extra={"rows": deleted})
+        except Exception:
+            logger.warning("idempotency sweep failed", exc_info=True)
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,385 @@
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from ...core import config
+
+# (metric name, sample name, ((label, value), ...))
+sample_key = tuple[str, str, tuple[tuple[str, str], ...]]
+
+_header = struct.Struct("=i4x")
+_length = struct.Struct("=i")
+_value = struct.Struct("=d")
+
+
+def encode_key(key: sample_key) -> bytes:
+    return orjson.dumps(key)
+
+
+def decode_key(data: bytes) -> sample_key:
+    name, sample, labels = orjson.loads(data)
+    return name, sample, tuple((label, value) for label, value in labels)
+
+
+def read_entries(data: bytes | mmap.mmap) -> Iterator[tuple[bytes, int]]:
+    """(key, offset of its value) of every entry up to the used mark"""
+    used = _header.unpack_from(data, 0)[0]
+    position = _header.size
+    while position < used:
+        length = _length.unpack_from(data, position)[0]
+        key_start = position + _length.size
+        # the value is 8 byte aligned
+        position = key_start + length + (-(_length.size + length) % 8)
+        yield bytes(data[key_start : key_start + length]), position
+        position += _value.size
+
+
+class memory_values:
+    """values of a single process, for when there is no metrics directory"""
+
+    def __init__(self) -> None:
+        self.values: dict[bytes, float] = {}
+
+    def inc(self, key: bytes, amount: float) -> None:
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, key: bytes, value: float) -> None:
+        self.values[key] = value
+
+    def items(self) -> Iterator[tuple[bytes, float]]:
+        yield from list(self.values.items())
+
+
+class mmap_values:
+    """
+    float values by key in a memory mapped file only this process writes.
+    entries are `length, key, padding, value` appended after an 8 byte header
+    holding the used size, which is written last, so a reader in another
+    process never parses a half written entry. an update is one store into
+    the mapping, no syscall.
+    """
+
+    initial_size = 1 << 16
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = path.open("a+b")
+        if (size := os.fstat(self._file.fileno()).st_size) == 0:
+            size = self.initial_size
+            self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        if (used := _header.unpack_from(self._mmap, 0)[0]) == 0:
+            _header.pack_into(self._mmap, 0, _header.size)
+            used = _header.size
+        self._used = used
+        self._positions = dict(read_entries(self._mmap))
+
+    def _position(self, key: bytes) -> int:
+        if (position := self._positions.get(key)) is not None:
+            return position
+
+        padding = -(_length.size + len(key)) % 8
+        entry_size = _length.size + len(key) + padding + _value.size
+        if self._used + entry_size > len(self._mmap):
+            size = len(self._mmap)
+            while self._used + entry_size > size:
+                size *= 2
+            self._mmap.close()
+            self._file.truncate(size)
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        _length.pack_into(self._mmap, self._used, len(key))
+        key_start = self._used + _length.size
+        self._mmap[key_start : key_start + len(key)] = key
+        position = key_start + len(key) + padding
+        _value.pack_into(self._mmap, position, 0.0)
+        self._used += entry_size
+        _header.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def inc(self, key: bytes, amount: float) -> None:
+        with self._lock:
+            position = self._position(key)
+            value = _value.unpack_from(self._mmap, position)[0]
+            _value.pack_into(self._mmap, position, value + amount)
+
+    def set(self, key: bytes, value: float) -> None:
+        with self._lock:
+            _value.pack_into(self._mmap, self._position(key), value)
+
+    def items(self) -> Iterator[tuple[bytes, float]]:
+        yield from read_values(self.path)
+
+
+def read_values(path: Path) -> Iterator[tuple[bytes, float]]:
+    data = path.read_bytes()
+    if len(data) < _header.size:
+        return
+    for key, position in read_entries(data):
+        yield key, _value.unpack_from(data, position)[0]
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (label, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for label, value in labels
+    )
+    return "{" + ",".join(f'{label}="{value}"' for label, value in escaped) + "}"
+
+
+class metric:
+    type = "untyped"
+    # a gauge is the current state of a live worker, everything else
+    # keeps counting after the worker that counted it exited
+    live_only = False
+
+    def __init__(
+        self,
+        registry: "metrics_registry",
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+    ) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def key(self, sample: str, labels: dict[str, str]) -> bytes:
+        if labels.keys() != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}")
+        return encode_key(
+            (
+                self.name,
+                sample,
+                tuple((label, str(labels[label])) for label in self.labels),
+            )
+        )
+
+    def render(self, samples: dict[sample_key, float]) -> Iterator[str]:
+        for (_, sample, labels), value in sorted(samples.items()):
+            yield f"{sample}{format_labels(labels)} {format_value(value)}"
+
+
+class counter(metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self.registry.values(self.live_only).inc(self.key(self.name, labels), amount)
+
+
+class gauge(metric):
+    type = "gauge"
+    live_only = True
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self.registry.values(self.live_only).inc(self.key(self.name, labels), amount)
+
+    def set(self, value: float, **labels: str) -> None:
+        self.registry.values(self.live_only).set(self.key(self.name, labels), value)
+
+
+class histogram(metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        registry: "metrics_registry",
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = config.METRICS_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: str) -> None:
+        values = self.registry.values(self.live_only)
+        # only the first bucket that fits is counted, render makes them cumulative
+        bucket = next(bound for bound in self.buckets if value <= bound)
+        values.inc(self.key(f"{self.name}_bucket:{bucket!r}", labels), 1.0)
+        values.inc(self.key(f"{self.name}_sum", labels), value)
+        values.inc(self.key(f"{self.name}_count", labels), 1.0)
+
+    def render(self, samples: dict[sample_key, float]) -> Iterator[str]:
+        series: dict[tuple, dict[str, float]] = defaultdict(dict)
+        for (_, sample, labels), value in samples.items():
+            series[labels][sample] = value
+
+        for labels, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound in self.buckets:
+                cumulative += values.get(f"{self.name}_bucket:{bound!r}", 0.0)
+                le = labels + (("le", format_value(bound)),)
+                yield f"{self.name}_bucket{format_labels(le)} {format_value(cumulative)}"
+            for sample in (f"{self.name}_sum", f"{self.name}_count"):
+                yield f"{sample}{format_labels(labels)} {format_value(values.get(sample, 0.0))}"
+
+
+class metrics_registry:
+    """
+    counters, gauges and histograms shared by every worker through
+    `directory`: each process maps its own `counter_<pid>.db` and
+    `gauge_<pid>.db` there, and collecting adds up the files of all workers,
+    the gauges of exited workers left out. without a directory the values
+    stay in this process.
+    """
+
+    def __init__(self, directory: str | Path | None, pid: int | None = None) -> None:
+        self.directory = Path(directory) if directory is not None else None
+        self.pid = pid
+        self.metrics: dict[str, metric] = {}
+        self._values: dict[tuple[int, bool], memory_values | mmap_values] = {}
+
+    def values(self, live_only: bool) -> memory_values | mmap_values:
+        # files are opened on first use and per pid, so a forked worker
+        # never writes into the file of its parent
+        pid = self.pid or os.getpid()
+        if (values := self._values.get((pid, live_only))) is None:
+            if self.directory is None:
+                values = memory_values()
+            else:
+                kind = "gauge" if live_only else "counter"
+                values = mmap_values(self.directory / f"{kind}_{pid}.db")
+            self._values[pid, live_only] = values
+        return values
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> counter:
+        self.metrics[name] = created = counter(self, name, help, labels)
+        return created
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> gauge:
+        self.metrics[name] = created = gauge(self, name, help, labels)
+        return created
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = config.METRICS_LATENCY_BUCKETS,
+    ) -> histogram:
+        self.metrics[name] = created = histogram(self, name, help, labels, buckets)
+        return created
+
+    def collect(self) -> dict[sample_key, float]:
+        totals: dict[sample_key, float] = defaultdict(float)
+        if self.directory is None:
+            pid = self.pid or os.getpid()
+            sources = [
+                values.items()
+                for (owner, _), values in self._values.items()
+                if owner == pid
+            ]
+        else:
+            sources = []
+            for path in self.directory.glob("*_*.db"):
+                kind, _, pid = path.stem.partition("_")
+                if kind == "gauge" and not is_alive(int(pid)):
+                    continue
+                sources.append(read_values(path))
+
+        for source in sources:
+            for key, value in source:
+                totals[decode_key(key)] += value
+        return totals
+
+    def render(self) -> str:
+        """the prometheus text exposition format"""
+        samples: dict[str, dict[sample_key, float]] = defaultdict(dict)
+        for key, value in self.collect().items():
+            samples[key[0]][key] = value
+
+        lines = []
+        for name, registered in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {registered.help}")
+            lines.append(f"# TYPE {name} {registered.type}")
+            lines.extend(registered.render(samples.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+
+def clear_metrics_dir(directory: str | Path) -> None:
+    # at server start: files left by a previous run would be added up again
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    for file in path.glob("*_*.db"):
+        file.unlink(missing_ok=True)
+
+
+def instrument_pool(engine: AsyncEngine) -> None:
+    # pool events survive the pool being recreated by dispose()
+    def checkout(*_) -> None:
+        db_pool_checked_out.inc()
+        db_pool_checkouts.inc()
+
+    def checkin(*_) -> None:
+        db_pool_checked_out.inc(-1)
+
+    event.listen(engine.sync_engine, "checkout", checkout)
+    event.listen(engine.sync_engine, "checkin", checkin)
+
+
+@lru_cache(maxsize=None)
+def create_metrics_registry() -> metrics_registry:
+    return metrics_registry(config.METRICS_DIR)
+
+
+registry = create_metrics_registry()
+
+http_requests = registry.counter(
+    "http_requests_total",
+    "Requests by route name, method and status code.",
+    ("route", "method", "status"),
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Request latency by route name, from the outermost middleware.",
+    ("route",),
+)
+db_pool_checked_out = registry.gauge(
+    "db_pool_checked_out", "Connections checked out of the pool."
+)
+db_pool_checkouts = registry.counter(
+    "db_pool_checkouts_total", "Connections handed out by the pool."
+)
+cache_requests = registry.counter(
+    "cache_requests_total",
+    "Lookups of the in memory caches by cache and hit or miss.",
+    ("cache", "result"),
+)
+auth_failures = registry.counter(
+    "auth_failures_total", "Rejected credentials and tokens by reason.", ("reason",)
+)
+password_hash_queue_wait = registry.histogram(
+    "password_hash_queue_wait_seconds",
+    "Wait of a password hash for a free process of the hash pool.",
+)
@@ -0,0 +1 @@
+from .password_policy import *
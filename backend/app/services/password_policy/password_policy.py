@@ -0,0 +1,205 @@
+import mmap
+import re
+from hashlib import blake2b, sha1
+from pathlib import Path
+from re import Pattern
+from typing import BinaryIO, Iterable, Sequence
+
+
+def _digest(word: str, width: int) -> bytes:
+    return blake2b(word.lower().encode(), digest_size=width).digest()
+
+
+class digest_set:
+    """
+    fixed width digests of words, sorted in one flat buffer and binary searched.
+    a million words take `width` MB instead of a set of a million str objects;
+    the buffer may be bytes or an mmap.
+    """
+
+    def __init__(self, buffer: bytes | memoryview, width: int = 8) -> None:
+        if len(buffer) % width:
+            raise ValueError(f"buffer size is not a multiple of {width}")
+        self.buffer = buffer
+        self.width = width
+
+    @classmethod
+    def from_words(cls, words: Iterable[str], width: int = 8) -> "digest_set":
+        digests = {_digest(word, width) for word in words}
+        return cls(b"".join(sorted(digests)), width)
+
+    @classmethod
+    def from_file(cls, path: str | Path, width: int = 8) -> "digest_set":
+        # one word per line, blank lines skipped
+        with open(path, encoding="utf-8", errors="ignore") as file:
+            return cls.from_words(
+                (word for line in file if (word := line.rstrip("\r\n"))), width
+            )
+
+    def __len__(self) -> int:
+        return len(self.buffer) // self.width
+
+    def contains_digest(self, key: bytes) -> bool:
+        buffer, width = self.buffer, self.width
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if buffer[middle * width : (middle + 1) * width] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return buffer[low * width : (low + 1) * width] == key
+
+    def digest(self, word: str) -> bytes:
+        return _digest(word, self.width)
+
+    def __contains__(self, word: str) -> bool:
+        return self.contains_digest(self.digest(word))
+
+
+class breached_digest_set(digest_set):
+    """
+    sorted sha-1 prefixes of breached passwords, memory mapped read only.
+    the pages belong to the os page cache, so every worker mapping the same
+    file shares them and none of it counts towards a worker's python heap.
+    unlike the deny-list, passwords are hashed as is, the way breach corpora are.
+    """
+
+    @classmethod
+    def from_mmap(cls, path: str | Path, width: int = 8) -> "breached_digest_set":
+        with open(path, "rb") as file:
+            if not Path(path).stat().st_size:
+                return cls(b"", width)
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise"):
+            mapped.madvise(mmap.MADV_RANDOM)
+        return cls(mapped, width)  # type: ignore
+
+    def digest(self, word: str) -> bytes:
+        return sha1(word.encode()).digest()[: self.width]
+
+
+def write_breached_digests(
+    lines: Iterable[str], output: BinaryIO, width: int = 8
+) -> int:
+    """
+    write `HASH[:COUNT]` lines of hex sha-1 hashes (or prefixes of at least
+    `width` bytes), already sorted by hash, as a breached_digest_set file.
+    returns the number of digests written.
+    """
+    previous, written = b"", 0
+    for line in lines:
+        if not (line := line.strip()):
+            continue
+        key = bytes.fromhex(line.partition(":")[0][: width * 2])
+        if len(key) != width:
+            raise ValueError(f"hash shorter than {width} bytes: {line}")
+        if key < previous:
+            raise ValueError("hashes must be sorted, e.g. the ordered-by-hash corpus")
+        if key != previous:
+            output.write(key)
+            previous, written = key, written + 1
+    return written
+
+
+# flags a rule carries into the combined scan, as in a scoped `(?i-s:...)` group
+_scoped_flags = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s"}
+_other_flags = re.VERBOSE | re.ASCII | re.LOCALE
+# backreferences would count the groups of the whole scan, named groups could
+# clash with the rule names and global inline flags must start the expression;
+# an escaped lookalike only costs a separate search
+_unscannable = re.compile(r"\\(?:[1-9]|g<)|\(\?P[<=]|\(\?[aiLmsux]+\)")
+
+
+def _scoped(pattern: Pattern) -> str | None:
+    """the rule as a group with its own flags, None if it can't be combined"""
+    if pattern.flags & _other_flags or _unscannable.search(pattern.pattern):
+        return None
+    on = "".join(
+        letter for flag, letter in _scoped_flags.items() if pattern.flags & flag
+    )
+    # the scan itself is DOTALL, so that its `.` steps over newlines
+    off = "" if pattern.flags & re.DOTALL else "-s"
+    return f"(?{on}{off}:{pattern.pattern})"
+
+
+class password_policy:
+    """
+    every pattern rule compiled into one regex that is scanned once.
+    each rule is an optional lookahead with its own group and flags,
+    so all rules are tried at every position in the same pass
+    and all violations are reported together.
+    rules the scan can't hold, like backreferences, are searched one by one.
+    """
+
+    def __init__(
+        self,
+        min_length: int,
+        max_length: int,
+        need: Sequence[Pattern] = (),
+        deny: Sequence[Pattern] = (),
+        deny_list: digest_set | None = None,
+        breached: breached_digest_set | None = None,
+    ) -> None:
+        self.min_length = min_length
+        self.max_length = max_length
+        self.need = {f"need{i}": pattern for i, pattern in enumerate(need)}
+        self.deny = {f"deny{i}": pattern for i, pattern in enumerate(deny)}
+        self.deny_list = deny_list
+        self.breached = breached
+
+        scanned: dict[str, str] = {}
+        self._searched: dict[str, Pattern] = {}
+        for name, pattern in (self.need | self.deny).items():
+            if (scoped := _scoped(pattern)) is not None:
+                scanned[name] = scoped
+            else:
+                self._searched[name] = pattern
+        self._scan = re.compile(
+            "".join(
+                f"(?:(?=(?P<{name}>{scoped})))?" for name, scoped in scanned.items()
+            )
+            + ".",
+            re.DOTALL,
+        )
+        self._rule_count = len(scanned)
+
+    def _matched_rules(self, password: str) -> set[str]:
+        matched = {
+            name for name, pattern in self._searched.items() if pattern.search(password)
+        }
+        if not self._rule_count:
+            return matched
+        scanned = len(matched) + self._rule_count
+        for match in self._scan.finditer(password):
+            matched.update(
+                name for name, value in match.groupdict().items() if value is not None
+            )
+            if len(matched) == scanned:
+                break
+        return matched
+
+    def violations(self, password: str) -> list[str]:
+        reasons = []
+        if len(password) < self.min_length:
+            reasons.append(f"Password should be at least {self.min_length} characters")
+        elif len(password) > self.max_length:
+            reasons.append(f"Password should be at most {self.max_length} characters")
+
+        matched = self._matched_rules(password)
+        reasons.extend(
+            f"Password should not include {pattern.pattern}"
+            for name, pattern in self.deny.items()
+            if name in matched
+        )
+        reasons.extend(
+            f"Password must include {pattern.pattern}"
+            for name, pattern in self.need.items()
+            if name not in matched
+        )
+
+        if self.deny_list is not None and password in self.deny_list:
+            reasons.append("Password is too common")
+        if self.breached is not None and password in self.breached:
+            reasons.append("Password has appeared in a data breach")
+        return reasons
@@ -0,0 +1 @@
+from .provisioning import *
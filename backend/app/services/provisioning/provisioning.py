@@ -0,0 +1,162 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from itertools import islice
+from multiprocessing import get_context
+from time import time
+from typing import Any, AsyncIterator, Iterable, Iterator, Literal
+
+import orjson
+from fastapi_users.exceptions import InvalidPasswordException
+from fastapi_users.password import PasswordHelper
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from ...core import config
+from ...db.session import async_session
+from ...models import user
+from ...models.user import re_deny_name
+from ..authentication import UserManager
+from ..metrics import password_hash_queue_wait
+
+provision_status = Literal["created", "exists", "invalid"]
+
+
+@dataclass
+class provision_result:
+    index: int
+    email: str | None
+    status: provision_status
+    error: Any = None
+
+    def json(self) -> bytes:
+        return orjson.dumps(asdict(self))
+
+
+# the default helper of UserManager; module level so the process pool can
+# pickle `hash_password` by reference
+_password_helper = PasswordHelper()
+
+
+def hash_password(password: str, submitted_at: float) -> tuple[str, float]:
+    # (hash, seconds spent queued for a pool process); wall clock,
+    # since it's compared across processes
+    waited = time() - submitted_at
+    return _password_helper.hash(password), waited
+
+
+@lru_cache(maxsize=None)
+def get_hash_pool() -> ProcessPoolExecutor:
+    # spawn, not fork: the parent runs an event loop and threadpool threads
+    return ProcessPoolExecutor(
+        max_workers=config.PROVISION_HASH_WORKERS, mp_context=get_context("spawn")
+    )
+
+
+def shutdown_hash_pool() -> None:
+    if get_hash_pool.cache_info().currsize:
+        get_hash_pool().shutdown(wait=False, cancel_futures=True)
+        get_hash_pool.cache_clear()
+
+
+def iter_batches(
+    rows: Iterable[dict[str, Any]], size: int
+) -> Iterator[list[tuple[int, dict[str, Any]]]]:
+    numbered = enumerate(rows)
+    while batch := list(islice(numbered, size)):
+        yield batch
+
+
+async def validate_row(
+    manager: UserManager, index: int, row: dict[str, Any]
+) -> user.user_create | provision_result:
+    email = row.get("email")
+    try:
+        new_user = user.user_create.parse_obj(row)
+    except ValidationError as exc:
+        return provision_result(index, email, "invalid", orjson.loads(exc.json()))
+
+    if re_deny_name.search(new_user.name):
+        return provision_result(
+            index,
+            email,
+            "invalid",
+            "The name can only contain the following characters: "
+            f"{re_deny_name.pattern.replace('^','')}",
+        )
+
+    try:
+        await manager.validate_password(new_user.password, new_user)
+    except InvalidPasswordException as exc:
+        return provision_result(index, email, "invalid", exc.reason)
+
+    return new_user
+
+
+async def provision_batch(
+    manager: UserManager, batch: list[tuple[int, dict[str, Any]]]
+) -> list[provision_result]:
+    results: list[provision_result] = []
+    valid: list[tuple[int, user.user_create]] = []
+    seen: set[str] = set()
+
+    for index, row in batch:
+        checked = await validate_row(manager, index, row)
+        if isinstance(checked, provision_result):
+            results.append(checked)
+        elif (email := checked.email.lower()) in seen:
+            results.append(provision_result(index, checked.email, "exists"))
+        else:
+            seen.add(email)
+            valid.append((index, checked))
+
+    if not valid:
+        return results
+
+    loop = asyncio.get_running_loop()
+    pool = get_hash_pool()
+    submitted_at = time()
+    hashed = await asyncio.gather(
+        *(
+            loop.run_in_executor(pool, hash_password, new_user.password, submitted_at)
+            for _, new_user in valid
+        )
+    )
+    values = []
+    for (_, new_user), (hashed_password, waited) in zip(valid, hashed):
+        password_hash_queue_wait.observe(max(0.0, waited))
+        user_dict = new_user.create_update_dict()
+        user_dict.pop("password")
+        user_dict["hashed_password"] = hashed_password
+        values.append(user.user(**user_dict).dict())
+
+    session: async_session = manager.user_db.session  # type: ignore
+    inserted = await session.execute(
+        insert(user.user)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=[func.lower(user.user.email)])
+        .returning(user.user.email)
+    )
+    created = {email.lower() for email in inserted.scalars()}
+    await session.commit()
+
+    for index, new_user in valid:
+        status = "created" if new_user.email.lower() in created else "exists"
+        results.append(provision_result(index, new_user.email, status))
+    return sorted(results, key=lambda result: result.index)
+
+
+async def provision_users(
+    manager: UserManager,
+    rows: Iterable[dict[str, Any]],
+    batch_size: int = config.PROVISION_BATCH_SIZE,
+) -> AsyncIterator[list[provision_result]]:
+    """
+    validate, hash on a process pool and insert `rows` batch by batch.
+    every batch is one multi row `INSERT ... ON CONFLICT DO NOTHING RETURNING`
+    in its own transaction; yields the per row results of each batch.
+    """
+    for batch in iter_batches(rows, batch_size):
+        yield await provision_batch(manager, batch)
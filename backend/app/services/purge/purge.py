@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import Table, delete, select
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from ...db.session import async_session
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_deleted_rows(
+    engine: AsyncEngine,
+    table: Table,
+    retention_seconds: int,
+    batch_size: int,
+    throttle_seconds: float,
+) -> int:
+    """
+    hard delete rows soft deleted more than `retention_seconds` ago.
+    each batch is its own short transaction, and the pause between batches
+    gives autovacuum and replicas time to keep up with the dead tuples and WAL.
+    """
+    deleted_before = datetime.now() - timedelta(seconds=retention_seconds)
+    purged = 0
+    while True:
+        async with async_session(engine, autoflush=False) as session:
+            expired = (
+                select(table.c.id)
+                .where(table.c.deleted_at < deleted_before)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            result = await session.execute(delete(table).where(table.c.id.in_(expired)))
+            await session.commit()
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            return purged
+        await asyncio.sleep(throttle_seconds)
+
+
+async def run_purger(
+    engine: AsyncEngine,
+    tables: list[Table],
+    interval_seconds: float,
+    retention_seconds: int,
+    batch_size: int,
+    throttle_seconds: float,
+) -> None:
+    while True:
+        for table in tables:
+            try:
+                purged = await purge_deleted_rows(
+                    engine, table, retention_seconds, batch_size, throttle_seconds
+                )
+                if purged:
+                    logger.info(
+                        "purged deleted rows",
+                        extra={"table": table.name, "rows": purged},
+                    )
+            except Exception:
+                logger.warning(
+                    "purge failed", extra={"table": table.name}, exc_info=True
+                )
+        await asyncio.sleep(interval_seconds)
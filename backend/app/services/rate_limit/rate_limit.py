@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from time import monotonic, time
+from typing import Mapping
+
+from starlette.concurrency import run_in_threadpool
+
+from ...core import config
+from ...core.lru import lru_dict
+
+
+@dataclass(frozen=True)
+class rate_limit_rule:
+    rate: float  # tokens refilled per second
+    burst: int  # bucket size
+    concurrency: int = 0  # in flight requests per client, 0 = unlimited
+
+
+class rate_limit_exceeded(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def take_token(
+    tokens: float, elapsed: float, rule: rate_limit_rule
+) -> tuple[float, float]:
+    """
+    refill the bucket for `elapsed` seconds and take one token.
+    returns (tokens left, seconds until a token is available; 0 when allowed)
+    """
+    tokens = min(float(rule.burst), tokens + elapsed * rule.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rule.rate
+
+
+class rate_limit_backend(ABC):
+    @abstractmethod
+    async def take(self, key: str, rule: rate_limit_rule) -> float:
+        ...
+
+
+class memory_backend(rate_limit_backend):
+    """per worker buckets; the least recently seen clients are dropped first"""
+
+    def __init__(self, max_keys: int) -> None:
+        self.buckets: lru_dict[str, tuple[float, float]] = lru_dict(max_keys)
+
+    async def take(self, key: str, rule: rate_limit_rule) -> float:
+        now = monotonic()
+        tokens, updated = self.buckets.get(key, (float(rule.burst), now))
+        tokens, retry_after = take_token(tokens, now - updated, rule)
+        self.buckets[key] = (tokens, now)
+        return retry_after
+
+
+class sqlite_backend(rate_limit_backend):
+    """
+    buckets shared by every worker on the host through one sqlite file.
+    a local stand-in for a shared store; each take is a short write transaction
+    run on the threadpool so the event loop never waits on the file lock.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        if (connection := getattr(self._local, "connection", None)) is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute("pragma journal_mode=wal")
+            connection.execute("pragma synchronous=off")
+            connection.execute(
+                "create table if not exists buckets "
+                "(key text primary key, tokens real not null, updated real not null)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def _take(self, key: str, rule: rate_limit_rule) -> float:
+        connection = self._connect()
+        connection.execute("begin immediate")
+        try:
+            now = time()
+            row = connection.execute(
+                "select tokens, updated from buckets where key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row is not None else (float(rule.burst), now)
+            tokens, retry_after = take_token(tokens, max(0.0, now - updated), rule)
+            connection.execute(
+                "insert into buckets values (?, ?, ?) on conflict (key) "
+                "do update set tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            connection.execute("commit")
+        except BaseException:
+            connection.execute("rollback")
+            raise
+        return retry_after
+
+    async def take(self, key: str, rule: rate_limit_rule) -> float:
+        return await run_in_threadpool(self._take, key, rule)
+
+
+class rate_limiter:
+    def __init__(
+        self, backend: rate_limit_backend, rules: Mapping[str, rate_limit_rule]
+    ) -> None:
+        self.backend = backend
+        self.rules = rules
+        # concurrency is capped per worker: it bounds how many pool
+        # connections a single client can hold on this worker
+        self.in_flight: dict[str, int] = {}
+
+    async def acquire(self, key: str, rule: rate_limit_rule) -> None:
+        if rule.concurrency and self.in_flight.get(key, 0) >= rule.concurrency:
+            raise rate_limit_exceeded(1.0)
+        # the slot is held while waiting on the backend, so concurrent
+        # requests of the same client can't all pass the check above
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        try:
+            retry_after = await self.backend.take(key, rule)
+        except BaseException:
+            self.release(key)
+            raise
+        if retry_after > 0:
+            self.release(key)
+            raise rate_limit_exceeded(retry_after)
+
+    def release(self, key: str) -> None:
+        if (count := self.in_flight[key] - 1) > 0:
+            self.in_flight[key] = count
+        else:
+            del self.in_flight[key]
+
+
+def create_rate_limit_backend() -> rate_limit_backend:
+    match config.RATE_LIMIT_BACKEND:
+        case "memory":
+            return memory_backend(config.RATE_LIMIT_MAX_KEYS)
+        case "sqlite":
+            return sqlite_backend(config.RATE_LIMIT_SQLITE_PATH)
+        case backend:
+            raise ValueError(f"unknown rate limit backend: {backend}")
+
+
+def create_rate_limiter() -> rate_limiter:
+    rules = {
+        name: rate_limit_rule(rate, burst, concurrency)
+        for name, (rate, burst, concurrency) in config.RATE_LIMITS.items()
+    }
+    return rate_limiter(create_rate_limit_backend(), rules)
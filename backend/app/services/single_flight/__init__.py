@@ -0,0 +1 @@
+from .single_flight import *
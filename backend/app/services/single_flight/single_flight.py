@@ -0,0 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class single_flight(Generic[_K, _V]):
+    """
+    concurrent callers with the same key share one in flight call.
+
+    the call runs in its own task, so a caller that goes away (cancelled,
+    client disconnected) doesn't cancel it for the others still waiting.
+    that also means `func` must not borrow anything scoped to one request,
+    like the request's db session; open what it needs itself.
+    results are not kept once the call finishes: put a cache in front of
+    `do` for that, and misses of that cache are coalesced here.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[_K, asyncio.Task[_V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: _K, func: Callable[[], Awaitable[_V]]) -> _V:
+        if (task := self._calls.get(key)) is None:
+            task = self._calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: _K, task: asyncio.Task[_V]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # every waiter may have been cancelled; retrieve the exception so
+        # asyncio doesn't log it as never retrieved
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,225 @@
+import random
+import re
+import secrets
+import sys
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from time import time_ns
+from typing import IO, Any, ContextManager, Iterator
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+
+from ...core import config
+
+# version-trace_id-parent_id-flags, https://www.w3.org/TR/trace-context/
+re_traceparent = re.compile(
+    r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})"
+)
+SAMPLED_FLAG = 0x01
+
+
+@dataclass(eq=False)
+class span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    attributes: dict[str, Any] = field(default_factory=dict)
+    end_ns: int | None = None
+    error: str | None = None
+    # the finished spans of the trace in this process, shared by all its spans
+    finished: list["span"] = field(default_factory=list, repr=False)
+    # only set on the local root, which exports the trace when it ends
+    tracer: "tracer | None" = field(default=None, repr=False)
+
+    def record(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[span | None] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """(trace id, parent span id, sampled) of a valid `traceparent` header"""
+    if header is None or (match := re_traceparent.match(header.strip())) is None:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    if version == "00" and len(header.strip()) != 55:
+        # later versions may append fields, version 00 has none
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & SAMPLED_FLAG)
+
+
+class span_exporter(ABC):
+    @abstractmethod
+    def export(self, spans: list[span]) -> None:
+        ...
+
+
+class stream_exporter(span_exporter):
+    """spans as json lines, one write per trace"""
+
+    def __init__(self, stream: IO[bytes]) -> None:
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[span]) -> None:
+        data = b"".join(orjson.dumps(traced.record()) + b"\n" for traced in spans)
+        with self._lock:
+            self.stream.write(data)
+            self.stream.flush()
+
+
+class file_exporter(stream_exporter):
+    def __init__(self, path: str) -> None:
+        super().__init__(open(path, "ab"))
+
+
+class tracer:
+    """
+    starts the local root span of a request. an incoming `traceparent` is
+    continued and its sampled flag followed, other requests start a new trace
+    sampled at `sample_ratio`. requests that aren't sampled get no span at all,
+    so every span below them is a single context variable lookup.
+    """
+
+    def __init__(self, exporter: span_exporter | None, sample_ratio: float) -> None:
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+
+    def start_trace(
+        self, name: str, traceparent: str | None = None, **attributes: Any
+    ) -> span | None:
+        if self.exporter is None:
+            return None
+        if (parent := parse_traceparent(traceparent)) is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+            sampled = random.random() < self.sample_ratio
+        if not sampled:
+            return None
+        return span(
+            name,
+            trace_id,
+            secrets.token_hex(8),
+            parent_id,
+            time_ns(),
+            attributes,
+            tracer=self,
+        )
+
+
+def start_span(name: str, **attributes: Any) -> span | None:
+    """a child of the current span, None outside a sampled trace"""
+    if (parent := current_span.get()) is None:
+        return None
+    return span(
+        name,
+        parent.trace_id,
+        secrets.token_hex(8),
+        parent.span_id,
+        time_ns(),
+        attributes,
+        finished=parent.finished,
+    )
+
+
+def end_span(traced: span, error: BaseException | None = None) -> None:
+    traced.end_ns = time_ns()
+    if error is not None:
+        traced.error = repr(error)
+    traced.finished.append(traced)
+    if traced.tracer is not None and traced.tracer.exporter is not None:
+        traced.tracer.exporter.export(traced.finished)
+
+
+@contextmanager
+def use_span(traced: span | None) -> Iterator[span | None]:
+    """make `traced` the current span and end it on exit"""
+    if traced is None:
+        yield None
+        return
+
+    token = current_span.set(traced)
+    try:
+        yield traced
+    except BaseException as exc:
+        end_span(traced, exc)
+        raise
+    else:
+        end_span(traced)
+    finally:
+        current_span.reset(token)
+
+
+def trace_span(name: str, **attributes: Any) -> ContextManager[span | None]:
+    return use_span(start_span(name, **attributes))
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    # one span per statement; the execution context carries it to the end
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, *_
+    ) -> None:
+        kind = statement.split(None, 1)[0].lower() if statement else "statement"
+        context._trace_span = start_span(f"db {kind}", statement=statement)
+
+    def after_cursor_execute(
+        conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, *_
+    ) -> None:
+        if (traced := getattr(context, "_trace_span", None)) is not None:
+            context._trace_span = None
+            end_span(traced)
+
+    def handle_error(exception_context: Any) -> None:
+        context = exception_context.execution_context
+        if (traced := getattr(context, "_trace_span", None)) is not None:
+            context._trace_span = None
+            end_span(traced, exception_context.original_exception)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", handle_error)
+
+
+class traced_response(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        with trace_span("serialize response"):
+            return super().render(content)
+
+
+def create_span_exporter() -> span_exporter | None:
+    match config.TRACE_EXPORTER:
+        case "none":
+            return None
+        case "stdout":
+            return stream_exporter(sys.stdout.buffer)
+        case "file":
+            return file_exporter(config.TRACE_FILE)
+        case exporter:
+            raise ValueError(f"unknown trace exporter: {exporter}")
+
+
+@lru_cache(maxsize=None)
+def create_tracer() -> tracer:
+    return tracer(create_span_exporter(), config.TRACE_SAMPLE_RATIO)
@@ -1,22 +1,30 @@
 import os
+import re
 import warnings
-from typing import AsyncIterator
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, ContextManager, Iterator
 
 import alembic
 import pytest
 from alembic.config import Config
-from app.db.session import async_session
+from app.db.session import async_session, get_database
 from app.models import user
 from app.services.authentication import UserManager, create_strategy, user_db_class
+from app.services.dataset import dataset_spec, load_dataset
+from app.services.rate_limit import create_rate_limiter
 from asgi_lifespan import LifespanManager
 from fastapi import FastAPI
 from fastapi_users.exceptions import UserNotExists
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio.engine import AsyncConnection, AsyncEngine
+from sqlmodel.orm.session import Session
 
 
+# session scoped, so the app, its engine and pool live on one event loop
 @pytest.fixture(
-    params=[pytest.param(("asyncio", {"use_uvloop": True}), id="asyncio+uvloop")]
+    scope="session",
+    params=[pytest.param(("asyncio", {"use_uvloop": True}), id="asyncio+uvloop")],
 )
 def anyio_backend(request):
     return request.param
@@ -34,21 +42,106 @@ def apply_migrations():
     alembic.command.downgrade(config, "base")  # type: ignore
 
 
-# Create a new application for testing
-@pytest.fixture
-def app(apply_migrations: None) -> FastAPI:
+# One started application for the whole session
+@pytest.fixture(scope="session")
+async def app(apply_migrations: None) -> AsyncIterator[FastAPI]:
     from app.api.server import get_application
 
-    return get_application()
+    app = get_application()
+    async with LifespanManager(app):
+        yield app
 
 
-# Grab a reference to our database when needed
-@pytest.fixture
+# Grab a reference to our database when needed.
+# work done through the engine is committed; most tests want `connection`
+@pytest.fixture(scope="session")
 def engine(app: FastAPI) -> AsyncEngine:
     return app.state._db
 
 
 @pytest.fixture
+async def connection(
+    app: FastAPI, engine: AsyncEngine
+) -> AsyncIterator[AsyncConnection]:
+    """
+    a pooled connection in a transaction rolled back after the test.
+    the app and the test share it: every session transaction bound to it
+    works inside its own savepoint, so its commit releases the savepoint and
+    its rollback or close goes back to it, without ending the savepoint of
+    another session open on the same connection.
+    """
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        sync_connection = connection.sync_connection
+
+        def begin_savepoint(
+            session: Session, session_transaction: Any, bind: Any
+        ) -> None:
+            if bind is not sync_connection or session_transaction.parent is not None:
+                return
+            # the session joined the test transaction, hand it a savepoint
+            # it owns instead, ended with the session transaction
+            savepoint = sync_connection.begin_nested()
+            session_transaction._connections[bind] = session_transaction._connections[
+                bind.engine
+            ] = (bind, savepoint, True, False)
+
+        event.listen(Session, "after_begin", begin_savepoint)
+        app.dependency_overrides[get_database] = lambda: connection
+        try:
+            yield connection
+        finally:
+            app.dependency_overrides.pop(get_database, None)
+            event.remove(Session, "after_begin", begin_savepoint)
+            await transaction.rollback()
+
+
+# bookkeeping of the test transaction and of the statement timeout
+ignored_statements = re.compile(
+    r"\s*(savepoint|release savepoint|rollback to savepoint|set local)\b", re.I
+)
+
+
+@pytest.fixture
+def assert_queries(
+    connection: AsyncConnection,
+) -> Callable[..., ContextManager[list[str]]]:
+    """
+    `with assert_queries("select", "update"):` fails unless the block runs
+    exactly those statements, in that order, on the test connection.
+    """
+
+    @contextmanager
+    def assert_queries(*expected: str) -> Iterator[list[str]]:
+        statements: list[str] = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not ignored_statements.match(statement):
+                statements.append(statement)
+
+        sync_connection = connection.sync_connection
+        event.listen(sync_connection, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(sync_connection, "before_cursor_execute", record)
+
+        kinds = [statement.split(None, 1)[0].lower() for statement in statements]
+        assert kinds == list(expected), "\n\n".join(statements)
+
+    return assert_queries
+
+
+# a few thousand generated rows, rolled back with the test
+@pytest.fixture
+async def dataset(connection: AsyncConnection) -> dataset_spec:
+    spec = dataset_spec(users=100, cleanings=5_000, seed=1, passwords=1)
+    await load_dataset(connection, spec)
+    return spec
+
+
+# committed once, every test sees the same user
+@pytest.fixture(scope="session")
 async def test_user(engine: AsyncEngine) -> user.user:
     new_user = user.user_create.parse_obj(
         dict(
@@ -72,14 +165,17 @@ async def test_user(engine: AsyncEngine) -> user.user:
 
 # Make requests in our tests
 @pytest.fixture
-async def client(app: FastAPI) -> AsyncIterator[AsyncClient]:
-    async with LifespanManager(app):
-        async with AsyncClient(
-            app=app,
-            base_url="http://testserver",
-            headers={"Content-Type": "application/json"},
-        ) as client:
-            yield client
+async def client(
+    app: FastAPI, connection: AsyncConnection
+) -> AsyncIterator[AsyncClient]:
+    # the app outlives the test, its rate limit buckets should not
+    app.state._rate_limiter = create_rate_limiter()
+    async with AsyncClient(
+        app=app,
+        base_url="http://testserver",
+        headers={"Content-Type": "application/json"},
+    ) as client:
+        yield client
 
 
 @pytest.fixture
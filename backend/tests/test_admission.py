@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from app.middleware import admission_control
+from app.services.admission import (
+    READ_PRIORITY,
+    WRITE_PRIORITY,
+    admission_controller,
+    admission_rejected,
+    aimd_limit,
+)
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+
+def create_controller(
+    limit: int = 1, queue_timeout: float = 0.5, max_queue: int = 10
+) -> admission_controller:
+    return admission_controller(
+        aimd_limit(float(limit), min_limit=1, max_limit=10, latency_target=0.1),
+        queue_timeout=queue_timeout,
+        max_queue=max_queue,
+    )
+
+
+class TestAimdLimit:
+    def test_fast_requests_grow_the_limit(self) -> None:
+        limit = aimd_limit(4.0, min_limit=1, max_limit=5, latency_target=0.1)
+        for _ in range(100):
+            limit.update(0.01, now=0.0)
+        assert limit.limit == 5
+
+    def test_slow_requests_shrink_once_per_window(self) -> None:
+        limit = aimd_limit(10.0, min_limit=1, max_limit=10, latency_target=0.1)
+        limit.update(1.0, now=1.0)
+        limit.update(1.0, now=1.05)
+        assert limit.limit == pytest.approx(9.0)
+        limit.update(1.0, now=1.2)
+        assert limit.limit == pytest.approx(8.1)
+
+    def test_request_target(self) -> None:
+        limit = aimd_limit(4.0, min_limit=1, max_limit=10, latency_target=0.1)
+        limit.update(0.5, now=1.0, latency_target=1.0)
+        assert limit.limit == pytest.approx(4.25)
+        limit.update(2.0, now=1.0, latency_target=1.0)
+        assert limit.limit == pytest.approx(4.25 * 0.9)
+
+
+class TestAdmissionController:
+    async def test_reads_are_admitted_before_writes(self) -> None:
+        controller = create_controller()
+        await controller.acquire(READ_PRIORITY)
+
+        admitted: list[str] = []
+
+        async def request(name: str, priority: int) -> None:
+            await controller.acquire(priority)
+            admitted.append(name)
+            controller.release(0.01)
+
+        waiting = [
+            asyncio.ensure_future(request("write", WRITE_PRIORITY)),
+            asyncio.ensure_future(request("read", READ_PRIORITY)),
+        ]
+        await asyncio.sleep(0)
+        assert controller.queued == 2
+
+        controller.release(0.01)
+        await asyncio.gather(*waiting)
+        assert admitted == ["read", "write"]
+        assert controller.in_flight == 0
+        assert controller.queued == 0
+
+    async def test_queued_request_is_rejected_after_timeout(self) -> None:
+        controller = create_controller(queue_timeout=0.01)
+        await controller.acquire(READ_PRIORITY)
+        with pytest.raises(admission_rejected):
+            await controller.acquire(READ_PRIORITY)
+        assert controller.queued == 0
+
+        controller.release(0.01)
+        await controller.acquire(READ_PRIORITY)
+        assert controller.in_flight == 1
+
+    async def test_full_queue_rejects_immediately(self) -> None:
+        controller = create_controller(max_queue=0)
+        await controller.acquire(READ_PRIORITY)
+        with pytest.raises(admission_rejected):
+            await controller.acquire(WRITE_PRIORITY)
+
+
+class TestAdmissionControl:
+    @pytest.fixture
+    def controller(self) -> admission_controller:
+        return create_controller(limit=5)
+
+    @pytest.fixture
+    def app(self, controller: admission_controller) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/hash", name="test:hash")
+        async def hash_password() -> None:
+            await asyncio.sleep(0.2)
+
+        @app.get("/stream", name="test:stream")
+        async def stream() -> int:
+            await asyncio.sleep(0.2)
+            return controller.in_flight
+
+        app.add_middleware(
+            admission_control,
+            controller=controller,
+            latency_targets={"test:hash": 1.0, "test:stream": 0},
+            routes=app.routes,
+        )
+        return app
+
+    async def test_routes_slow_by_design(
+        self, app: FastAPI, controller: admission_controller
+    ) -> None:
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            await client.get("/hash")
+            assert controller.limit.limit == pytest.approx(5.2)
+            res = await client.get("/stream")
+            assert controller.limit.limit == pytest.approx(5.2)
+        # the stream never held a slot
+        assert res.json() == 0
+        assert controller.in_flight == 0
+
+    async def test_route_out_of_the_limit_is_admitted_when_full(
+        self, app: FastAPI, controller: admission_controller
+    ) -> None:
+        for _ in range(5):
+            await controller.acquire(READ_PRIORITY)
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get("/stream")
+        assert res.status_code == 200
+        assert controller.in_flight == 5
@@ -1,14 +1,16 @@
 from contextlib import suppress
+from datetime import datetime, timezone
 from decimal import Decimal, InvalidOperation
 
 import orjson
 import pytest
 from app.db.session import async_session
 from app.models import cleaning
-from app.models.core import datetime_model
+from app.models.core import datetime_model, local_naive
+from app.services.purge import purge_deleted_rows
 from fastapi import FastAPI, status
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncConnection
 
 pytestmark = pytest.mark.anyio
 
@@ -70,8 +72,42 @@ class TestCreateCleaning:
         assert res.status_code == status_code
 
 
+class TestIdempotentCreateCleaning:
+    async def test_retry_returns_the_first_response(
+        self, app: FastAPI, client: AsyncClient, new_cleaning: cleaning.cleaning_create
+    ) -> None:
+        payload = {"new_cleaning": orjson.loads(new_cleaning.json())}
+        headers = {"Idempotency-Key": "create-cleaning-retry"}
+        url = app.url_path_for("cleanings:create-cleaning")
+
+        first = await client.post(url, json=payload, headers=headers)
+        retry = await client.post(url, json=payload, headers=headers)
+        assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+        assert retry.json() == first.json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+
+        res = await client.get(app.url_path_for("cleanings:get-all-cleanings"))
+        assert [row["id"] for row in res.json()].count(first.json()["id"]) == 1
+
+    async def test_reused_key_with_other_body_is_rejected(
+        self, app: FastAPI, client: AsyncClient, new_cleaning: cleaning.cleaning_create
+    ) -> None:
+        headers = {"Idempotency-Key": "create-cleaning-reused"}
+        url = app.url_path_for("cleanings:create-cleaning")
+        payload = orjson.loads(new_cleaning.json())
+
+        res = await client.post(url, json={"new_cleaning": payload}, headers=headers)
+        assert res.status_code == status.HTTP_201_CREATED
+        res = await client.post(
+            url,
+            json={"new_cleaning": payload | {"name": "other cleaning"}},
+            headers=headers,
+        )
+        assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 @pytest.fixture
-async def test_cleaning(engine: AsyncEngine) -> cleaning.cleanings:
+async def test_cleaning(connection: AsyncConnection) -> cleaning.cleanings:
     new_cleaning_create = cleaning.cleaning_create.parse_obj(
         dict(
             name="fake cleaning name",
@@ -81,7 +117,7 @@ async def test_cleaning(engine: AsyncEngine) -> cleaning.cleanings:
         )
     )
     new_cleaning = cleaning.cleanings.validate(new_cleaning_create)
-    async with async_session(engine, autocommit=False) as session:
+    async with async_session(connection, autocommit=False) as session:
         session.add(new_cleaning)
         await session.commit()
         await session.refresh(new_cleaning)
@@ -134,6 +170,38 @@ class TestGetCleaning:
         )
 
 
+class TestFilterCleanings:
+    async def test_created_range_filters_the_list(
+        self, app: FastAPI, client: AsyncClient, test_cleaning: cleaning.cleanings
+    ) -> None:
+        url = app.url_path_for("cleanings:get-all-cleanings")
+        created_at = test_cleaning.created_at.isoformat()
+
+        res = await client.get(url, params={"created_after": created_at})
+        assert test_cleaning.id in {row["id"] for row in res.json()}
+        res = await client.get(url, params={"created_before": created_at})
+        assert test_cleaning.id not in {row["id"] for row in res.json()}
+
+    async def test_aware_bounds_are_local_time(
+        self, app: FastAPI, client: AsyncClient, test_cleaning: cleaning.cleanings
+    ) -> None:
+        url = app.url_path_for("cleanings:get-all-cleanings")
+        created_at = test_cleaning.created_at.astimezone(timezone.utc)
+        created_at = created_at.isoformat().replace("+00:00", "Z")
+
+        res = await client.get(url, params={"created_after": created_at})
+        assert res.status_code == status.HTTP_200_OK
+        assert test_cleaning.id in {row["id"] for row in res.json()}
+        res = await client.get(url, params={"created_before": created_at})
+        assert res.status_code == status.HTTP_200_OK
+        assert test_cleaning.id not in {row["id"] for row in res.json()}
+
+    def test_local_naive(self) -> None:
+        now = datetime.now()
+        assert local_naive(now) is now
+        assert local_naive(now.astimezone(timezone.utc)) == now
+
+
 class TestPatchCleaning:
     @pytest.mark.parametrize(
         "attrs_to_change, values",
@@ -182,8 +250,10 @@ class TestPatchCleaning:
                 with suppress(InvalidOperation, ValueError):
                     value = Decimal(f"{float(value):.2f}")
             assert attr_to_change == value
+        assert updated_cleaning.version == test_cleaning.version + 1
+        assert res.headers["ETag"] == f'"{updated_cleaning.version}"'
         # make sure that no other attributes' values have changed
-        for attr, value in updated_cleaning.dict().items():
+        for attr, value in updated_cleaning.dict(exclude={"version"}).items():
             if (
                 attr not in attrs_to_change
                 and attr not in datetime_model.datetime_attrs
@@ -196,19 +266,23 @@ class TestPatchCleaning:
             (-1, {"name": "test"}, 422),
             (0, {"name": "test2"}, 422),
             (500, {"name": "test3"}, 404),
-            (1, None, 422),
-            (1, {"cleaning_type": "invalid cleaning type"}, 422),
-            (1, {"cleaning_type": None}, 422),
+            (None, None, 422),
+            (None, {"cleaning_type": "invalid cleaning type"}, 422),
+            (None, {"cleaning_type": None}, 422),
         ),
     )
     async def test_update_cleaning_with_invalid_input_throws_error(
         self,
         app: FastAPI,
         client: AsyncClient,
-        id: int,
+        test_cleaning: cleaning.cleanings,
+        id: int | None,
         payload: dict,
         status_code: int,
     ) -> None:
+        # None is the existing test cleaning, so only the payload is invalid
+        if id is None:
+            id = test_cleaning.id
         update_cleaning = {"update_cleaning": payload}
         res = await client.patch(
             app.url_path_for("cleanings:update-cleaning-by-id-as-patch", id=str(id)),
@@ -217,6 +291,76 @@ class TestPatchCleaning:
         assert res.status_code == status_code
 
 
+class TestCleaningVersion:
+    async def test_stale_if_match_is_rejected(
+        self, app: FastAPI, client: AsyncClient, test_cleaning: cleaning.cleanings
+    ) -> None:
+        url = app.url_path_for(
+            "cleanings:update-cleaning-by-id-as-patch", id=str(test_cleaning.id)
+        )
+        res = await client.get(
+            app.url_path_for("cleanings:get-cleaning-by-id", id=str(test_cleaning.id))
+        )
+        etag = res.headers["ETag"]
+
+        res = await client.patch(
+            url,
+            json={"update_cleaning": {"name": "first writer"}},
+            headers={"If-Match": etag},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["ETag"] != etag
+
+        # the second writer read the same version and loses
+        res = await client.patch(
+            url,
+            json={"update_cleaning": {"name": "second writer"}},
+            headers={"If-Match": etag},
+        )
+        assert res.status_code == status.HTTP_409_CONFLICT
+
+        res = await client.get(
+            app.url_path_for("cleanings:get-cleaning-by-id", id=str(test_cleaning.id))
+        )
+        assert res.json()["name"] == "first writer"
+
+    @pytest.mark.parametrize(
+        "method, api_name",
+        (
+            ("PATCH", "cleanings:update-cleaning-by-id-as-patch"),
+            ("PUT", "cleanings:update-cleaning-by-id-as-put"),
+        ),
+    )
+    async def test_version_zero_is_stale(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        test_cleaning: cleaning.cleanings,
+        method: str,
+        api_name: str,
+    ) -> None:
+        # versions start at 1, so `"0"` never matches
+        res = await client.request(
+            method,
+            app.url_path_for(api_name, id=str(test_cleaning.id)),
+            json={"update_cleaning": {"name": "new name", "price": 9.99}},
+            headers={"If-Match": '"0"'},
+        )
+        assert res.status_code == status.HTTP_409_CONFLICT
+
+    async def test_invalid_if_match(
+        self, app: FastAPI, client: AsyncClient, test_cleaning: cleaning.cleanings
+    ) -> None:
+        res = await client.patch(
+            app.url_path_for(
+                "cleanings:update-cleaning-by-id-as-patch", id=str(test_cleaning.id)
+            ),
+            json={"update_cleaning": {"name": "new name"}},
+            headers={"If-Match": "not-a-version"},
+        )
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
 class TestDeleteCleaning:
     async def test_can_delete_cleaning_successfully(
         self,
@@ -237,6 +381,52 @@ class TestDeleteCleaning:
         )
         assert res.status_code == status.HTTP_404_NOT_FOUND
 
+    async def test_deleted_cleaning_is_hidden_then_purged(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        connection: AsyncConnection,
+        test_cleaning: cleaning.cleanings,
+    ) -> None:
+        res = await client.delete(
+            app.url_path_for(
+                "cleanings:delete-cleaning-by-id", id=str(test_cleaning.id)
+            ),
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+        res = await client.get(app.url_path_for("cleanings:get-all-cleanings"))
+        assert test_cleaning.id not in {row["id"] for row in res.json()}
+        res = await client.patch(
+            app.url_path_for(
+                "cleanings:update-cleaning-by-id-as-patch", id=str(test_cleaning.id)
+            ),
+            json={"update_cleaning": {"name": "deleted"}},
+        )
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+        res = await client.delete(
+            app.url_path_for(
+                "cleanings:delete-cleaning-by-id", id=str(test_cleaning.id)
+            ),
+        )
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+        # soft deleted until the purge removes the row
+        row_key = (test_cleaning.id, test_cleaning.created_at)
+        async with async_session(connection) as session:
+            row = await session.get(cleaning.cleanings, row_key)
+            assert row is not None and row.deleted_at is not None
+        purged = await purge_deleted_rows(
+            connection,
+            cleaning.cleanings.get_table(),
+            retention_seconds=0,
+            batch_size=1,
+            throttle_seconds=0,
+        )
+        assert purged >= 1
+        async with async_session(connection) as session:
+            assert await session.get(cleaning.cleanings, row_key) is None
+
     @pytest.mark.parametrize(
         "id, status_code",
         (
@@ -309,7 +499,8 @@ class TestPutCleaning:
                     value = Decimal(f"{float(value):.2f}")
             assert value == getattr(updated_cleaning, attr)
 
-        for attr, value in updated_cleaning.dict(exclude={"id"}).items():
+        assert updated_cleaning.version == test_cleaning.version + 1
+        for attr, value in updated_cleaning.dict(exclude={"id", "version"}).items():
             if (
                 attr not in attrs_to_change
                 and attr not in datetime_model.datetime_attrs
@@ -322,9 +513,9 @@ class TestPutCleaning:
             (-1, {"name": "test"}, 422),
             (0, {"name": "test2", "price": 123}, 422),
             (500, {"name": "test3", "price": 33.3}, 404),
-            (1, None, 422),
+            (None, None, 422),
             (
-                1,
+                None,
                 {
                     "name": "test5",
                     "price": "123.3",
@@ -332,20 +523,126 @@ class TestPutCleaning:
                 },
                 422,
             ),
-            (1, {"name": "test6", "price": 123.3, "cleaning_type": None}, 422),
+            (None, {"name": "test6", "price": 123.3, "cleaning_type": None}, 422),
         ),
     )
     async def test_update_cleaning_with_invalid_input_throws_error(
         self,
         app: FastAPI,
         client: AsyncClient,
-        id: int,
+        test_cleaning: cleaning.cleanings,
+        id: int | None,
         payload: dict,
         status_code: int,
     ) -> None:
+        # None is the existing test cleaning, so only the payload is invalid
+        if id is None:
+            id = test_cleaning.id
         update_cleaning = {"update_cleaning": payload}
         res = await client.patch(
             app.url_path_for("cleanings:update-cleaning-by-id-as-put", id=str(id)),
             json=update_cleaning,
         )
         assert res.status_code == status_code
+
+
+class TestCleaningQueryBudget:
+    async def test_create(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        assert_queries,
+        new_cleaning: cleaning.cleaning_create,
+    ) -> None:
+        payload = {"new_cleaning": orjson.loads(new_cleaning.json())}
+        # insert, then the refresh after commit
+        with assert_queries("insert", "select"):
+            res = await client.post(
+                app.url_path_for("cleanings:create-cleaning"), json=payload
+            )
+        assert res.status_code == status.HTTP_201_CREATED
+
+    async def test_idempotent_create_and_replay(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        assert_queries,
+        new_cleaning: cleaning.cleaning_create,
+    ) -> None:
+        payload = {"new_cleaning": orjson.loads(new_cleaning.json())}
+        headers = {"Idempotency-Key": "create-cleaning-budget"}
+        url = app.url_path_for("cleanings:create-cleaning")
+        # claim the key, insert, store the response, refresh
+        with assert_queries("insert", "insert", "update", "select"):
+            res = await client.post(url, json=payload, headers=headers)
+        assert res.status_code == status.HTTP_201_CREATED
+        # the claim conflicts, the stored response is read back
+        with assert_queries("insert", "select"):
+            res = await client.post(url, json=payload, headers=headers)
+        assert res.headers["Idempotent-Replayed"] == "true"
+
+    async def test_get_by_id(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        assert_queries,
+        test_cleaning: cleaning.cleanings,
+    ) -> None:
+        with assert_queries("select"):
+            res = await client.get(
+                app.url_path_for(
+                    "cleanings:get-cleaning-by-id", id=str(test_cleaning.id)
+                )
+            )
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_get_all(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        assert_queries,
+        test_cleaning: cleaning.cleanings,
+    ) -> None:
+        with assert_queries("select"):
+            res = await client.get(app.url_path_for("cleanings:get-all-cleanings"))
+        assert res.status_code == status.HTTP_200_OK
+
+    @pytest.mark.parametrize(
+        "name",
+        (
+            "cleanings:update-cleaning-by-id-as-patch",
+            "cleanings:update-cleaning-by-id-as-put",
+        ),
+    )
+    async def test_update(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        assert_queries,
+        test_cleaning: cleaning.cleanings,
+        name: str,
+    ) -> None:
+        payload = {"update_cleaning": {"name": "budget", "price": 1.5}}
+        # the read, then one conditional update returning the row
+        with assert_queries("select", "update"):
+            res = await client.request(
+                "PATCH" if name.endswith("patch") else "PUT",
+                app.url_path_for(name, id=str(test_cleaning.id)),
+                json=payload,
+            )
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_delete(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        assert_queries,
+        test_cleaning: cleaning.cleanings,
+    ) -> None:
+        with assert_queries("update"):
+            res = await client.delete(
+                app.url_path_for(
+                    "cleanings:delete-cleaning-by-id", id=str(test_cleaning.id)
+                )
+            )
+        assert res.status_code == status.HTTP_200_OK
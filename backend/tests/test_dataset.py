@@ -0,0 +1,60 @@
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+
+import pytest
+from app.models import cleaning, user
+from app.services.dataset import (
+    cleaning_columns,
+    cleaning_type_enum,
+    dataset_spec,
+    generate_cleanings,
+    generate_users,
+)
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+pytestmark = pytest.mark.anyio
+
+
+class TestDatasetGeneration:
+    def test_same_seed_same_rows(self) -> None:
+        spec = dataset_spec(cleanings=100)
+        assert list(generate_cleanings(spec)) == list(generate_cleanings(spec))
+        other = dataset_spec(cleanings=100, seed=1, until=spec.until)
+        assert list(generate_cleanings(spec)) != list(generate_cleanings(other))
+
+    def test_cleaning_types_and_prices_follow_the_spec(self) -> None:
+        spec = dataset_spec(cleanings=10_000)
+        rows = [dict(zip(cleaning_columns, row)) for row in generate_cleanings(spec)]
+        types = Counter(row["cleaning_type"] for row in rows)
+        assert types["dust_up"] > types["spot_clean"] > types["full_clean"]
+        for row in rows:
+            low, high = spec.prices[cleaning_type_enum(row["cleaning_type"])]
+            assert low <= row["price"] <= high
+            assert (
+                spec.until - timedelta(days=spec.days)
+                <= row["created_at"]
+                <= spec.until
+            )
+
+    def test_users_share_precomputed_hashes(self) -> None:
+        rows = list(islice(generate_users(dataset_spec(), ["a", "b"]), 4))
+        assert [row[3] for row in rows] == ["a", "b", "a", "b"]
+        assert len({row[1] for row in rows}) == 4
+
+
+class TestDatasetLoad:
+    async def test_dataset_is_copied(
+        self, connection: AsyncConnection, dataset: dataset_spec
+    ) -> None:
+        users = await connection.scalar(
+            select(func.count())
+            .select_from(user.user)
+            .where(user.user.email.like(f"user{dataset.seed}\\_%"))
+        )
+        assert users == dataset.users
+        cleanings = await connection.scalar(
+            select(func.count()).select_from(cleaning.cleanings)
+        )
+        assert cleanings >= dataset.cleanings
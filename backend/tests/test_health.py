@@ -0,0 +1,29 @@
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+
+class TestHealthRoutes:
+    async def test_liveness(self, app: FastAPI, client: AsyncClient) -> None:
+        res = await client.get(app.url_path_for("health:live"))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json() == {"status": "ok"}
+
+    async def test_readiness_after_startup(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        res = await client.get(app.url_path_for("health:ready"))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["status"] == "ok"
+        assert app.state._db_ready
+
+    async def test_not_ready_before_startup(self) -> None:
+        from app.api.server import get_application
+
+        # the shared `app` is already started
+        app = get_application()
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get(app.url_path_for("health:ready"))
+        assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
@@ -0,0 +1,123 @@
+import logging
+import sys
+
+import orjson
+import pytest
+from app.core.logging import (
+    bind_log_context,
+    context_filter,
+    create_log_handlers,
+    debug_sampler,
+    json_formatter,
+    log_context,
+    request_log_context,
+)
+from app.middleware import bind_request_log_context
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+
+def make_record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord(
+        "app.test", level, __file__, 1, "hello %s", ("world",), None
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+class TestJsonFormatter:
+    def test_fields(self) -> None:
+        record = make_record(rows=3, context={"request_id": "abc"})
+        entry = orjson.loads(json_formatter().format(record))
+        assert entry["level"] == "info"
+        assert entry["logger"] == "app.test"
+        assert entry["message"] == "hello world"
+        assert entry["rows"] == 3
+        assert entry["request_id"] == "abc"
+        assert "context" not in entry and "args" not in entry
+
+    def test_exception(self) -> None:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord(
+                "app.test", logging.ERROR, __file__, 1, "failed", (), sys.exc_info()
+            )
+        entry = orjson.loads(json_formatter().format(record))
+        assert "ValueError: boom" in entry["exc_info"]
+
+
+class TestFilters:
+    def test_context_is_added(self) -> None:
+        scope = {"route": None}
+        token = request_log_context.set(log_context("abc", scope))
+        try:
+            bind_log_context(user_id="42")
+            record = make_record()
+            assert context_filter().filter(record)
+        finally:
+            request_log_context.reset(token)
+        assert record.context == {"request_id": "abc", "user_id": "42"}  # type: ignore
+
+    def test_no_context_outside_a_request(self) -> None:
+        bind_log_context(user_id="42")
+        record = make_record()
+        assert context_filter().filter(record)
+        assert not hasattr(record, "context")
+
+    def test_debug_sampling(self) -> None:
+        sampler = debug_sampler(0.0)
+        assert not sampler.filter(make_record(logging.DEBUG))
+        assert sampler.filter(make_record(logging.INFO))
+        assert debug_sampler(1.0).filter(make_record(logging.DEBUG))
+
+
+def test_records_are_written_by_the_listener(capsys) -> None:
+    handler, listener = create_log_handlers()
+    logger = logging.getLogger("app.test_listener")
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    listener.start()
+    try:
+        logger.info("first", extra={"rows": 1})
+        logger.info("second %d", 2)
+    finally:
+        listener.stop()
+        logger.removeHandler(handler)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [orjson.loads(line)["message"] for line in lines] == ["first", "second 2"]
+    assert orjson.loads(lines[0])["rows"] == 1
+
+
+class TestRequestLogContext:
+    @pytest.fixture
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/context", name="context:get")
+        async def get_context() -> dict:
+            context = request_log_context.get()
+            return context.values() if context is not None else {}
+
+        app.add_middleware(bind_request_log_context)
+        return app
+
+    async def test_request_id_is_generated(self, app: FastAPI) -> None:
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get("/context")
+        assert res.status_code == status.HTTP_200_OK
+        request_id = res.headers["X-Request-ID"]
+        assert res.json() == {"request_id": request_id, "route": "context:get"}
+
+    async def test_request_id_is_kept(self, app: FastAPI) -> None:
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get("/context", headers={"X-Request-ID": "abc-123"})
+            assert res.headers["X-Request-ID"] == "abc-123"
+            assert res.json()["request_id"] == "abc-123"
+
+            res = await client.get("/context", headers={"X-Request-ID": "a b"})
+            assert res.headers["X-Request-ID"] != "a b"
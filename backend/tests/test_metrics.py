@@ -0,0 +1,79 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from app.services.metrics import metrics_registry, read_values
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+
+def create_registry(directory: Path | None, pid: int | None = None) -> metrics_registry:
+    registry = metrics_registry(directory, pid=pid)
+    registry.counter("requests_total", "Requests.", ("route",))
+    registry.gauge("in_flight", "Requests in flight.")
+    registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    return registry
+
+
+def exited_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+class TestMetricsRegistry:
+    def test_memory_render(self) -> None:
+        registry = create_registry(None)
+        registry.metrics["requests_total"].inc(route="a")  # type: ignore
+        registry.metrics["requests_total"].inc(2, route="a")  # type: ignore
+        registry.metrics["in_flight"].set(3)  # type: ignore
+        for value in (0.05, 0.5, 5):
+            registry.metrics["latency_seconds"].observe(value)  # type: ignore
+
+        lines = registry.render().splitlines()
+        assert "# TYPE requests_total counter" in lines
+        assert 'requests_total{route="a"} 3.0' in lines
+        assert "in_flight 3.0" in lines
+        assert 'latency_seconds_bucket{le="0.1"} 1.0' in lines
+        assert 'latency_seconds_bucket{le="1.0"} 2.0' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 3.0' in lines
+        assert "latency_seconds_count 3.0" in lines
+
+    def test_labels_are_checked(self) -> None:
+        registry = create_registry(None)
+        with pytest.raises(ValueError):
+            registry.metrics["requests_total"].inc(method="GET")  # type: ignore
+
+    def test_workers_are_added_up(self, tmp_path: Path) -> None:
+        dead = exited_pid()
+        live = create_registry(tmp_path)
+        gone = create_registry(tmp_path, pid=dead)
+        for registry in (live, gone):
+            registry.metrics["requests_total"].inc(route="a")  # type: ignore
+            registry.metrics["in_flight"].inc()  # type: ignore
+
+        lines = create_registry(tmp_path, pid=1).render().splitlines()
+        # counts of an exited worker stay, its gauges don't
+        assert 'requests_total{route="a"} 2.0' in lines
+        assert "in_flight 1.0" in lines
+
+    def test_file_grows(self, tmp_path: Path) -> None:
+        registry = create_registry(tmp_path)
+        for index in range(5000):
+            registry.metrics["requests_total"].inc(route=f"route-{index}")  # type: ignore
+        (path,) = tmp_path.glob("counter_*.db")
+        assert len(dict(read_values(path))) == 5000
+
+
+class TestMetricsRoute:
+    async def test_requests_are_counted(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        await client.get(app.url_path_for("health:live"))
+        res = await client.get(app.url_path_for("metrics:get-metrics"))
+        assert res.status_code == status.HTTP_200_OK
+        assert 'route="health:live"' in res.text
+        assert "http_request_duration_seconds_bucket" in res.text
@@ -0,0 +1,224 @@
+from argparse import Namespace
+from contextlib import contextmanager
+from typing import Iterator
+
+import alembic
+import pytest
+from alembic.config import Config
+from alembic.operations import Operations
+from alembic.runtime.environment import EnvironmentContext
+from alembic.script import ScriptDirectory
+from app.db.engine import get_engine, get_test_engine
+from app.db.online import (
+    backfill,
+    create_index_concurrently,
+    get_index_sql,
+    is_invalid_index,
+    progress_table,
+)
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+
+script_location = "./app/db/migrations"
+test_table = "online_migration_items"
+
+
+def get_config(*x_arguments: str) -> Config:
+    # no ini file, so the logging of the running tests is left alone
+    config = Config(cmd_opts=Namespace(x=list(x_arguments)))
+    config.set_main_option("script_location", script_location)
+    return config
+
+
+@contextmanager
+def revision_context(connection: Connection) -> Iterator[None]:
+    # what env.py sets up around one revision, so `op` and `context` work
+    config = get_config()
+    with EnvironmentContext(config, ScriptDirectory.from_config(config)) as env:
+        env.configure(connection=connection)
+        with Operations.context(env.get_context()), env.begin_transaction():
+            yield
+
+
+@pytest.fixture
+def connection(apply_migrations: None) -> Iterator[Connection]:
+    """
+    a connection to the test database with a scratch table of 25 rows.
+    the helpers commit on their own, so everything is dropped afterwards.
+    """
+    engine = get_test_engine(get_engine(), is_sync=True)
+    with engine.connect() as connection:
+        with connection.begin():
+            connection.execute(
+                text(
+                    f"create table {test_table} "
+                    "(id bigint primary key, value int not null, copied int)"
+                )
+            )
+            connection.execute(
+                text(
+                    f"insert into {test_table} (id, value) "
+                    "select i, i from generate_series(1, 25) i"
+                )
+            )
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            with connection.begin():
+                connection.execute(text(f"drop table if exists {test_table}"))
+                connection.execute(text(f"drop table if exists {progress_table}"))
+    engine.dispose()
+
+
+@contextmanager
+def count_updates(connection: Connection) -> Iterator[list[str]]:
+    updates: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(f"update {test_table}"):
+            updates.append(statement)
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        yield updates
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+
+class TestOnlineMigrations:
+    def test_index_sql(self) -> None:
+        assert get_index_sql("ix_cleanings_price", "cleanings", ["price"]) == (
+            "create index concurrently if not exists ix_cleanings_price "
+            "on cleanings (price)"
+        )
+
+    def test_partitioned_parent_index_sql(self) -> None:
+        assert get_index_sql(
+            "ix_cleanings_live_price",
+            "cleanings",
+            ["price", "created_at"],
+            unique=True,
+            where="deleted_at is null",
+            concurrently=False,
+            only=True,
+        ) == (
+            "create unique index if not exists ix_cleanings_live_price "
+            "on only cleanings (price, created_at) where deleted_at is null"
+        )
+
+
+class TestBackfill:
+    def run_backfill(self, connection: Connection) -> None:
+        with revision_context(connection):
+            backfill(
+                "items_copied",
+                test_table,
+                set_sql="copied = value",
+                where="copied is null",
+                batch_size=10,
+                sleep_seconds=0,
+            )
+
+    def get_progress(self, connection: Connection) -> tuple:
+        progress = connection.execute(
+            text(f"select last_key, rows, done from {progress_table}")
+        ).one()
+        connection.rollback()
+        return tuple(progress)
+
+    def test_batches_and_progress(self, connection: Connection) -> None:
+        with count_updates(connection) as updates:
+            self.run_backfill(connection)
+        assert len(updates) == 3
+
+        copied = connection.execute(
+            text(f"select count(*) from {test_table} where copied = value")
+        ).scalar_one()
+        assert copied == 25
+        assert self.get_progress(connection) == (25, 25, True)
+
+        # done, a rerun only reads the progress
+        with count_updates(connection) as updates:
+            self.run_backfill(connection)
+        assert updates == []
+
+    def test_resumes_after_the_last_key(self, connection: Connection) -> None:
+        # as if interrupted after the first batch
+        with connection.begin():
+            connection.execute(
+                text(
+                    f"create table {progress_table} (name text primary key, "
+                    "last_key bigint, rows bigint not null, done boolean not null, "
+                    "updated_at timestamp not null)"
+                )
+            )
+            connection.execute(
+                text(
+                    f"insert into {progress_table} "
+                    "values ('items_copied', 10, 10, false, now())"
+                )
+            )
+
+        with count_updates(connection) as updates:
+            self.run_backfill(connection)
+        assert len(updates) == 2
+
+        # the keys before the saved one are not updated again
+        not_copied = connection.execute(
+            text(
+                f"select array_agg(id order by id) from {test_table} where copied is null"
+            )
+        ).scalar_one()
+        assert not_copied == list(range(1, 11))
+        assert self.get_progress(connection) == (25, 25, True)
+
+
+class TestCreateIndexConcurrently:
+    index = f"ix_{test_table}_value"
+
+    def test_invalid_index_is_built_again(self, connection: Connection) -> None:
+        # a failed concurrent build leaves the index behind, invalid
+        connection.execute(text(f"update {test_table} set value = 1 where id = 2"))
+        connection.commit()
+        with connection.engine.connect() as build:
+            build = build.execution_options(isolation_level="AUTOCOMMIT")
+            with pytest.raises(IntegrityError):
+                build.execute(
+                    text(get_index_sql(self.index, test_table, ["value"], unique=True))
+                )
+        assert is_invalid_index(connection, self.index)
+
+        connection.execute(text(f"update {test_table} set value = 2 where id = 2"))
+        connection.commit()
+        with revision_context(connection):
+            create_index_concurrently(self.index, test_table, ["value"], unique=True)
+
+        assert not is_invalid_index(connection, self.index)
+        assert connection.execute(
+            text("select to_regclass(:name) is not null"), {"name": self.index}
+        ).scalar_one()
+        connection.rollback()
+
+
+class TestDryRun:
+    def get_state(self) -> tuple:
+        engine = get_test_engine(get_engine(), is_sync=True)
+        with engine.connect() as connection:
+            version = connection.execute(
+                text("select version_num from alembic_version")
+            ).scalar_one()
+            tables = connection.execute(
+                text(
+                    "select array_agg(tablename::text order by tablename) "
+                    "from pg_tables where schemaname = 'public'"
+                )
+            ).scalar_one()
+        engine.dispose()
+        return version, tables
+
+    def test_downgrade_is_rolled_back(self, apply_migrations: None) -> None:
+        before = self.get_state()
+        alembic.command.downgrade(get_config("dry_run=true"), "base")  # type: ignore
+        assert self.get_state() == before
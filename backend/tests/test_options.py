@@ -0,0 +1,106 @@
+import pytest
+from app.api.server import get_application
+from app.middleware import allowed_methods, answer_options
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+preflight = {
+    "Origin": "https://example.com",
+    "Access-Control-Request-Method": "PATCH",
+    "Access-Control-Request-Headers": "authorization, content-type",
+}
+
+
+def create_app(**options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items")
+    async def list_items() -> list:
+        return []
+
+    @app.post("/items")
+    async def create_item() -> dict:
+        return {}
+
+    @app.get("/items/{id:int}")
+    async def get_item(id: int) -> dict:
+        return {}
+
+    @app.patch("/items/{id:int}")
+    async def update_item(id: int) -> dict:
+        return {}
+
+    app.add_middleware(answer_options, table=allowed_methods(app.routes), **options)
+    return app
+
+
+class TestAllowedMethods:
+    def test_methods_by_path(self) -> None:
+        table = allowed_methods(create_app().routes)
+        assert table.get("/items") == "GET, OPTIONS, POST"
+        assert table.get("/items/1") == "GET, OPTIONS, PATCH"
+        assert table.get("/items/one") is None
+        assert table.get("/unknown") is None
+
+
+class TestAnswerOptions:
+    async def test_allow(self) -> None:
+        async with AsyncClient(
+            app=create_app(), base_url="http://testserver"
+        ) as client:
+            res = await client.options("/items/1")
+            assert res.status_code == status.HTTP_204_NO_CONTENT
+            assert res.headers["Allow"] == "GET, OPTIONS, PATCH"
+            assert not res.content
+
+            res = await client.options("/unknown")
+            assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_preflight(self) -> None:
+        app = create_app(allow_credentials=True, max_age=60)
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.options("/items/1", headers=preflight)
+        assert res.status_code == status.HTTP_204_NO_CONTENT
+        assert res.headers["Access-Control-Allow-Origin"] == "https://example.com"
+        assert res.headers["Access-Control-Allow-Methods"] == "GET, OPTIONS, PATCH"
+        assert (
+            res.headers["Access-Control-Allow-Headers"]
+            == preflight["Access-Control-Request-Headers"]
+        )
+        assert res.headers["Access-Control-Allow-Credentials"] == "true"
+        assert res.headers["Access-Control-Max-Age"] == "60"
+        assert res.headers["Vary"] == "Origin"
+
+    async def test_preflight_of_a_method_the_path_lacks(self) -> None:
+        async with AsyncClient(
+            app=create_app(), base_url="http://testserver"
+        ) as client:
+            res = await client.options("/items", headers=preflight)
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+        assert res.text == "Disallowed CORS method"
+
+    async def test_preflight_of_an_unknown_origin(self) -> None:
+        app = create_app(allow_origins=("https://app.example.com",))
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.options("/items/1", headers=preflight)
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Access-Control-Allow-Origin" not in res.headers
+
+
+async def test_application_answers_preflights() -> None:
+    # answered before admission control, dependencies and the database
+    app = get_application()
+    async with AsyncClient(app=app, base_url="http://testserver") as client:
+        res = await client.options(
+            app.url_path_for("cleanings:get-cleaning-by-id", id="1"),
+            headers=preflight,
+        )
+        assert res.status_code == status.HTTP_204_NO_CONTENT
+        allowed = set(res.headers["Access-Control-Allow-Methods"].split(", "))
+        assert {"GET", "PATCH", "PUT", "DELETE"} <= allowed
+
+        res = await client.options(app.url_path_for("users:get-allowed-methods"))
+        assert res.status_code == status.HTTP_204_NO_CONTENT
+        assert "POST" in res.headers["Allow"]
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+from app.db.partitions import (
+    create_partition_sql,
+    ensure_partitions,
+    get_partitions,
+    month_start,
+    partition_name,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+pytestmark = pytest.mark.anyio
+
+
+class TestMonthlyPartitions:
+    @pytest.mark.parametrize(
+        "moment, months, expected",
+        (
+            (datetime(2026, 10, 19, 13, 5), 0, datetime(2026, 10, 1)),
+            (datetime(2026, 12, 31, 23, 59), 1, datetime(2027, 1, 1)),
+            (datetime(2026, 1, 15), -1, datetime(2025, 12, 1)),
+            (datetime(2026, 3, 1), 13, datetime(2027, 4, 1)),
+        ),
+    )
+    def test_month_start(
+        self, moment: datetime, months: int, expected: datetime
+    ) -> None:
+        assert month_start(moment, months) == expected
+
+    def test_partition_bounds(self) -> None:
+        start = datetime(2026, 12, 1)
+        assert partition_name("cleanings", start) == "cleanings_y2026m12"
+        assert create_partition_sql("cleanings", start).endswith(
+            "from ('2026-12-01T00:00:00') to ('2027-01-01T00:00:00')"
+        )
+
+    async def test_partitions_cover_the_months_ahead(self, engine: AsyncEngine) -> None:
+        await ensure_partitions(engine, "cleanings", months_ahead=3)
+        # a second run has nothing left to create
+        assert await ensure_partitions(engine, "cleanings", months_ahead=3) == []
+
+        async with engine.connect() as connection:
+            partitions = await get_partitions(connection, "cleanings")
+        assert "cleanings_legacy" in partitions
+        assert max(partitions.values()) > month_start(datetime.now(), 3)  # type: ignore
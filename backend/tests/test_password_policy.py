@@ -0,0 +1,133 @@
+import re
+from hashlib import sha1
+from pathlib import Path
+from time import perf_counter
+
+import pytest
+from app.services.password_policy import (
+    breached_digest_set,
+    digest_set,
+    password_policy,
+    write_breached_digests,
+)
+
+# generous on purpose, like the startup budget: it catches a linear scan,
+# not noise on a slow CI runner
+deny_list_lookup_budget_us = 50
+deny_list_size = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def large_deny_list() -> digest_set:
+    return digest_set.from_words(f"password{i}" for i in range(deny_list_size))
+
+
+@pytest.fixture
+def policy() -> password_policy:
+    return password_policy(
+        min_length=10,
+        max_length=30,
+        need=[re.compile(r"[a-zA-Z]"), re.compile(r"[0-9]")],
+        deny=[re.compile(r"phresh")],
+        deny_list=digest_set.from_words(["letmein@123456"]),
+    )
+
+
+class TestPasswordPolicy:
+    def test_valid_password(self, policy: password_policy) -> None:
+        assert policy.violations("heatcavslakers@1") == []
+
+    def test_reports_every_violation(self, policy: password_policy) -> None:
+        assert policy.violations("phresh") == [
+            "Password should be at least 10 characters",
+            "Password should not include phresh",
+            "Password must include [0-9]",
+        ]
+
+    def test_deny_list_is_case_insensitive(self, policy: password_policy) -> None:
+        assert policy.violations("LetMeIn@123456") == ["Password is too common"]
+
+    def test_rules_keep_their_flags(self) -> None:
+        policy = password_policy(
+            min_length=1,
+            max_length=30,
+            need=[re.compile(r"^a.b$", re.MULTILINE)],
+            deny=[re.compile("password", re.IGNORECASE)],
+        )
+        assert policy.violations("PassWord1!\nazb") == [
+            "Password should not include password"
+        ]
+        # the rule is not DOTALL like the scan, its `.` stops at the newline
+        assert policy.violations("a\nb") == ["Password must include ^a.b$"]
+
+    def test_rules_the_scan_cannot_hold(self) -> None:
+        policy = password_policy(
+            min_length=1,
+            max_length=30,
+            deny=[
+                re.compile("(?i)qwerty"),
+                re.compile(r"(.)\1\1"),
+                re.compile(r"(?P<year>19|20)\d\d"),
+            ],
+        )
+        assert policy.violations("QwErTy") == ["Password should not include (?i)qwerty"]
+        assert policy.violations("xaaay") == ["Password should not include (.)\\1\\1"]
+        assert policy.violations("born1984") == [
+            "Password should not include (?P<year>19|20)\\d\\d"
+        ]
+        assert policy.violations("abcabc") == []
+
+
+class TestDigestSet:
+    def test_membership(self) -> None:
+        words = digest_set.from_words(["alpha", "beta", "beta", "gamma"])
+        assert len(words) == 3
+        assert all(word in words for word in ("alpha", "beta", "gamma"))
+        assert "delta" not in words
+        assert "" not in digest_set(b"")
+
+    def test_large_deny_list_lookup(self, large_deny_list: digest_set) -> None:
+        assert len(large_deny_list) == deny_list_size
+        # one flat buffer, not a million python objects
+        assert len(large_deny_list.buffer) == deny_list_size * large_deny_list.width
+
+        candidates = [f"password{i}" for i in range(0, deny_list_size, 100)]
+        candidates += [f"not-denied{i}" for i in range(len(candidates))]
+        started = perf_counter()
+        found = sum(candidate in large_deny_list for candidate in candidates)
+        elapsed_us = (perf_counter() - started) * 1_000_000
+
+        assert found == len(candidates) // 2
+        assert elapsed_us / len(candidates) < deny_list_lookup_budget_us
+
+
+class TestBreachedDigestSet:
+    def test_mapped_file_lookup(self, tmp_path: Path) -> None:
+        breached = ["123456", "Password1", "heatcavslakers@1"]
+        lines = sorted(
+            f"{sha1(word.encode()).hexdigest().upper()}:3" for word in breached
+        )
+        path = tmp_path / "breached.bin"
+        with path.open("wb") as output:
+            assert write_breached_digests(lines, output) == 3
+
+        mapped = breached_digest_set.from_mmap(path)
+        assert len(mapped) == 3
+        assert all(word in mapped for word in breached)
+        # breach corpora hash the password as is
+        assert "password1" not in mapped
+
+        policy = password_policy(min_length=1, max_length=30, breached=mapped)
+        assert policy.violations("heatcavslakers@1") == [
+            "Password has appeared in a data breach"
+        ]
+
+    def test_unsorted_source_is_rejected(self, tmp_path: Path) -> None:
+        with (tmp_path / "breached.bin").open("wb") as output:
+            with pytest.raises(ValueError):
+                write_breached_digests(["FF" * 20, "00" * 20], output)
+
+    def test_empty_file(self, tmp_path: Path) -> None:
+        path = tmp_path / "breached.bin"
+        path.touch()
+        assert "123456" not in breached_digest_set.from_mmap(path)
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import pytest
+from app.services.rate_limit import (
+    memory_backend,
+    rate_limit_exceeded,
+    rate_limit_rule,
+    rate_limiter,
+    sqlite_backend,
+)
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+# refills far slower than a test runs, so only the burst counts
+slow_rule = rate_limit_rule(rate=0.001, burst=2, concurrency=1)
+
+
+class TestRateLimitBackends:
+    async def test_memory_bucket_runs_dry(self) -> None:
+        backend = memory_backend(max_keys=10)
+        assert await backend.take("client", slow_rule) == 0
+        assert await backend.take("client", slow_rule) == 0
+        assert await backend.take("client", slow_rule) > 0
+        assert await backend.take("other client", slow_rule) == 0
+
+    async def test_sqlite_bucket_is_shared(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "rate_limit.sqlite3")
+        first, second = sqlite_backend(path), sqlite_backend(path)
+        assert await first.take("client", slow_rule) == 0
+        assert await second.take("client", slow_rule) == 0
+        assert await first.take("client", slow_rule) > 0
+
+    async def test_concurrency_cap(self) -> None:
+        limiter = rate_limiter(memory_backend(max_keys=10), {})
+        await limiter.acquire("client", slow_rule)
+        with pytest.raises(rate_limit_exceeded):
+            await limiter.acquire("client", slow_rule)
+        limiter.release("client")
+        await limiter.acquire("client", slow_rule)
+
+
+class TestRateLimitRoutes:
+    async def test_flood_returns_429_with_retry_after(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        name = "cleanings:create-cleaning"
+        app.state._rate_limiter = rate_limiter(
+            memory_backend(max_keys=10), {name: slow_rule}
+        )
+        # invalid bodies never reach the database, the limit still applies
+        for _ in range(slow_rule.burst):
+            res = await client.post(app.url_path_for(name), json={})
+            assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+        res = await client.post(app.url_path_for(name), json={})
+        assert res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(res.headers["Retry-After"]) >= 1
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from app.services.single_flight import single_flight
+
+pytestmark = pytest.mark.anyio
+
+
+class TestSingleFlight:
+    async def test_concurrent_calls_share_one_fetch(self) -> None:
+        group: single_flight[str, int] = single_flight()
+        calls = 0
+
+        async def fetch() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        results = await asyncio.gather(*(group.do("key", fetch) for _ in range(50)))
+        assert results == [42] * 50
+        assert calls == 1
+        assert len(group) == 0
+
+    async def test_different_keys_do_not_share(self) -> None:
+        group: single_flight[int, int] = single_flight()
+
+        async def fetch(value: int) -> int:
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            *(group.do(key, lambda key=key: fetch(key)) for key in range(5))
+        )
+        assert results == list(range(5))
+
+    async def test_error_reaches_every_waiter(self) -> None:
+        group: single_flight[str, int] = single_flight()
+
+        async def fetch() -> int:
+            await asyncio.sleep(0.01)
+            raise LookupError("boom")
+
+        results = await asyncio.gather(
+            *(group.do("key", fetch) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(result, LookupError) for result in results)
+        assert len(group) == 0
+
+    async def test_cancelled_waiter_does_not_cancel_the_call(self) -> None:
+        group: single_flight[str, int] = single_flight()
+
+        async def fetch() -> int:
+            await asyncio.sleep(0.02)
+            return 7
+
+        first = asyncio.ensure_future(group.do("key", fetch))
+        second = asyncio.ensure_future(group.do("key", fetch))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        assert await second == 7
@@ -0,0 +1,78 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import anyio
+import pytest
+from fastapi import FastAPI
+
+backend_dir = Path(__file__).resolve().parents[1]
+
+# generous on purpose: it catches an eager import of the whole app,
+# not a few milliseconds of noise on a slow CI runner
+server_import_budget_us = 1_500_000
+lazy_modules = (
+    "sqlmodel",
+    "asyncpg",
+    "fastapi_users",
+    "app.models",
+    "app.api.routes",
+    "app.dependencies.auth",
+)
+
+
+def run_importtime(code: str) -> dict[str, int]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line.removeprefix("import time:").split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+@pytest.fixture(scope="module")
+def server_import() -> dict[str, int]:
+    return run_importtime("import app.api.server")
+
+
+class TestStartup:
+    def test_server_import_is_lazy(self, server_import: dict[str, int]) -> None:
+        for module in lazy_modules:
+            assert module not in server_import, f"{module} imported eagerly"
+
+    def test_server_import_time_budget(self, server_import: dict[str, int]) -> None:
+        assert server_import["app.api.server"] < server_import_budget_us
+
+    def test_application_build_does_not_create_engine(self) -> None:
+        run_importtime(
+            "from app.api.server import get_application\n"
+            "from app.db.engine import get_engine\n"
+            "get_application()\n"
+            "assert get_engine.cache_info().currsize == 0"
+        )
+
+
+@pytest.mark.anyio
+class TestWarmUp:
+    async def test_warm_up_opens_every_connection(self, app: FastAPI) -> None:
+        from app.db.engine import create_engine_from_url
+        from app.db.tasks import warm_up_pool
+
+        engine = create_engine_from_url(app.state._db.url, pool_size=3)
+        try:
+            # a threading pool lock held across the first connect hangs here
+            with anyio.fail_after(30):
+                await warm_up_pool(engine, 3)
+            assert engine.pool.checkedin() == 3
+            assert engine.pool.checkedout() == 0
+        finally:
+            await engine.dispose()
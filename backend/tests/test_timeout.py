@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from app.db.session import async_session
+from app.db.timeout import QUERY_CANCELED, statement_timeout
+from app.middleware import cancel_on_disconnect
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from starlette.types import Message, Receive, Scope, Send
+
+pytestmark = pytest.mark.anyio
+
+http_scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+
+
+def client_messages(*messages: Message, delay: float = 0.0) -> Receive:
+    queue = list(messages)
+
+    async def receive() -> Message:
+        if not queue:
+            await asyncio.Event().wait()
+        if queue[0]["type"] == "http.disconnect":
+            await asyncio.sleep(delay)
+        return queue.pop(0)
+
+    return receive
+
+
+class TestCancelOnDisconnect:
+    async def test_disconnect_cancels_the_request(self) -> None:
+        cancelled = asyncio.Event()
+
+        async def slow_app(scope: Scope, receive: Receive, send: Send) -> None:
+            await receive()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        app = cancel_on_disconnect(slow_app)
+        receive = client_messages(
+            {"type": "http.request", "body": b""},
+            {"type": "http.disconnect"},
+            delay=0.01,
+        )
+        sent: list[Message] = []
+
+        async def send(message: Message) -> None:
+            sent.append(message)
+
+        await asyncio.wait_for(app(http_scope, receive, send), timeout=1)
+        assert cancelled.is_set()
+        assert sent == []
+
+    async def test_complete_response_is_not_cancelled(self) -> None:
+        cleaned_up = asyncio.Event()
+
+        async def app_with_teardown(scope: Scope, receive: Receive, send: Send) -> None:
+            await receive()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+            # yield dependencies are closed after the response is sent
+            await asyncio.sleep(0.05)
+            cleaned_up.set()
+
+        app = cancel_on_disconnect(app_with_teardown)
+        receive = client_messages(
+            {"type": "http.request", "body": b""}, {"type": "http.disconnect"}
+        )
+
+        async def send(message: Message) -> None:
+            pass
+
+        await app(http_scope, receive, send)
+        assert cleaned_up.is_set()
+
+
+class TestStatementTimeout:
+    async def test_statement_timeout_cancels_the_query(
+        self, connection: AsyncConnection
+    ) -> None:
+        token = statement_timeout.set(10)
+        try:
+            async with async_session(connection) as session:
+                with pytest.raises(DBAPIError) as exc_info:
+                    await session.execute(text("select pg_sleep(1)"))
+        finally:
+            statement_timeout.reset(token)
+        assert exc_info.value.orig.sqlstate == QUERY_CANCELED  # type: ignore
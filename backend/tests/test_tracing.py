@@ -0,0 +1,172 @@
+import pytest
+from app.middleware import trace_requests
+from app.services.tracing import (
+    parse_traceparent,
+    span,
+    span_exporter,
+    stream_exporter,
+    trace_span,
+    traced_response,
+    tracer,
+    use_span,
+)
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.anyio
+
+trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+parent_id = "00f067aa0ba902b7"
+
+
+class list_exporter(span_exporter):
+    def __init__(self) -> None:
+        self.traces: list[list[span]] = []
+
+    def export(self, spans: list[span]) -> None:
+        self.traces.append(list(spans))
+
+
+def by_name(spans: list[span]) -> dict[str, span]:
+    return {traced.name: traced for traced in spans}
+
+
+class TestTraceparent:
+    def test_parse(self) -> None:
+        assert parse_traceparent(f"00-{trace_id}-{parent_id}-01") == (
+            trace_id,
+            parent_id,
+            True,
+        )
+        assert parse_traceparent(f"00-{trace_id}-{parent_id}-00") == (
+            trace_id,
+            parent_id,
+            False,
+        )
+        # a later version may carry more fields
+        assert parse_traceparent(f"01-{trace_id}-{parent_id}-01-extra") is not None
+
+    @pytest.mark.parametrize(
+        "header",
+        (
+            None,
+            "",
+            "garbage",
+            f"ff-{trace_id}-{parent_id}-01",
+            f"00-{'0' * 32}-{parent_id}-01",
+            f"00-{trace_id}-{'0' * 16}-01",
+            f"00-{trace_id.upper()}-{parent_id}-01",
+            f"00-{trace_id}-{parent_id}-01-extra",
+        ),
+    )
+    def test_invalid(self, header: str | None) -> None:
+        assert parse_traceparent(header) is None
+
+
+class TestTracer:
+    def test_sampling(self) -> None:
+        exporter = list_exporter()
+        assert tracer(exporter, 0.0).start_trace("a") is None
+        assert tracer(exporter, 1.0).start_trace("a") is not None
+        assert tracer(None, 1.0).start_trace("a") is None
+
+    def test_incoming_sampled_flag_is_followed(self) -> None:
+        never = tracer(list_exporter(), 0.0)
+        root = never.start_trace("a", f"00-{trace_id}-{parent_id}-01")
+        assert root is not None
+        assert (root.trace_id, root.parent_id) == (trace_id, parent_id)
+
+        always = tracer(list_exporter(), 1.0)
+        assert always.start_trace("a", f"00-{trace_id}-{parent_id}-00") is None
+
+    def test_spans_are_exported_with_the_root(self) -> None:
+        exporter = list_exporter()
+        with use_span(tracer(exporter, 1.0).start_trace("root")) as root:
+            with trace_span("child", key="value"):
+                with trace_span("grandchild"):
+                    pass
+            with pytest.raises(ValueError):
+                with trace_span("failed"):
+                    raise ValueError("boom")
+            assert exporter.traces == []
+
+        [spans] = exporter.traces
+        named = by_name(spans)
+        assert root is not None and named["root"] is root
+        assert named["child"].parent_id == root.span_id
+        assert named["child"].attributes == {"key": "value"}
+        assert named["grandchild"].parent_id == named["child"].span_id
+        assert "boom" in (named["failed"].error or "")
+        assert {traced.trace_id for traced in spans} == {root.trace_id}
+        assert all(traced.end_ns >= traced.start_ns for traced in spans)  # type: ignore
+
+    def test_no_spans_outside_a_trace(self) -> None:
+        with trace_span("orphan") as traced:
+            assert traced is None
+
+    def test_stream_exporter_writes_json_lines(self, tmp_path) -> None:
+        path = tmp_path / "traces.jsonl"
+        with path.open("ab") as stream:
+            with use_span(tracer(stream_exporter(stream), 1.0).start_trace("root")):
+                with trace_span("child"):
+                    pass
+        lines = path.read_bytes().splitlines()
+        assert len(lines) == 2
+        assert b'"name":"child"' in lines[0] and b'"name":"root"' in lines[1]
+
+
+class TestTraceRequests:
+    async def test_request_spans(self) -> None:
+        exporter = list_exporter()
+        app = FastAPI(default_response_class=traced_response)
+
+        @app.get("/items", name="items:list")
+        async def list_items() -> list[int]:
+            with trace_span("work"):
+                return [1, 2, 3]
+
+        app.add_middleware(trace_requests, tracer=tracer(exporter, 0.0))
+
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.get("/items")
+            assert res.status_code == status.HTTP_200_OK
+            assert exporter.traces == []
+
+            res = await client.get(
+                "/items", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"}
+            )
+            assert res.status_code == status.HTTP_200_OK
+
+        [spans] = exporter.traces
+        named = by_name(spans)
+        root = named["HTTP GET"]
+        assert (root.trace_id, root.parent_id) == (trace_id, parent_id)
+        assert root.attributes == {
+            "path": "/items",
+            "status": 200,
+            "route": "items:list",
+        }
+        assert named["work"].parent_id == root.span_id
+        assert named["serialize response"].parent_id == root.span_id
+
+    async def test_authenticated_request_spans(
+        self, app: FastAPI, authorized_client: AsyncClient, monkeypatch
+    ) -> None:
+        exporter = list_exporter()
+        monkeypatch.setattr(app.state._tracer, "exporter", exporter)
+        monkeypatch.setattr(app.state._tracer, "sample_ratio", 1.0)
+
+        res = await authorized_client.get(app.url_path_for("users:get-current-user"))
+        assert res.status_code == status.HTTP_200_OK
+
+        [spans] = exporter.traces
+        named = by_name(spans)
+        root = named["HTTP GET"]
+        assert named["get_current_user"].parent_id == root.span_id
+        assert named["serialize response"].parent_id == root.span_id
+        # the user is read by the current user dependency
+        selects = [traced for traced in spans if traced.name == "db select"]
+        assert selects
+        assert all(
+            traced.parent_id == named["get_current_user"].span_id for traced in selects
+        )
@@ -1,17 +1,22 @@
+import orjson
 import pytest
 from app.core import config
 from app.db.session import async_session
 from app.models import user
 from app.services.authentication import (
     UserManager,
+    cached_jwt_strategy_class,
+    create_refresh_token_store,
     create_strategy,
     jwt_strategy_class,
     user_db_class,
 )
+from app.services.authentication.refresh import hash_refresh_token
 from fastapi import FastAPI, status
 from fastapi_users.jwt import decode_jwt
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
 
 pytestmark = pytest.mark.anyio
 
@@ -38,7 +43,7 @@ class TestUserRegistration:
     api_name = "users:register-new-user"
 
     async def test_users_can_register_successfully(
-        self, app: FastAPI, client: AsyncClient, engine: AsyncEngine
+        self, app: FastAPI, client: AsyncClient, connection: AsyncConnection
     ) -> None:
         new_user = {
             "email": "shakira@shakira.io",
@@ -46,7 +51,7 @@ class TestUserRegistration:
             "password": "chantaje@1",
         }
         # make sure user doesn't exist yet
-        async with async_session(engine, autocommit=False) as session:
+        async with async_session(connection, autocommit=False) as session:
             is_user = await user.user.get_from_email(
                 session=session, email=new_user["email"]
             )
@@ -57,7 +62,7 @@ class TestUserRegistration:
         )
         assert res.status_code == status.HTTP_201_CREATED
         # ensure that the user now exists in the db
-        async with async_session(engine, autocommit=False) as session:
+        async with async_session(connection, autocommit=False) as session:
             is_user = await user.user.get_from_email(
                 session=session, email=new_user["email"]
             )
@@ -74,7 +79,8 @@ class TestUserRegistration:
     @pytest.mark.parametrize(
         "attr, value, status_code",
         (
-            ("email", "shakira@shakira.io", 400),
+            ("email", "lebron@james.io", 400),
+            ("email", "LeBron@James.io", 400),
             ("name", "sha", 422),
             ("name", "shafasdfsdwerewfsdfxcvxcvxcv", 422),
             ("email", "invalid_email@one@two.io", 422),
@@ -97,6 +103,7 @@ class TestUserRegistration:
         self,
         app: FastAPI,
         client: AsyncClient,
+        test_user: user.user,
         attr: str,
         value: str,
         status_code: int,
@@ -113,6 +120,83 @@ class TestUserRegistration:
         assert res.status_code == status_code
 
 
+@pytest.fixture
+async def superuser_client(
+    client: AsyncClient, connection: AsyncConnection, strategy: jwt_strategy_class
+) -> AsyncClient:
+    new_user = user.user_create.parse_obj(
+        dict(
+            email="admin@phresh.io",
+            name="phreshadmin",
+            password="adminpassword@1",
+            is_superuser=True,
+        )
+    )
+    async with async_session(connection, autocommit=False) as session:
+        manager = UserManager(user_db_class(session, user.user))  # type: ignore
+        if (admin := await user.user.get_from_email(session, new_user.email)) is None:
+            admin = await manager.create(new_user, safe=False)
+
+    access_token = await strategy.write_token(admin)
+    client.headers["Authorization"] = f"{config.JWT_TOKEN_PREFIX} {access_token}"
+    return client
+
+
+class TestUserExists:
+    api_name = "users:check-existing-emails"
+
+    async def test_batch_lookup_is_case_insensitive(
+        self, app: FastAPI, superuser_client: AsyncClient, test_user: user.user
+    ) -> None:
+        emails = [test_user.email.upper(), "nobody@phresh.io"]
+        res = await superuser_client.post(
+            app.url_path_for(self.api_name), json={"emails": emails}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        # EmailStr lower cases the domain, compare case-insensitively
+        found = {email.lower(): exists for email, exists in res.json().items()}
+        assert found == {test_user.email.lower(): True, "nobody@phresh.io": False}
+
+    async def test_requires_superuser(
+        self, app: FastAPI, authorized_client: AsyncClient
+    ) -> None:
+        res = await authorized_client.post(
+            app.url_path_for(self.api_name), json={"emails": ["a@phresh.io"]}
+        )
+        assert res.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestUserProvision:
+    api_name = "users:provision-users"
+
+    async def test_provision_reports_each_row(
+        self, app: FastAPI, superuser_client: AsyncClient, test_user: user.user
+    ) -> None:
+        users = [
+            dict(email="bulk1@phresh.io", name="bulk1", password="bulkpassword@1"),
+            dict(email=test_user.email, name="bulk2", password="bulkpassword@1"),
+            dict(email="bulk3@phresh.io", name="bulk 3", password="bulkpassword@1"),
+            dict(email="BULK1@phresh.io", name="bulk4", password="bulkpassword@1"),
+            dict(email="not an email", name="bulk5", password="bulkpassword@1"),
+        ]
+        res = await superuser_client.post(
+            app.url_path_for(self.api_name), json={"users": users}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        lines = [orjson.loads(line) for line in res.text.splitlines()]
+        assert lines[-1] == {"processed": 5, "created": 1, "total": 5}
+        statuses = {line["index"]: line["status"] for line in lines[:-1]}
+        assert statuses == {1: "exists", 2: "invalid", 3: "exists", 4: "invalid"}
+
+    async def test_requires_superuser(
+        self, app: FastAPI, authorized_client: AsyncClient
+    ) -> None:
+        res = await authorized_client.post(
+            app.url_path_for(self.api_name), json={"users": [{}]}
+        )
+        assert res.status_code == status.HTTP_403_FORBIDDEN
+
+
 @pytest.fixture
 def strategy() -> jwt_strategy_class:
     return create_strategy()  # type: ignore
@@ -127,7 +211,7 @@ class TestAuthTokens:
         client: AsyncClient,
         test_user: user.user,
         strategy: jwt_strategy_class,
-        engine: AsyncEngine,
+        connection: AsyncConnection,
     ) -> None:
         access_token = await strategy.write_token(user=test_user)
         creds = decode_jwt(
@@ -141,7 +225,7 @@ class TestAuthTokens:
         user_id = user.user.id_type(creds["user_id"])
         assert config.JWT_AUDIENCE in creds["aud"]
 
-        async with async_session(engine, autocommit=False) as session:
+        async with async_session(connection, autocommit=False) as session:
             user_model = await session.get(user.user, user_id)
         assert user_model is not None
 
@@ -157,6 +241,37 @@ class TestAuthTokens:
         assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
 
+class TestTokenClaimCache:
+    @pytest.fixture
+    def token_user(self) -> user.user:
+        return user.user(
+            name="cachedclaims",
+            email="cached@claims.io",
+            hashed_password="not-a-real-hash",
+        )
+
+    async def test_strategy_is_created_once(self) -> None:
+        assert create_strategy() is create_strategy()
+
+    async def test_verified_claims_are_cached(
+        self, strategy: cached_jwt_strategy_class, token_user: user.user
+    ) -> None:
+        token = await strategy.write_token(token_user)
+        claims = strategy.decode_claims(token)
+        assert claims is not None
+        assert claims["user_id"] == str(token_user.id)
+        assert token in strategy.claims
+        assert strategy.decode_claims(token) is claims
+
+    async def test_invalid_token_is_not_cached(
+        self, strategy: cached_jwt_strategy_class, token_user: user.user
+    ) -> None:
+        token = await strategy.write_token(token_user)
+        forged = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+        assert strategy.decode_claims(forged) is None
+        assert forged not in strategy.claims
+
+
 class TestUserLogin:
     api_name = f"auth:{config.AUTH_BACKEND_NAME}.login"
 
@@ -166,7 +281,7 @@ class TestUserLogin:
         client: AsyncClient,
         test_user: user.user,
         strategy: jwt_strategy_class,
-        engine: AsyncEngine,
+        connection: AsyncConnection,
     ) -> None:
         client.headers["content-type"] = "application/x-www-form-urlencoded"
         login_data = {"username": test_user.email, "password": "heatcavslakers@1"}
@@ -175,7 +290,7 @@ class TestUserLogin:
         # check that token exists in response and has user encoded within it
         token = res.json().get("access_token")
 
-        async with async_session(engine, autocommit=False) as session:
+        async with async_session(connection, autocommit=False) as session:
             db = user_db_class(session, user.user)
             manager = UserManager(db)  # type: ignore
 
@@ -186,6 +301,7 @@ class TestUserLogin:
         # check that token is proper type
         assert "token_type" in res.json()
         assert res.json().get("token_type") == "bearer"
+        assert res.json().get("refresh_token")
 
     @pytest.mark.parametrize(
         "credential, wrong_value, status_code",
@@ -219,6 +335,117 @@ class TestUserLogin:
         assert "access_token" not in res.json()
 
 
+class TestRefreshToken:
+    login_name = f"auth:{config.AUTH_BACKEND_NAME}.login"
+    refresh_name = "auth:refresh-token"
+    logout_name = f"auth:{config.AUTH_BACKEND_NAME}.logout"
+
+    @pytest.fixture
+    async def refresh_token(
+        self, app: FastAPI, client: AsyncClient, test_user: user.user
+    ) -> str:
+        res = await client.post(
+            app.url_path_for(self.login_name),
+            data={"username": test_user.email, "password": "heatcavslakers@1"},
+            headers={"content-type": "application/x-www-form-urlencoded"},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        return res.json()["refresh_token"]
+
+    async def test_refresh_rotates_token(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        test_user: user.user,
+        strategy: jwt_strategy_class,
+        refresh_token: str,
+    ) -> None:
+        res = await client.post(
+            app.url_path_for(self.refresh_name),
+            json={"refresh_token": refresh_token},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        tokens = res.json()
+        assert tokens["refresh_token"] != refresh_token
+
+        creds = decode_jwt(
+            tokens["access_token"],
+            str(config.SECRET_KEY),
+            [config.JWT_AUDIENCE],
+            [config.JWT_ALGORITHM],
+        )
+        assert creds["user_id"] == str(test_user.id)
+
+    async def test_refresh_token_is_single_use(
+        self, app: FastAPI, client: AsyncClient, refresh_token: str
+    ) -> None:
+        url = app.url_path_for(self.refresh_name)
+        res = await client.post(url, json={"refresh_token": refresh_token})
+        assert res.status_code == status.HTTP_200_OK
+        res = await client.post(url, json={"refresh_token": refresh_token})
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_logout_revokes_refresh_token(
+        self, app: FastAPI, client: AsyncClient, refresh_token: str
+    ) -> None:
+        res = await client.post(
+            app.url_path_for(self.logout_name), json={"refresh_token": refresh_token}
+        )
+        assert res.status_code == status.HTTP_204_NO_CONTENT
+        res = await client.post(
+            app.url_path_for(self.refresh_name),
+            json={"refresh_token": refresh_token},
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_consumed_token_is_remembered_after_commit(
+        self, connection: AsyncConnection, refresh_token: str
+    ) -> None:
+        store = create_refresh_token_store()
+        token_hash = hash_refresh_token(refresh_token)
+        async with async_session(connection) as session:
+            assert await store.consume(session, refresh_token) is not None
+            await session.rollback()
+        assert token_hash not in store.revoked
+
+        async with async_session(connection) as session:
+            assert await store.consume(session, refresh_token) is not None
+            assert token_hash not in store.revoked
+            await session.commit()
+        assert token_hash in store.revoked
+
+    async def test_inactive_user_token_is_consumed(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        connection: AsyncConnection,
+        test_user: user.user,
+        refresh_token: str,
+    ) -> None:
+        await connection.execute(
+            text("update users set is_active = false where id = :id"),
+            {"id": test_user.id},
+        )
+        res = await client.post(
+            app.url_path_for(self.refresh_name),
+            json={"refresh_token": refresh_token},
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+        stored = await connection.execute(
+            text("select count(*) from refresh_tokens where token_hash = :hash"),
+            {"hash": hash_refresh_token(refresh_token)},
+        )
+        assert stored.scalar_one() == 0
+
+    async def test_unknown_refresh_token_is_rejected(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        res = await client.post(
+            app.url_path_for(self.refresh_name), json={"refresh_token": "unknown"}
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
 class TestUserMe:
     api_name = "users:get-current-user"
 
@@ -270,3 +497,97 @@ class TestUserMe:
             headers={"Authorization": f"{jwt_prefix} {token}"},
         )
         assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestUserQueryBudget:
+    login_name = f"auth:{config.AUTH_BACKEND_NAME}.login"
+    form = {"content-type": "application/x-www-form-urlencoded"}
+
+    async def test_register(
+        self, app: FastAPI, client: AsyncClient, assert_queries
+    ) -> None:
+        new_user = {
+            "email": "budget@phresh.io",
+            "name": "budgetuser",
+            "password": "budgetpassword@1",
+        }
+        url = app.url_path_for("users:register-new-user")
+        # one insert decides whether the email is taken
+        with assert_queries("insert"):
+            res = await client.post(url, json={"new_user": new_user})
+        assert res.status_code == status.HTTP_201_CREATED
+        with assert_queries("insert"):
+            res = await client.post(url, json={"new_user": new_user})
+        assert res.status_code == status.HTTP_400_BAD_REQUEST
+
+    async def test_me(
+        self, app: FastAPI, authorized_client: AsyncClient, assert_queries
+    ) -> None:
+        with assert_queries("select"):
+            res = await authorized_client.get(
+                app.url_path_for("users:get-current-user")
+            )
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_exists(
+        self, app: FastAPI, superuser_client: AsyncClient, assert_queries
+    ) -> None:
+        # the superuser, then every email in one query
+        with assert_queries("select", "select"):
+            res = await superuser_client.post(
+                app.url_path_for("users:check-existing-emails"),
+                json={"emails": ["a@phresh.io", "b@phresh.io", "c@phresh.io"]},
+            )
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_provision(
+        self, app: FastAPI, superuser_client: AsyncClient, assert_queries
+    ) -> None:
+        users = [
+            dict(
+                email=f"budget{index}@phresh.io",
+                name=f"budget{index}",
+                password="bulkpassword@1",
+            )
+            for index in range(3)
+        ]
+        # the superuser, then one multi row insert per batch
+        with assert_queries("select", "insert"):
+            res = await superuser_client.post(
+                app.url_path_for("users:provision-users"), json={"users": users}
+            )
+        assert res.status_code == status.HTTP_200_OK
+
+    async def test_login_refresh_logout(
+        self,
+        app: FastAPI,
+        client: AsyncClient,
+        test_user: user.user,
+        assert_queries,
+    ) -> None:
+        # the user; expired tokens of the user are cleared before the insert
+        with assert_queries("select", "delete", "insert"):
+            res = await client.post(
+                app.url_path_for(self.login_name),
+                data={"username": test_user.email, "password": "heatcavslakers@1"},
+                headers=self.form,
+            )
+        assert res.status_code == status.HTTP_200_OK
+        refresh_token = res.json()["refresh_token"]
+
+        # consume the token (delete returning), load the user in the manager's
+        # own session, then clear the expired tokens and insert the next one
+        with assert_queries("delete", "select", "delete", "insert"):
+            res = await client.post(
+                app.url_path_for("auth:refresh-token"),
+                json={"refresh_token": refresh_token},
+            )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["refresh_token"] != refresh_token
+
+        with assert_queries("delete"):
+            res = await client.post(
+                app.url_path_for(f"auth:{config.AUTH_BACKEND_NAME}.logout"),
+                json={"refresh_token": res.json()["refresh_token"]},
+            )
+        assert res.status_code == status.HTTP_204_NO_CONTENT